@@ -0,0 +1,84 @@
+# benchmarks/audio_encoding.py
+"""
+Compare the encode time and payload size of the recorded-audio paths.
+
+The old path decodes the captured WAV with pydub, encodes a 128k MP3 with ffmpeg to disk
+and reads it back for upload. The in-memory paths encode the captured audio directly.
+
+Usage:
+    python -m benchmarks.audio_encoding [--repeat 10] [--capture-rate 44100]
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import tempfile
+import time
+from io import BytesIO
+
+import speech_recognition as sr
+from pydub import AudioSegment
+
+from voice_assistant.audio import encode_audio_data
+
+
+def load_capture(path, capture_rate):
+    """
+    Decode a voice sample into AudioData shaped like a microphone capture (mono, 16-bit).
+    """
+    segment = AudioSegment.from_file(path).set_channels(1).set_frame_rate(capture_rate).set_sample_width(2)
+    return sr.AudioData(segment.raw_data, capture_rate, 2), len(segment) / 1000.0
+
+
+def mp3_file_path(audio_data, file_path):
+    """
+    The original record_audio + transcriber path: WAV -> pydub -> ffmpeg MP3 -> disk -> read.
+    """
+    wav_data = audio_data.get_wav_data()
+    audio_segment = AudioSegment.from_wav(BytesIO(wav_data))
+    audio_segment.export(file_path, format="mp3", bitrate="128k", parameters=["-ar", "22050", "-ac", "1"])
+    with open(file_path, "rb") as audio_file:
+        return audio_file.read()
+
+
+def time_path(func, repeat):
+    timings = []
+    payload = b""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), len(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", default="voice_samples/*.mp3", help="Glob of audio files to use as captures")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per path; the median is reported")
+    parser.add_argument("--capture-rate", type=int, default=44100, help="Simulated microphone sample rate")
+    parser.add_argument("--sample-rate", type=int, default=16000, help="In-memory target sample rate")
+    args = parser.parse_args()
+
+    tmp_path = os.path.join(tempfile.mkdtemp(), "test.mp3")
+    print(f"{'sample':<22}{'path':<14}{'median ms':>12}{'payload KB':>12}")
+    for path in sorted(glob.glob(args.samples)):
+        audio_data, duration = load_capture(path, args.capture_rate)
+        paths = {
+            "mp3 (disk)": lambda: mp3_file_path(audio_data, tmp_path),
+            "wav (memory)": lambda: encode_audio_data(audio_data, 'wav', args.sample_rate).data,
+            "flac (memory)": lambda: encode_audio_data(audio_data, 'flac', args.sample_rate).data,
+            "pcm (memory)": lambda: encode_audio_data(audio_data, 'pcm', args.sample_rate).data,
+        }
+        name = f"{os.path.basename(path)} ({duration:.1f}s)"
+        for label, func in paths.items():
+            try:
+                median_ms, size = time_path(func, args.repeat)
+                print(f"{name:<22}{label:<14}{median_ms:>12.2f}{size / 1024:>12.1f}")
+            except Exception as e:
+                print(f"{name:<22}{label:<14}{'failed: ' + str(e):>24}")
+            name = ""
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+# benchmarks/end_to_end.py
+"""
+Run voice_samples through the full assistant pipeline against the local mock backends.
+
+The microphone is replaced by a stand-in that speaks each sample as one utterance when the
+assistant starts listening, and the speaker by a null output that takes as long as playing
+the audio would. The mock server (benchmarks.mock_servers) runs in a separate process, so
+the CPU time and memory reported are the assistant's own.
+
+For every turn, the report shows the time to first audio (from the end of the user's speech
+to the first reply audio, including endpointing) and the turn latency (to the end of
+playback). The summary adds p50/p95, CPU time per turn, CPU utilization and peak RSS.
+
+Regression mode: --save-baseline FILE stores the summary, and --baseline FILE compares the
+run against it and exits with status 1 if a metric is more than --threshold worse.
+
+Usage:
+    python -m benchmarks.end_to_end [--transcription openai] [--response openai] [--tts openai]
+        [--streaming] [--streaming-transcription] [--latency 0.05] [--token-delay 0.01]
+        [--speech-rtf 0.1] [--rounds 1] [--speed 1.0]
+        [--save-baseline baseline.json | --baseline baseline.json --threshold 0.2]
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+from voice_assistant.tracing import percentile
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Lower is better for all of them
+METRICS = ["first_audio_p50", "first_audio_p95", "turn_p50", "turn_p95", "cpu_per_turn", "peak_rss_mb"]
+
+
+def start_mock_server(port, latency, token_delay, speech_rtf):
+    """
+    Start the mock backends in a subprocess and wait until they accept requests.
+
+    Returns:
+        subprocess.Popen: The server process.
+    """
+    process = subprocess.Popen([sys.executable, "-m", "benchmarks.mock_servers", "--port", str(port),
+                                "--latency", str(latency), "--token-delay", str(token_delay),
+                                "--speech-rtf", str(speech_rtf)])
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/info", timeout=1).status_code == 200:
+                return process
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Mock server did not start")
+
+
+def configure(base_url, args, samples):
+    """
+    Point every backend at the mock server and swap in the stand-in microphone and speaker.
+    """
+    # Config reads the API keys at import time, so set them before importing the assistant
+    for name in ("OPENAI_API_KEY", "GROQ_API_KEY", "DEEPGRAM_API_KEY"):
+        os.environ.setdefault(name, "mock")
+
+    from voice_assistant import transcription
+    from voice_assistant.config import Config
+
+    Config.TRANSCRIPTION_MODEL = args.transcription
+    Config.RESPONSE_MODEL = args.response
+    Config.TTS_MODEL = args.tts
+    Config.OPENAI_BASE_URL = f"{base_url}/v1"
+    Config.GROQ_BASE_URL = base_url
+    Config.DEEPGRAM_BASE_URL = base_url
+    Config.FASTWHISPERAPI_URL = transcription.fast_url = base_url
+    Config.TTS_PORT_LOCAL = int(base_url.rsplit(":", 1)[1])
+    Config.PIPER_SERVER_URL = f"{base_url}/piper"
+    Config.CONTINUOUS_CAPTURE = True
+    Config.IN_MEMORY_AUDIO = True
+    Config.STREAMING_PIPELINE = args.streaming
+    Config.STREAMING_TRANSCRIPTION = args.streaming_transcription
+    Config.INPUT_AUDIO_FILES = samples
+    Config.INPUT_AUDIO_FILES_SPEED = args.speed
+    Config.NULL_AUDIO_OUTPUT = True
+
+
+def run_turn(context):
+    """
+    Run one turn the way run_voice_assistant.main does and return its measurements.
+    """
+    import run_voice_assistant as assistant
+    from voice_assistant.api_key_manager import get_response_api_key, get_transcription_api_key, get_tts_api_key
+    from voice_assistant.audio import play_audio
+    from voice_assistant.capture import get_microphone_stream
+    from voice_assistant.config import Config
+    from voice_assistant.response_generation import generate_response
+    from voice_assistant.streaming import LatencyReport, get_output_file, run_streaming_turn
+    from voice_assistant.text_to_speech import speaks_while_streaming, text_to_speech
+    from voice_assistant.transcription import transcribe_audio
+    from voice_assistant.utils import delete_file
+
+    cpu_start = time.process_time()
+    if Config.STREAMING_TRANSCRIPTION:
+        user_input = assistant._transcribe_streaming(get_transcription_api_key())
+    else:
+        audio = assistant._record_utterance()
+        user_input = transcribe_audio(Config.TRANSCRIPTION_MODEL, get_transcription_api_key(), audio,
+                                      Config.LOCAL_MODEL_PATH)
+    end_of_speech = get_microphone_stream(Config.INPUT_SAMPLE_RATE).utterance_ends[-1]
+    context.append({"role": "user", "content": user_input})
+
+    if Config.STREAMING_PIPELINE:
+        response_text, report = run_streaming_turn(context.messages, Config.RESPONSE_MODEL, get_response_api_key(),
+                                                   Config.TTS_MODEL, get_tts_api_key(), Config.LOCAL_MODEL_PATH)
+    else:
+        report = LatencyReport()
+        response_text = generate_response(Config.RESPONSE_MODEL, get_response_api_key(), context.messages,
+                                          Config.LOCAL_MODEL_PATH)
+        report.mark('first_token')
+        if speaks_while_streaming(Config.TTS_MODEL):
+            assistant._speak_streaming(get_tts_api_key(), response_text, report)
+        else:
+            output_file = get_output_file(Config.TTS_MODEL)
+            text_to_speech(Config.TTS_MODEL, get_tts_api_key(), response_text, output_file, Config.LOCAL_MODEL_PATH)
+            report.mark('first_audio')
+            play_audio(output_file)
+            delete_file(output_file)
+        report.mark('end_of_turn')
+    context.append({"role": "assistant", "content": response_text})
+
+    return {
+        "transcript": user_input,
+        "first_audio": (report.first_audio - end_of_speech) * 1000 if report.first_audio else None,
+        "turn": (report.end_of_turn - end_of_speech) * 1000,
+        "cpu": time.process_time() - cpu_start,
+    }
+
+
+def peak_rss_mb():
+    """
+    Return the peak resident set size of this process in MB, or None if unknown.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(turns, cpu_seconds, wall_seconds):
+    """
+    Return the summary metrics of a run.
+    """
+    first_audio = [turn["first_audio"] for turn in turns if turn["first_audio"] is not None]
+    latency = [turn["turn"] for turn in turns]
+    return {
+        "turns": len(turns),
+        "first_audio_p50": percentile(first_audio, 50),
+        "first_audio_p95": percentile(first_audio, 95),
+        "turn_p50": percentile(latency, 50),
+        "turn_p95": percentile(latency, 95),
+        "cpu_per_turn": cpu_seconds / len(turns),
+        "cpu_percent": 100 * cpu_seconds / wall_seconds,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare(summary, baseline, threshold):
+    """
+    Print the run next to the baseline and return the metrics that regressed by more than threshold.
+    """
+    regressions = []
+    print(f"\n{'metric':<18}{'baseline':>10}{'current':>10}{'change':>9}")
+    for metric in METRICS:
+        old, new = baseline.get(metric), summary.get(metric)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        flag = "  REGRESSION" if change > threshold else ""
+        print(f"{metric:<18}{old:>10.1f}{new:>10.1f}{change:>+9.0%}{flag}")
+        if flag:
+            regressions.append(metric)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transcription", default="openai", choices=["openai", "groq", "deepgram", "fastwhisperapi"])
+    parser.add_argument("--response", default="openai", choices=["openai", "groq"])
+    parser.add_argument("--tts", default="openai", choices=["openai", "deepgram", "melotts", "piper"])
+    parser.add_argument("--streaming", action="store_true", help="Use the streaming LLM-to-TTS pipeline")
+    parser.add_argument("--streaming-transcription", action="store_true", help="Transcribe while the user speaks")
+    parser.add_argument("--samples", default="voice_samples/*.mp3")
+    parser.add_argument("--rounds", type=int, default=1, help="Times to go through the samples")
+    parser.add_argument("--speed", type=float, default=1.0, help="Pace of the microphone relative to real time")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock server latency per response")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between streamed tokens")
+    parser.add_argument("--speech-rtf", type=float, default=0.1, help="Mock synthesis time per second of speech")
+    parser.add_argument("--save-baseline", help="Write the summary to this file")
+    parser.add_argument("--baseline", help="Compare the summary against this file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed regression as a fraction")
+    args = parser.parse_args()
+
+    samples = sorted(glob.glob(args.samples)) * args.rounds
+    if not samples:
+        parser.error(f"No samples match {args.samples}")
+
+    server = start_mock_server(args.port, args.latency, args.token_delay, args.speech_rtf)
+    try:
+        configure(f"http://127.0.0.1:{args.port}", args, samples)
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+
+        import run_voice_assistant as assistant
+        from voice_assistant.clients import prewarm_configured_clients
+
+        prewarm_configured_clients()
+        context = assistant._new_context()
+
+        turns = []
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        print(f"{'turn':>4}{'first audio ms':>16}{'turn ms':>10}{'cpu s':>8}  transcript")
+        for index in range(len(samples)):
+            turn = run_turn(context)
+            turns.append(turn)
+            first_audio = f"{turn['first_audio']:.0f}" if turn['first_audio'] is not None else "-"
+            print(f"{index + 1:>4}{first_audio:>16}{turn['turn']:>10.0f}{turn['cpu']:>8.2f}  {turn['transcript'][:40]}")
+        summary = summarize(turns, time.process_time() - cpu_start, time.perf_counter() - wall_start)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print()
+    for name, value in summary.items():
+        print(f"{name:<18}{value:>10.1f}" if isinstance(value, float) else f"{name:<18}{value!s:>10}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(summary, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(summary, json.load(f), args.threshold)
+        if regressions:
+            print(f"\nRegressed beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# benchmarks/gateway_load_test.py
+"""
+Load test the multi-session gateway (voice_gateway.py) by replaying voice_samples.
+
+For each concurrency level N, N sessions run --turns turns each at the same time. Every
+turn uploads one sample and reads the streamed events until 'done'. The report shows the
+throughput in turns per second and the p50/p99 time to the first audio and to the end of
+the turn, as seen by the client.
+
+Without --url, the mock backends (benchmarks.mock_servers) and the gateway are started in
+this process, with OpenAI selected for transcription, response generation and TTS.
+
+Usage:
+    python -m benchmarks.gateway_load_test [--sessions 1,4,16] [--turns 3] [--url http://localhost:8080]
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+
+import httpx
+
+from voice_assistant.tracing import percentile
+
+_CONTENT_TYPES = {'.wav': 'audio/wav', '.flac': 'audio/flac', '.mp3': 'audio/mpeg'}
+
+
+def start_local_gateway(mock_port, gateway_port, latency, token_delay):
+    """
+    Start the mock backends and the gateway on daemon threads.
+
+    Returns:
+        str: The gateway URL.
+    """
+    # Config reads the API keys at import time, so set the key before importing the gateway
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{mock_port}/v1"
+
+    from benchmarks.mock_servers import create_app, run_in_thread
+    from voice_assistant.config import Config
+
+    Config.OPENAI_BASE_URL = os.environ["OPENAI_BASE_URL"]
+    Config.TRANSCRIPTION_MODEL = Config.RESPONSE_MODEL = Config.TTS_MODEL = 'openai'
+
+    import voice_gateway
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    run_in_thread(create_app(latency, token_delay=token_delay), mock_port)
+    run_in_thread(voice_gateway.app, gateway_port)
+    return f"http://127.0.0.1:{gateway_port}"
+
+
+async def run_turn(client, url, session_id, sample):
+    """
+    Run one turn and return (first audio seconds, turn seconds, status).
+    """
+    path, data = sample
+    headers = {'Content-Type': _CONTENT_TYPES.get(os.path.splitext(path)[1], 'audio/wav')}
+    start = time.perf_counter()
+    first_audio = None
+    async with client.stream("POST", f"{url}/sessions/{session_id}/turns", content=data, headers=headers) as response:
+        if response.status_code != 200:
+            await response.aread()
+            return None, None, response.status_code
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            if event['type'] == 'audio' and first_audio is None:
+                first_audio = time.perf_counter() - start
+            elif event['type'] == 'error':
+                return first_audio, time.perf_counter() - start, 'error'
+    return first_audio, time.perf_counter() - start, 200
+
+
+async def run_session(client, url, samples, turns, offset, results):
+    response = await client.post(f"{url}/sessions", json={})
+    response.raise_for_status()
+    session_id = response.json()['session_id']
+    try:
+        for turn in range(turns):
+            results.append(await run_turn(client, url, session_id, samples[(offset + turn) % len(samples)]))
+    finally:
+        await client.delete(f"{url}/sessions/{session_id}")
+
+
+async def run_level(url, samples, sessions, turns):
+    """
+    Run one concurrency level and return its report row.
+    """
+    results = []
+    limits = httpx.Limits(max_connections=sessions * 2, max_keepalive_connections=sessions * 2)
+    async with httpx.AsyncClient(limits=limits, timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(run_session(client, url, samples, turns, index, results) for index in range(sessions)))
+        elapsed = time.perf_counter() - start
+    completed = [result for result in results if result[2] == 200]
+    first_audio = [result[0] * 1000 for result in completed if result[0] is not None]
+    turn_ms = [result[1] * 1000 for result in completed]
+    return {
+        "sessions": sessions,
+        "turns": len(completed),
+        "failed": len(results) - len(completed),
+        "turns_per_sec": len(completed) / elapsed if elapsed else 0.0,
+        "first_audio_p50": percentile(first_audio, 50),
+        "first_audio_p99": percentile(first_audio, 99),
+        "turn_p50": percentile(turn_ms, 50),
+        "turn_p99": percentile(turn_ms, 99),
+    }
+
+
+def _ms(value):
+    return f"{value:>10.0f}" if value is not None else f"{'-':>10}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="URL of a running gateway (default: start mock backends and a gateway here)")
+    parser.add_argument("--sessions", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--turns", type=int, default=3, help="Turns per session")
+    parser.add_argument("--samples", default="voice_samples/*.mp3")
+    parser.add_argument("--mock-port", type=int, default=8001)
+    parser.add_argument("--gateway-port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock backend latency per request")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Mock delay between streamed tokens")
+    args = parser.parse_args()
+
+    samples = []
+    for path in sorted(glob.glob(args.samples)):
+        with open(path, "rb") as f:
+            samples.append((path, f.read()))
+    if not samples:
+        parser.error(f"No samples match {args.samples}")
+
+    url = args.url or start_local_gateway(args.mock_port, args.gateway_port, args.latency, args.token_delay)
+
+    print(f"{'sessions':>8}{'turns':>7}{'failed':>7}{'turns/s':>9}"
+          f"{'audio p50':>10}{'audio p99':>10}{'turn p50':>10}{'turn p99':>10}")
+    for sessions in (int(level) for level in args.sessions.split(",")):
+        row = asyncio.run(run_level(url, samples, sessions, args.turns))
+        print(f"{row['sessions']:>8}{row['turns']:>7}{row['failed']:>7}{row['turns_per_sec']:>9.2f}"
+              f"{_ms(row['first_audio_p50'])}{_ms(row['first_audio_p99'])}{_ms(row['turn_p50'])}{_ms(row['turn_p99'])}")
+
+
+if __name__ == "__main__":
+    main()
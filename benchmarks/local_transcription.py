@@ -0,0 +1,128 @@
+# benchmarks/local_transcription.py
+"""
+Compare the real-time factor of in-process transcription (faster-whisper) with FastWhisperAPI.
+
+Each sample is decoded to 16 kHz mono PCM once, the way the recorder captures it, and
+transcribed --runs times by every backend after one warm-up call:
+
+- local: transcription.transcribe_audio('local', ...) with the PCM passed to the resident
+  model as a float32 array (requires faster-whisper).
+- fastwhisperapi: the same recording wrapped in WAV and uploaded to the FastWhisperAPI server
+  at --fastwhisperapi-url.
+
+The report shows the model load time, the median and p95 latency per call and the real-time
+factor (processing time divided by audio duration, lower is faster). Use the same model size
+and compute type on both sides for a fair comparison.
+
+Usage:
+    python -m benchmarks.local_transcription [--backends local,fastwhisperapi] [--runs 3]
+        [--model base.en] [--compute-type int8] [--beam-size 1] [--threads 0] [--vad-filter]
+        [--fastwhisperapi-url http://localhost:8000]
+"""
+
+import argparse
+import glob
+import statistics
+import time
+
+from pydub import AudioSegment
+
+from voice_assistant import transcription
+from voice_assistant.audio import RecordedAudio
+from voice_assistant.clients import get_client
+from voice_assistant.config import Config
+from voice_assistant.playback import decode_audio
+from voice_assistant.tracing import percentile
+
+SAMPLE_RATE = 16000
+
+
+def load_recording(path):
+    """
+    Decode a sample into a 16 kHz mono PCM recording.
+
+    Returns:
+    tuple: The RecordedAudio and its duration in seconds.
+    """
+    with open(path, "rb") as audio_file:
+        pcm, sample_rate, channels = decode_audio(audio_file.read())
+    segment = AudioSegment(pcm, sample_width=2, frame_rate=sample_rate, channels=channels)
+    segment = segment.set_channels(1).set_frame_rate(SAMPLE_RATE)
+    return RecordedAudio(segment.raw_data, 'pcm', SAMPLE_RATE), len(segment) / 1000.0
+
+
+def run_backend(model, recordings, runs):
+    """
+    Transcribe every recording runs times with the model.
+
+    Returns:
+    dict: Latencies in ms, total processing and audio seconds and the transcripts.
+    """
+    latencies = []
+    processing = audio_seconds = 0.0
+    transcripts = []
+    # Apart from the model load, the first call pays for connection setup or buffer allocation
+    transcription.transcribe_audio(model, None, recordings[0][0], Config.LOCAL_MODEL_PATH)
+    for recording, duration in recordings:
+        if model == 'fastwhisperapi':
+            recording = recording.to_wav()
+        for _ in range(runs):
+            start = time.perf_counter()
+            text = transcription.transcribe_audio(model, None, recording, Config.LOCAL_MODEL_PATH)
+            elapsed = time.perf_counter() - start
+            latencies.append(elapsed * 1000)
+            processing += elapsed
+            audio_seconds += duration
+        transcripts.append(text)
+    return {"latencies": latencies, "processing": processing, "audio_seconds": audio_seconds,
+            "transcripts": transcripts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", default="voice_samples/*.mp3", help="Glob of audio files to transcribe")
+    parser.add_argument("--backends", default="local,fastwhisperapi", help="Comma-separated backends to compare")
+    parser.add_argument("--runs", type=int, default=3, help="Transcriptions per sample and backend")
+    parser.add_argument("--model", default=Config.LOCAL_MODEL_PATH or Config.LOCAL_WHISPER_MODEL,
+                        help="faster-whisper model directory or size name")
+    parser.add_argument("--compute-type", default=Config.LOCAL_WHISPER_COMPUTE_TYPE)
+    parser.add_argument("--beam-size", type=int, default=Config.LOCAL_WHISPER_BEAM_SIZE)
+    parser.add_argument("--threads", type=int, default=Config.LOCAL_WHISPER_THREADS,
+                        help="CPU threads per inference, 0 for the CTranslate2 default")
+    parser.add_argument("--vad-filter", action="store_true", help="Drop non-speech before decoding")
+    parser.add_argument("--fastwhisperapi-url", default=Config.FASTWHISPERAPI_URL)
+    args = parser.parse_args()
+
+    Config.LOCAL_MODEL_PATH = args.model
+    Config.LOCAL_WHISPER_COMPUTE_TYPE = args.compute_type
+    Config.LOCAL_WHISPER_BEAM_SIZE = args.beam_size
+    Config.LOCAL_WHISPER_THREADS = args.threads
+    Config.LOCAL_WHISPER_VAD_FILTER = args.vad_filter
+    transcription.fast_url = args.fastwhisperapi_url
+
+    recordings = [load_recording(path) for path in sorted(glob.glob(args.samples))]
+    if not recordings:
+        raise SystemExit(f"No samples match {args.samples}")
+    total_audio = sum(duration for _, duration in recordings)
+    print(f"{len(recordings)} samples, {total_audio:.1f} s of audio, {args.runs} runs each")
+
+    print(f"{'backend':<16}{'load ms':>9}{'p50 ms':>9}{'p95 ms':>9}{'RTF':>8}  transcript")
+    for model in args.backends.split(","):
+        load_ms = None
+        try:
+            if model == 'local':
+                start = time.perf_counter()
+                get_client('faster_whisper', None, args.model)
+                load_ms = (time.perf_counter() - start) * 1000
+            result = run_backend(model, recordings, args.runs)
+        except Exception as e:
+            print(f"{model:<16}failed: {e}")
+            continue
+        load = f"{load_ms:>9.0f}" if load_ms is not None else f"{'-':>9}"
+        print(f"{model:<16}{load}{statistics.median(result['latencies']):>9.0f}"
+              f"{percentile(result['latencies'], 95):>9.0f}"
+              f"{result['processing'] / result['audio_seconds']:>8.3f}  {result['transcripts'][0][:40]!r}")
+
+
+if __name__ == "__main__":
+    main()
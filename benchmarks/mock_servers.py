@@ -0,0 +1,345 @@
+# benchmarks/mock_servers.py
+"""
+Local stand-ins for the backends, for offline and reproducible runs.
+
+Endpoints:
+    GET  /info                      FastWhisperAPI health check
+    POST /v1/transcriptions         FastWhisperAPI transcription (multipart upload, needs python-multipart)
+    WS   /v1/listen                 Deepgram live transcription (interim results and endpointing)
+    POST /v1/listen                 Deepgram prerecorded transcription
+    POST /v1/speak                  Deepgram speech (WAV, or raw PCM with container=none)
+    POST /v1/audio/transcriptions   OpenAI-compatible transcription (multipart upload)
+    POST /v1/chat/completions       OpenAI-compatible chat completion, streamed or not
+    POST /v1/audio/speech           OpenAI-compatible speech (raw PCM for response_format=pcm, otherwise WAV)
+    GET  /v1/models                 OpenAI-compatible model list, used to prewarm clients
+    POST /openai/v1/...             The OpenAI-compatible endpoints under Groq's base path
+    POST /synthesize/               MeloTTS server (local_tts_api.py): streamed 16-bit PCM
+    GET  /metrics                   MeloTTS server metrics, used to prewarm the connection
+    POST /piper/synthesize/         Piper server (piper_server.py): streamed WAV; use /piper as PIPER_SERVER_URL
+
+The mock does not recognize speech. It replays a fixed transcript, revealing words in
+proportion to the amount of speech it has received, and detects the end of speech with a
+simple energy threshold so endpointing behaves like the real service. Chat completions
+replay a fixed reply word by word and speech is a tone whose length follows the text,
+streamed in chunks at speech_rtf seconds of synthesis per second of audio.
+
+Usage:
+    python -m benchmarks.mock_servers [--port 8001] [--latency 0.05] [--token-delay 0.01] [--speech-rtf 0.1]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import struct
+import threading
+import time
+import uuid
+import wave
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+TRANSCRIPT = ("hello verbi can you tell me a short story about a robot who learns to paint "
+              "and then explain why the sky looks blue in the afternoon").split()
+WORDS_PER_SECOND = 2.5
+SPEECH_ENERGY = 500
+REPLY = ("Sure, here is a short one. A small robot found a brush in the workshop and painted the sunset "
+         "every evening. The sky looks blue because air scatters blue light more than red light. "
+         "Is there anything else you would like to know?")
+SPEECH_SAMPLE_RATE = 24000
+SPEECH_SECONDS_PER_WORD = 0.3
+SPEECH_CHUNK_SECONDS = 0.25
+
+
+def words_for(seconds):
+    """
+    Return the mock transcript for the given amount of speech.
+    """
+    count = max(1, int(seconds * WORDS_PER_SECOND))
+    return " ".join(TRANSCRIPT[i % len(TRANSCRIPT)] for i in range(count))
+
+
+def _audio_seconds(data):
+    """
+    Estimate the duration of an uploaded file (exact for WAV, 16 kB/s otherwise).
+    """
+    try:
+        with wave.open(io.BytesIO(data)) as wav_file:
+            return wav_file.getnframes() / wav_file.getframerate()
+    except (wave.Error, EOFError):
+        return len(data) / 16000
+
+
+def _speech_pcm(text):
+    """
+    Return a 16-bit PCM tone lasting about as long as the text would take to say.
+    """
+    seconds = max(0.2, len(text.split()) * SPEECH_SECONDS_PER_WORD)
+    t = np.arange(int(seconds * SPEECH_SAMPLE_RATE)) / SPEECH_SAMPLE_RATE
+    return (np.sin(2 * np.pi * 220 * t) * 3000).astype(np.int16).tobytes()
+
+
+def _wav_header(data_size=0xFFFFFFFF):
+    """
+    Return a mono 16-bit WAV header; the default sizes mark a stream of unknown length.
+    """
+    byte_rate = SPEECH_SAMPLE_RATE * 2
+    riff_size = 0xFFFFFFFF if data_size == 0xFFFFFFFF else data_size + 36
+    return (b"RIFF" + struct.pack("<I", riff_size) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, SPEECH_SAMPLE_RATE, byte_rate, 2, 16)
+            + b"data" + struct.pack("<I", data_size))
+
+
+def _speech_wav(text):
+    """
+    Return a WAV tone lasting about as long as the text would take to say.
+    """
+    pcm = _speech_pcm(text)
+    return _wav_header(len(pcm)) + pcm
+
+
+async def _stream_speech(pcm, latency, speech_rtf, header=b""):
+    """
+    Yield the header and then the audio in chunks, paced like a synthesizer running at speech_rtf.
+    """
+    await asyncio.sleep(latency)
+    if header:
+        yield header
+    chunk_bytes = int(SPEECH_CHUNK_SECONDS * SPEECH_SAMPLE_RATE) * 2
+    for offset in range(0, len(pcm), chunk_bytes):
+        chunk = pcm[offset:offset + chunk_bytes]
+        if speech_rtf:
+            await asyncio.sleep(len(chunk) / (2 * SPEECH_SAMPLE_RATE) * speech_rtf)
+        yield chunk
+
+
+def _chat_chunk(completion_id, model, delta, finish_reason=None):
+    return "data: " + json.dumps({
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }) + "\n\n"
+
+
+def _deepgram_result(text, start, duration, is_final, speech_final):
+    return json.dumps({
+        "type": "Results",
+        "channel_index": [0, 1],
+        "duration": duration,
+        "start": start,
+        "is_final": is_final,
+        "speech_final": speech_final,
+        "from_finalize": False,
+        "channel": {"alternatives": [{"transcript": text, "confidence": 0.99, "words": []}]},
+        "metadata": {"request_id": str(uuid.uuid4()),
+                     "model_info": {"name": "mock", "version": "0", "arch": "mock"},
+                     "model_uuid": str(uuid.uuid4())},
+    })
+
+
+def create_app(latency=0.0, interim_interval=0.5, token_delay=0.01, speech_rtf=0.0):
+    """
+    Build the mock server app.
+
+    Args:
+        latency (float): Seconds added before every response.
+        interim_interval (float): Seconds of audio between Deepgram interim results.
+        token_delay (float): Seconds between streamed chat completion tokens.
+        speech_rtf (float): Seconds of synthesis per second of speech audio (0 returns it at once).
+
+    Returns:
+        FastAPI: The app.
+    """
+    app = FastAPI()
+
+    @app.get("/info")
+    async def info():
+        return {"status": "ok", "mock": True}
+
+    @app.post("/v1/transcriptions")
+    async def transcriptions(request: Request):
+        form = await request.form()
+        data = await form["file"].read()
+        await asyncio.sleep(latency)
+        return {"text": words_for(_audio_seconds(data))}
+
+    @app.post("/v1/listen")
+    async def deepgram_transcriptions(request: Request):
+        data = await request.body()
+        await asyncio.sleep(latency)
+        seconds = _audio_seconds(data)
+        return {
+            "metadata": {"transaction_key": "deprecated", "request_id": str(uuid.uuid4()), "sha256": "",
+                         "created": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+                         "duration": seconds, "channels": 1, "models": ["mock"], "model_info": {}},
+            "results": {"channels": [{"alternatives": [{"transcript": words_for(seconds), "confidence": 0.99,
+                                                        "words": []}]}]},
+        }
+
+    @app.post("/v1/speak")
+    async def deepgram_speech(request: Request):
+        body = await request.json()
+        text = body.get("text", "")
+        pcm = _speech_pcm(text)
+        headers = {"dg-request-id": str(uuid.uuid4()), "dg-model-uuid": str(uuid.uuid4()),
+                   "dg-model-name": "mock", "dg-char-count": str(len(text))}
+        if request.query_params.get("container") == "none":
+            return StreamingResponse(_stream_speech(pcm, latency, speech_rtf), media_type="audio/l16", headers=headers)
+        return StreamingResponse(_stream_speech(pcm, latency, speech_rtf, _wav_header(len(pcm))),
+                                 media_type="audio/wav", headers=headers)
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "mock", "object": "model", "created": 0, "owned_by": "mock"}]}
+
+    @app.post("/v1/audio/transcriptions")
+    async def openai_transcriptions(request: Request):
+        form = await request.form()
+        data = await form["file"].read()
+        await asyncio.sleep(latency)
+        return {"text": words_for(_audio_seconds(data))}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "mock")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        await asyncio.sleep(latency)
+        if not body.get("stream"):
+            await asyncio.sleep(token_delay * len(REPLY.split()))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": REPLY},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(REPLY.split()), "total_tokens": 0},
+            }
+
+        async def chunks():
+            yield _chat_chunk(completion_id, model, {"role": "assistant", "content": ""})
+            for index, word in enumerate(REPLY.split(" ")):
+                await asyncio.sleep(token_delay)
+                yield _chat_chunk(completion_id, model, {"content": word if index == 0 else " " + word})
+            yield _chat_chunk(completion_id, model, {}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    @app.post("/v1/audio/speech")
+    async def speech(request: Request):
+        body = await request.json()
+        pcm = _speech_pcm(body.get("input", ""))
+        if body.get("response_format") == "pcm":
+            return StreamingResponse(_stream_speech(pcm, latency, speech_rtf), media_type="audio/pcm")
+        return StreamingResponse(_stream_speech(pcm, latency, speech_rtf, _wav_header(len(pcm))),
+                                 media_type="audio/wav")
+
+    # Groq serves the OpenAI-compatible API under /openai/v1
+    for route in list(app.routes):
+        if route.path.startswith(("/v1/audio/", "/v1/chat/", "/v1/models")):
+            app.add_api_route("/openai" + route.path, route.endpoint, methods=route.methods)
+
+    @app.post("/synthesize/")
+    async def melotts_synthesize(request: Request):
+        body = await request.json()
+        return StreamingResponse(_stream_speech(_speech_pcm(body.get("text", "")), latency, speech_rtf),
+                                 media_type="audio/L16", headers={"X-Sample-Rate": str(SPEECH_SAMPLE_RATE)})
+
+    @app.get("/metrics")
+    async def melotts_metrics():
+        return {"mock": True}
+
+    @app.post("/piper/synthesize/")
+    async def piper_synthesize(request: Request):
+        body = await request.json()
+        return StreamingResponse(_stream_speech(_speech_pcm(body.get("text", "")), latency, speech_rtf, _wav_header()),
+                                 media_type="audio/wav", headers={"X-Sample-Rate": str(SPEECH_SAMPLE_RATE)})
+
+    @app.get("/piper/docs")
+    async def piper_docs():
+        return {"mock": True}
+
+    @app.websocket("/v1/listen")
+    async def listen(websocket: WebSocket):
+        await websocket.accept()
+        params = websocket.query_params
+        sample_rate = int(params.get("sample_rate", 16000))
+        endpointing = float(params.get("endpointing", 300)) / 1000
+        interim = params.get("interim_results", "false") == "true"
+
+        received = 0.0
+        speech = 0.0
+        silence = 0.0
+        last_interim = 0.0
+        try:
+            while True:
+                message = await websocket.receive()
+                if message.get("bytes"):
+                    samples = np.frombuffer(message["bytes"], dtype=np.int16).astype(np.float32)
+                    seconds = samples.size / sample_rate
+                    received += seconds
+                    energy = float(np.sqrt(np.mean(samples * samples))) if samples.size else 0.0
+                    if energy > SPEECH_ENERGY:
+                        speech += seconds
+                        silence = 0.0
+                    else:
+                        silence += seconds
+                    if speech and silence >= endpointing:
+                        await asyncio.sleep(latency)
+                        await websocket.send_text(_deepgram_result(words_for(speech), 0.0, received, True, True))
+                        speech = 0.0
+                    elif interim and speech and received - last_interim >= interim_interval:
+                        last_interim = received
+                        await websocket.send_text(_deepgram_result(words_for(speech), 0.0, received, False, False))
+                elif message.get("text"):
+                    if json.loads(message["text"]).get("type") == "CloseStream":
+                        if speech:
+                            await asyncio.sleep(latency)
+                            await websocket.send_text(_deepgram_result(words_for(speech), 0.0, received, True, False))
+                        await websocket.send_text(json.dumps({"type": "Metadata", "request_id": str(uuid.uuid4()),
+                                                              "duration": received, "channels": 1}))
+                        await websocket.close()
+                        return
+                elif message["type"] == "websocket.disconnect":
+                    return
+        except WebSocketDisconnect:
+            return
+
+    return app
+
+
+def run_in_thread(app, port, host="127.0.0.1"):
+    """
+    Start an app with uvicorn on a daemon thread and wait until it accepts requests.
+
+    Returns:
+        uvicorn.Server: The server; set server.should_exit = True to stop it.
+    """
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added before every response")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between streamed tokens")
+    parser.add_argument("--speech-rtf", type=float, default=0.0, help="Seconds of synthesis per second of speech")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency, token_delay=args.token_delay, speech_rtf=args.speech_rtf),
+                host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/piper_latency.py
+"""
+Measure the latency and throughput of the Piper server (piper_server.py) under concurrency.
+
+For each concurrency level, that many clients send --requests requests each, back to back.
+The report shows the p50/p95 time to the first audio byte after the WAV header, the p50/p95
+time to the full response, and the throughput in requests per second and seconds of audio
+generated per second.
+
+Start the server first, e.g. with a small test voice on CPU:
+    PIPER_MODEL=en_US-lessac-low.onnx python piper_server.py --workers 4
+
+Usage:
+    python -m benchmarks.piper_latency [--url http://localhost:5000] [--concurrency 1,4,16] [--requests 8]
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from voice_assistant.tracing import percentile
+
+TEXTS = [
+    "Hello! How can I help you today?",
+    "The sky looks blue because air scatters blue light more than red light.",
+    "Sure. Here is a short story about a robot who learns to paint. It practiced every evening until the colors looked right.",
+    "Goodbye!",
+]
+WAV_HEADER_BYTES = 44
+
+
+async def run_request(client, url, text):
+    """
+    Send one request and return (first audio seconds, total seconds, audio bytes).
+    """
+    start = time.perf_counter()
+    first_audio = None
+    received = 0
+    async with client.stream("POST", f"{url}/synthesize/", json={"text": text}) as response:
+        response.raise_for_status()
+        sample_rate = int(response.headers.get("X-Sample-Rate", 22050))
+        async for chunk in response.aiter_bytes():
+            received += len(chunk)
+            if first_audio is None and received > WAV_HEADER_BYTES:
+                first_audio = time.perf_counter() - start
+    return first_audio, time.perf_counter() - start, max(0, received - WAV_HEADER_BYTES) / (2 * sample_rate)
+
+
+async def run_level(url, concurrency, requests):
+    """
+    Run one concurrency level and return its report row.
+    """
+    results = []
+
+    async def client_loop(client, offset):
+        for index in range(requests):
+            results.append(await run_request(client, url, TEXTS[(offset + index) % len(TEXTS)]))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client, offset) for offset in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    first_audio = [result[0] * 1000 for result in results if result[0] is not None]
+    total = [result[1] * 1000 for result in results]
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "first_audio_p50": percentile(first_audio, 50),
+        "first_audio_p95": percentile(first_audio, 95),
+        "total_p50": percentile(total, 50),
+        "total_p95": percentile(total, 95),
+        "requests_per_sec": len(results) / elapsed,
+        "audio_per_sec": sum(result[2] for result in results) / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=8, help="Requests per client")
+    args = parser.parse_args()
+
+    # Load the voice and open connections before measuring
+    asyncio.run(run_level(args.url, 1, 1))
+
+    print(f"{'clients':>8}{'requests':>9}{'first p50':>10}{'first p95':>10}{'total p50':>10}{'total p95':>10}"
+          f"{'req/s':>8}{'audio s/s':>10}")
+    for concurrency in (int(level) for level in args.concurrency.split(",")):
+        row = asyncio.run(run_level(args.url, concurrency, args.requests))
+        print(f"{row['concurrency']:>8}{row['requests']:>9}{row['first_audio_p50']:>10.0f}{row['first_audio_p95']:>10.0f}"
+              f"{row['total_p50']:>10.0f}{row['total_p95']:>10.0f}{row['requests_per_sec']:>8.2f}{row['audio_per_sec']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
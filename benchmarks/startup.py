@@ -0,0 +1,199 @@
+# benchmarks/startup.py
+"""
+Measure the startup time and memory of the assistant for each provider configuration.
+
+Each configuration (transcription/response/tts) runs in a fresh interpreter started with
+python -X importtime, which imports the assistant (run_voice_assistant) and loads the
+selected providers: it builds their clients and imports their SDKs, i.e. everything loaded
+before the first turn apart from the network warm-up and the audio devices. The report shows
+the wall time of the process, the time spent importing and loading, the peak RSS, the number
+of modules loaded and the slowest third-party imports.
+
+With --eager, every configuration is also measured with all the backend SDKs imported up
+front, the way the assistant imported them before backends were loaded lazily, to show the
+saving.
+
+Usage:
+    python -m benchmarks.startup [--configs openai/openai/openai,deepgram/groq/elevenlabs]
+        [--eager] [--runs 3] [--top 3]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+DEFAULT_CONFIGS = [
+    "openai/openai/openai",
+    "deepgram/groq/deepgram",
+    "groq/groq/elevenlabs",
+    "fastwhisperapi/ollama/melotts",
+    "deepgram/openai/cartesia",
+]
+
+# Modules each model loads by the first turn, besides its client
+PROVIDER_MODULES = {
+    'openai': ['openai'],
+    'groq': ['groq'],
+    'deepgram': ['deepgram'],
+    'elevenlabs': ['elevenlabs', 'elevenlabs.client'],
+    'cartesia': ['cartesia'],
+    'ollama': ['ollama'],
+    'fastwhisperapi': ['requests'],
+    'melotts': ['requests'],
+    'piper': ['requests'],
+}
+
+# Providers with a client in voice_assistant.clients
+CLIENT_PROVIDERS = ('openai', 'groq', 'deepgram', 'elevenlabs', 'cartesia', 'ollama')
+
+# What importing the assistant used to load regardless of the configuration
+EAGER_MODULES = ['httpx', 'ollama', 'requests', 'openai', 'groq', 'deepgram', 'elevenlabs', 'elevenlabs.client',
+                 'cartesia', 'soundfile', 'numpy', 'pyaudio', 'pydub', 'speech_recognition']
+
+_OWN_MODULES = {'benchmarks', 'run_voice_assistant', 'voice_assistant'}
+
+
+def load(config, eager):
+    """
+    Import the assistant and load the providers of a configuration in this process.
+
+    Returns:
+    dict: Load time in ms, peak RSS in MB and the number of loaded modules.
+    """
+    start = time.perf_counter()
+    if eager:
+        for name in EAGER_MODULES:
+            try:
+                # Unlike importlib.import_module, __import__ is reported by -X importtime
+                __import__(name)
+            except ImportError:
+                pass
+
+    transcription, response, tts = config.split("/")
+    from voice_assistant.config import Config
+
+    Config.TRANSCRIPTION_MODEL, Config.RESPONSE_MODEL, Config.TTS_MODEL = transcription, response, tts
+    import run_voice_assistant  # noqa: F401
+    from voice_assistant.clients import get_client
+
+    for model in (transcription, response, tts):
+        if model in CLIENT_PROVIDERS:
+            get_client(model, "startup-benchmark")
+        for name in PROVIDER_MODULES.get(model, []):
+            __import__(name)
+
+    return {
+        "load_ms": (time.perf_counter() - start) * 1000,
+        "rss_mb": _peak_rss_mb(),
+        "modules": len(sys.modules),
+    }
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def slowest_imports(importtime_output, top):
+    """
+    Return the slowest third-party packages from python -X importtime output.
+
+    Returns:
+    list: (package, cumulative ms) tuples, slowest first.
+    """
+    stdlib = getattr(sys, "stdlib_module_names", ())
+    packages = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        name = name.strip()
+        if "." in name or name in stdlib or name in _OWN_MODULES or name.startswith("_"):
+            continue
+        try:
+            packages[name] = max(packages.get(name, 0.0), int(cumulative) / 1000)
+        except ValueError:
+            continue
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def measure(config, eager, runs, top):
+    """
+    Start a fresh interpreter per run and return the median measurements of the configuration.
+    """
+    command = [sys.executable, "-X", "importtime", "-m", "benchmarks.startup", "--child", config]
+    if eager:
+        command.append("--eager")
+    env = dict(os.environ)
+    # The clients are only built, never called, so placeholder keys are enough
+    for name in ("OPENAI_API_KEY", "GROQ_API_KEY", "DEEPGRAM_API_KEY", "ELEVENLABS_API_KEY", "CARTESIA_API_KEY"):
+        env.setdefault(name, "startup-benchmark")
+
+    results, imports = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.run(command, capture_output=True, text=True, env=env)
+        wall_ms = (time.perf_counter() - start) * 1000
+        if process.returncode != 0:
+            raise RuntimeError(f"{config} failed to load:\n{process.stderr[-2000:]}")
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        result["wall_ms"] = wall_ms
+        results.append(result)
+        if imports is None:
+            imports = slowest_imports(process.stderr, top)
+
+    row = {"config": config, "mode": "eager" if eager else "lazy", "imports": imports}
+    for key in ("wall_ms", "load_ms", "rss_mb", "modules"):
+        values = [result[key] for result in results if result[key] is not None]
+        row[key] = statistics.median(values) if values else None
+    return row
+
+
+def _print_row(row):
+    imports = ", ".join(f"{name} {ms:.0f}" for name, ms in row["imports"])
+    rss = f"{row['rss_mb']:>8.1f}" if row["rss_mb"] is not None else f"{'-':>8}"
+    print(f"{row['config']:<32}{row['mode']:<7}{row['wall_ms']:>9.0f}{row['load_ms']:>9.0f}{rss}"
+          f"{row['modules']:>9.0f}  {imports}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", default=",".join(DEFAULT_CONFIGS),
+                        help="Comma-separated transcription/response/tts configurations")
+    parser.add_argument("--eager", action="store_true", help="Also measure with all backend SDKs imported up front")
+    parser.add_argument("--runs", type=int, default=3, help="Interpreter starts per configuration (median reported)")
+    parser.add_argument("--top", type=int, default=3, help="Slowest third-party imports to show")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(load(args.child, args.eager)))
+        return
+
+    print(f"{'configuration':<32}{'mode':<7}{'wall ms':>9}{'load ms':>9}{'rss MB':>8}{'modules':>9}  slowest imports (ms)")
+    for config in args.configs.split(","):
+        lazy = measure(config, False, args.runs, args.top)
+        _print_row(lazy)
+        if args.eager:
+            eager = measure(config, True, args.runs, args.top)
+            _print_row(eager)
+            print(f"{'':<32}{'saved':<7}{eager['wall_ms'] - lazy['wall_ms']:>9.0f}"
+                  f"{eager['load_ms'] - lazy['load_ms']:>9.0f}"
+                  + (f"{eager['rss_mb'] - lazy['rss_mb']:>8.1f}" if lazy['rss_mb'] is not None else f"{'-':>8}")
+                  + f"{eager['modules'] - lazy['modules']:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
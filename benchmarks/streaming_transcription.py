@@ -0,0 +1,89 @@
+# benchmarks/streaming_transcription.py
+"""
+Replay voice_samples through transcription.transcribe_stream against the local mock server.
+
+Each sample is decoded to 16 kHz mono PCM, followed by a stretch of silence, and fed in
+30 ms frames (paced in real time unless --fast is given). The report shows the number of
+partial transcripts and the time from the end of speech to the final transcript.
+
+Usage:
+    python -m benchmarks.streaming_transcription [--model deepgram|fastwhisperapi] [--latency 0.05]
+"""
+
+import argparse
+import glob
+import os
+import time
+
+from pydub import AudioSegment
+
+from benchmarks.mock_servers import create_app, run_in_thread
+from voice_assistant import transcription
+from voice_assistant.config import Config
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+
+
+def load_frames(path, trailing_silence):
+    """
+    Decode a sample into 16-bit mono PCM frames, followed by silence.
+    """
+    segment = AudioSegment.from_file(path).set_channels(1).set_frame_rate(SAMPLE_RATE).set_sample_width(2)
+    segment += AudioSegment.silent(duration=int(trailing_silence * 1000), frame_rate=SAMPLE_RATE)
+    pcm = segment.raw_data
+    frame_bytes = SAMPLE_RATE * 2 * FRAME_MS // 1000
+    frames = [pcm[i:i + frame_bytes] for i in range(0, len(pcm), frame_bytes)]
+    speech_frames = len(frames) - int(trailing_silence * 1000 / FRAME_MS)
+    return frames, speech_frames
+
+
+def replay(frames, speech_frames, realtime, marks):
+    """
+    Yield frames like a microphone would and record when the last speech frame was sent.
+    """
+    for index, frame in enumerate(frames):
+        if realtime:
+            time.sleep(FRAME_MS / 1000)
+        yield frame
+        if index == speech_frames - 1:
+            marks['end_of_speech'] = time.perf_counter()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="deepgram", choices=["deepgram", "fastwhisperapi"])
+    parser.add_argument("--samples", default="voice_samples/*.mp3")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock server latency per response")
+    parser.add_argument("--silence", type=float, default=1.5, help="Seconds of silence after each sample")
+    parser.add_argument("--partial-interval", type=float, default=1.0)
+    parser.add_argument("--fast", action="store_true", help="Send frames as fast as possible")
+    args = parser.parse_args()
+
+    server = run_in_thread(create_app(args.latency), args.port)
+    base_url = f"http://127.0.0.1:{args.port}"
+    Config.DEEPGRAM_BASE_URL = base_url
+    transcription.fast_url = base_url
+
+    print(f"{'sample':<16}{'partials':>9}{'final ms':>10}  transcript")
+    for path in sorted(glob.glob(args.samples)):
+        frames, speech_frames = load_frames(path, args.silence)
+        marks = {}
+        partials = 0
+        final = ""
+        for event in transcription.transcribe_stream(args.model, "mock", replay(frames, speech_frames, not args.fast, marks),
+                                                     SAMPLE_RATE, partial_interval=args.partial_interval):
+            if event.is_final:
+                final = event.text
+                marks['final'] = time.perf_counter()
+            else:
+                partials += 1
+        final_ms = (marks['final'] - marks.get('end_of_speech', marks['final'])) * 1000
+        print(f"{os.path.basename(path):<16}{partials:>9}{final_ms:>10.0f}  {final[:60]}")
+
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,229 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import shutil
+import struct
 import subprocess
+import tempfile
+import uuid
+import wave
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from fastapi.responses import FileResponse
-import os
+from fastapi.responses import StreamingResponse
 
-app = FastAPI()
+PIPER_EXECUTABLE = os.getenv("PIPER_EXECUTABLE", "./piper/piper")  #path to the piper binary
+MODEL_PATH = os.getenv("PIPER_MODEL", "en_US-lessac-medium.onnx")  #path to the .onnx file
+WORKERS = int(os.getenv("PIPER_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])["\')\]]*\s+')
 
 
 class SynthesisRequest(BaseModel):
     text: str
 
-@app.post("/synthesize/")
-def synthesize(request: SynthesisRequest):
-    output_file = "output.wav"
-    piper_executable = "./piper/piper"  #path to the piper binary 
-    model_path = "en_US-lessac-medium.onnx" #path to the .onnx file
 
-    
-    if not os.path.isfile(piper_executable) or not os.access(piper_executable, os.X_OK):
-        raise HTTPException(status_code=500, detail="Piper binary not found or not executable!")
+def split_sentences(text):
+    """
+    Split text into sentences so the first one can be returned while the rest are synthesized.
+    """
+    return [sentence for sentence in (part.strip() for part in _SENTENCE_END.split(text)) if sentence]
+
+
+def wav_stream_header(sample_rate, channels=1, sample_width=2):
+    """
+    Return a WAV header for a stream of unknown length (sizes set to the maximum, as usual for streamed WAV).
+    """
+    byte_rate = sample_rate * channels * sample_width
+    return (b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, channels * sample_width, sample_width * 8)
+            + b"data" + struct.pack("<I", 0xFFFFFFFF))
+
+
+class InProcessWorker:
+    """
+    A Piper voice loaded in this process with the piper-tts package (ONNX runtime).
+    """
+
+    def __init__(self, model_path):
+        from piper.voice import PiperVoice
+
+        self.voice = PiperVoice.load(model_path)
+        self.sample_rate = self.voice.config.sample_rate
+
+    def synthesize(self, text):
+        """
+        Synthesize text and return 16-bit mono PCM.
+        """
+        if hasattr(self.voice, "synthesize_stream_raw"):
+            return b"".join(self.voice.synthesize_stream_raw(text))
+        # piper-tts >= 1.3 yields audio chunks instead of raw bytes
+        return b"".join(chunk.audio_int16_bytes for chunk in self.voice.synthesize(text))
+
+    def close(self):
+        pass
+
+
+class SubprocessWorker:
+    """
+    A long-lived Piper process that keeps the voice loaded between requests.
+
+    Requests are sent as JSON lines on stdin. Piper writes each one to the given output file
+    and prints its path when done; every request gets its own file in a private directory,
+    which is read back into memory and removed immediately.
+    """
+
+    def __init__(self, executable, model_path):
+        self.executable = executable
+        self.model_path = model_path
+        with open(f"{model_path}.json") as f:
+            self.sample_rate = json.load(f)["audio"]["sample_rate"]
+        self.directory = tempfile.mkdtemp(prefix="piper-")
+        self.process = None
+        self._start()
+
+    def _start(self):
+        self.process = subprocess.Popen([self.executable, "--model", self.model_path, "--json-input"],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                        text=True, bufsize=1)
+
+    def synthesize(self, text):
+        """
+        Synthesize text and return 16-bit mono PCM.
+        """
+        if self.process.poll() is not None:
+            self._start()
+        output_file = os.path.join(self.directory, f"{uuid.uuid4().hex}.wav")
+        self.process.stdin.write(json.dumps({"text": text, "output_file": output_file}) + "\n")
+        self.process.stdin.flush()
+        if not self.process.stdout.readline():
+            raise RuntimeError("Piper worker exited unexpectedly")
+        try:
+            with wave.open(output_file, "rb") as wav_file:
+                return wav_file.readframes(wav_file.getnframes())
+        finally:
+            os.remove(output_file)
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        shutil.rmtree(self.directory, ignore_errors=True)
 
-    
-    if not os.path.exists(model_path):
-        raise HTTPException(status_code=500, detail="Piper model file not found!")
 
+class WorkerPool:
+    """
+    A fixed set of workers with the voice loaded, handed out to one request at a time.
 
-    command = [piper_executable, "--model", model_path, "--output_file", output_file]
+    Args:
+    workers (list): The workers; all must use the same voice.
+    """
 
+    def __init__(self, workers):
+        self.workers = workers
+        self.sample_rate = workers[0].sample_rate
+        self.busy = 0
+        self.waiting = 0
+        self._idle = None
+
+    async def acquire(self):
+        # The queue is created lazily so it belongs to the server's event loop
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for worker in self.workers:
+                self._idle.put_nowait(worker)
+        self.waiting += 1
+        try:
+            worker = await self._idle.get()
+        finally:
+            self.waiting -= 1
+        self.busy += 1
+        return worker
+
+    def release(self, worker):
+        self.busy -= 1
+        self._idle.put_nowait(worker)
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+
+def create_pool(size, backend="auto"):
+    """
+    Start size workers. The 'python' backend needs the piper-tts package, 'subprocess' the
+    Piper binary; 'auto' prefers the package and falls back to the binary.
+    """
+    if not os.path.exists(MODEL_PATH):
+        raise RuntimeError("Piper model file not found!")
+    if backend in ("auto", "python"):
+        try:
+            return WorkerPool([InProcessWorker(MODEL_PATH) for _ in range(size)])
+        except ImportError:
+            if backend == "python":
+                raise
+    if not os.path.isfile(PIPER_EXECUTABLE) or not os.access(PIPER_EXECUTABLE, os.X_OK):
+        raise RuntimeError("Piper binary not found or not executable!")
+    return WorkerPool([SubprocessWorker(PIPER_EXECUTABLE, MODEL_PATH) for _ in range(size)])
+
+
+pool = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global pool
+    # The pool is already running when started with __main__
+    if pool is None:
+        pool = create_pool(WORKERS, os.getenv("PIPER_BACKEND", "auto"))
     try:
-        
-        process = subprocess.run(command, input=request.text.encode(), stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-
-        
-        if os.path.exists(output_file):
-            return FileResponse(output_file, media_type="audio/wav")
-        else:
-            raise HTTPException(status_code=500, detail="Piper did not generate an audio file.")
-    
-    except subprocess.CalledProcessError as e:
-        error_message = e.stderr.decode() if e.stderr else "Unknown error"
-        raise HTTPException(status_code=500, detail=f"Speech synthesis failed: {error_message}")
+        yield
+    finally:
+        pool.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.post("/synthesize/")
+async def synthesize(request: SynthesisRequest):
+    sentences = split_sentences(request.text)
+    if not sentences:
+        raise HTTPException(status_code=400, detail="No text to synthesize")
+
+    async def audio():
+        # Acquired on the first read, so a response that is never sent does not hold a worker
+        worker = await pool.acquire()
+        synthesis = None
+        try:
+            yield wav_stream_header(pool.sample_rate)
+            for sentence in sentences:
+                synthesis = asyncio.ensure_future(asyncio.to_thread(worker.synthesize, sentence))
+                # Shielded: a client disconnect cancels the wait, not the thread using the worker
+                yield await asyncio.shield(synthesis)
+        finally:
+            if synthesis is None or synthesis.done():
+                pool.release(worker)
+            else:
+                synthesis.add_done_callback(lambda _: pool.release(worker))
+
+    return StreamingResponse(audio(), media_type="audio/wav", headers={"X-Sample-Rate": str(pool.sample_rate)})
+
+
+@app.get("/metrics")
+async def metrics():
+    return {"workers": len(pool.workers), "busy": pool.busy, "waiting": pool.waiting}
+
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=5000)
+    parser = argparse.ArgumentParser(description="Piper TTS server with a pool of resident workers")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--backend", default="auto", choices=["auto", "python", "subprocess"])
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+    pool = create_pool(args.workers, args.backend)
+    uvicorn.run(app, host="0.0.0.0", port=args.port)
@@ -1,15 +1,25 @@
 # voice_assistant/main.py
 
+import asyncio
 import logging
 import time
+from functools import partial
 from colorama import Fore, init
-from voice_assistant.audio import record_audio, play_audio
-from voice_assistant.transcription import transcribe_audio
-from voice_assistant.response_generation import generate_response
-from voice_assistant.text_to_speech import text_to_speech
+from voice_assistant.audio import record_audio, play_audio, stream_audio_frames, wait_for_barge_in
+from voice_assistant.transcription import transcribe_audio, atranscribe_audio, transcribe_stream, get_input_audio_format
+from voice_assistant.response_generation import generate_response, agenerate_response
+from voice_assistant.text_to_speech import text_to_speech, atext_to_speech, play_speech, speaks_while_streaming
 from voice_assistant.utils import delete_file
+from voice_assistant.streaming import LatencyReport, get_output_file, run_streaming_turn
 from voice_assistant.config import Config
 from voice_assistant.api_key_manager import get_transcription_api_key, get_response_api_key, get_tts_api_key
+from voice_assistant.clients import prewarm_configured_clients
+from voice_assistant.tts_cache import warm_up_tts_cache
+from voice_assistant.speculation import SpeculativeResponder
+from voice_assistant.context import new_conversation_context
+from voice_assistant.failover import start_turn_budget, end_turn_budget
+from voice_assistant.providers import get_capabilities
+from voice_assistant.tracing import span
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -20,78 +30,289 @@ init(autoreset=True)
 import threading
 
 
+def _new_context():
+    """
+    Return a new conversation context holding only the system prompt.
+    """
+    return new_conversation_context(api_key=get_response_api_key())
+
+
+def _is_exit_request(user_input):
+    """
+    Check if the user wants to exit the program.
+    """
+    return "goodbye" in user_input.lower() or "arrivederci" in user_input.lower()
+
+
+def _record_utterance():
+    """
+    Record the next utterance from the microphone.
+
+    Returns:
+    str or RecordedAudio: The in-memory recording, or the path it was saved to.
+    """
+    if Config.IN_MEMORY_AUDIO:
+        # Keep the recording in memory in the format the transcription model takes
+        return record_audio(None, audio_format=get_input_audio_format(Config.TRANSCRIPTION_MODEL),
+                            sample_rate=Config.INPUT_SAMPLE_RATE, continuous=Config.CONTINUOUS_CAPTURE,
+                            pre_roll=Config.VAD_PRE_ROLL, min_energy=Config.VAD_MIN_ENERGY)
+
+    # Record audio from the microphone and save it as 'test.mp3'
+    record_audio(Config.INPUT_AUDIO, sample_rate=Config.INPUT_SAMPLE_RATE, continuous=Config.CONTINUOUS_CAPTURE,
+                 pre_roll=Config.VAD_PRE_ROLL, min_energy=Config.VAD_MIN_ENERGY)
+    return Config.INPUT_AUDIO
+
+
+def _speak_streaming(tts_api_key, text, report):
+    """
+    Play the reply while its speech streams in and wait until it has been played. A file is only
+    written if Config.TTS_RECORD_AUDIO asks for a recording.
+    """
+    from voice_assistant.playback import get_playback_engine
+    record_path = get_output_file(Config.TTS_MODEL, streamed=True) if Config.TTS_RECORD_AUDIO else None
+    play_speech(Config.TTS_MODEL, tts_api_key, text, Config.LOCAL_MODEL_PATH,
+                on_start=lambda: report.mark('first_audio'), record_path=record_path)
+    get_playback_engine().wait()
+
+
+def _transcribe_streaming(transcription_api_key, on_partial=None):
+    """
+    Capture the next utterance and transcribe it as it is spoken.
+
+    Args:
+    transcription_api_key (str): The API key for the transcription service.
+    on_partial (callable): Called with each partial transcript.
+
+    Returns:
+    str: The final transcript.
+    """
+    frames = stream_audio_frames(sample_rate=Config.INPUT_SAMPLE_RATE, pre_roll=Config.VAD_PRE_ROLL,
+                                 min_energy=Config.VAD_MIN_ENERGY)
+    for event in transcribe_stream(Config.TRANSCRIPTION_MODEL, transcription_api_key, frames,
+                                   Config.INPUT_SAMPLE_RATE, Config.LOCAL_MODEL_PATH,
+                                   Config.STREAMING_PARTIAL_INTERVAL):
+        if event.is_final:
+            return event.text
+        logging.info(Fore.LIGHTBLACK_EX + "Partial: " + event.text + Fore.RESET)
+        if on_partial is not None:
+            on_partial(event.text)
+    return ""
+
+
+def _start_tts_cache_warmup():
+    """
+    Pre-render the configured fixed phrases into the TTS cache on a background thread.
+    """
+    if Config.TTS_CACHE and Config.TTS_CACHE_WARMUP_PHRASES:
+        threading.Thread(target=warm_up_tts_cache, args=(Config.TTS_MODEL, get_tts_api_key(),
+                         Config.TTS_CACHE_WARMUP_PHRASES, Config.LOCAL_MODEL_PATH), daemon=True).start()
+
+
 def main():
     """
     Main function to run the voice assistant.
     """
-    chat_history = [
-        {"role": "system", "content": """ You are a helpful Assistant called Verbi. 
-         You are friendly and fun and you will help the users with their requests.
-         Your answers are short and concise. """}
-    ]
+    if Config.ASYNC_MAIN:
+        asyncio.run(async_main())
+        return
+
+    context = _new_context()
+
+    # Build the backend clients once and open their connections before the first turn
+    if Config.PREWARM_CLIENTS:
+        prewarm_configured_clients()
+    _start_tts_cache_warmup()
+
+    # Keep listening while the assistant speaks so the user can interrupt it
+    barge_in = None
+    if Config.BARGE_IN and Config.CONTINUOUS_CAPTURE:
+        barge_in = partial(wait_for_barge_in, sample_rate=Config.INPUT_SAMPLE_RATE, pre_roll=Config.VAD_PRE_ROLL,
+                           min_energy=Config.VAD_MIN_ENERGY, min_speech=Config.BARGE_IN_MIN_SPEECH,
+                           energy_ratio=Config.BARGE_IN_ENERGY_RATIO)
+
+    # Start generating the response on stable partial transcripts while the user is still speaking
+    speculator = None
+    if Config.SPECULATIVE_RESPONSE and Config.STREAMING_TRANSCRIPTION:
+        speculator = SpeculativeResponder(
+            Config.RESPONSE_MODEL, get_response_api_key(), Config.LOCAL_MODEL_PATH,
+            stable_partials=Config.SPECULATION_STABLE_PARTIALS, min_words=Config.SPECULATION_MIN_WORDS,
+            tts_model=Config.TTS_MODEL if Config.SPECULATIVE_TTS and Config.STREAMING_PIPELINE else None,
+            tts_api_key=get_tts_api_key())
 
     while True:
-        try:
-            # Record audio from the microphone and save it as 'test.wav'
-            record_audio(Config.INPUT_AUDIO)
+        with span('turn'):
+            try:
+                # Get the API key for transcription
+                transcription_api_key = get_transcription_api_key()
 
-            # Get the API key for transcription
-            transcription_api_key = get_transcription_api_key()
-            
-            # Transcribe the audio file
-            user_input = transcribe_audio(Config.TRANSCRIPTION_MODEL, transcription_api_key, Config.INPUT_AUDIO, Config.LOCAL_MODEL_PATH)
+                if Config.STREAMING_TRANSCRIPTION:
+                    # Transcribe while the user is speaking; the final transcript ends the utterance
+                    on_partial = (lambda text: speculator.on_partial(context.messages, text)) if speculator else None
+                    user_input = _transcribe_streaming(transcription_api_key, on_partial)
+                    start_turn_budget()
+                else:
+                    # Record audio from the microphone and transcribe it, the turn latency budget
+                    # starts when the user stops speaking
+                    audio = _record_utterance()
+                    start_turn_budget()
+                    user_input = transcribe_audio(Config.TRANSCRIPTION_MODEL, transcription_api_key, audio, Config.LOCAL_MODEL_PATH)
+
+                # Check if the transcription is empty and restart the recording if it is. This check will avoid empty requests if vad_filter is used in the fastwhisperapi.
+                if not user_input:
+                    logging.info("No transcription was returned. Starting recording again.")
+                    if speculator:
+                        speculator.cancel()
+                    continue
+                logging.info(Fore.GREEN + "You said: " + user_input + Fore.RESET)
 
-            # Check if the transcription is empty and restart the recording if it is. This check will avoid empty requests if vad_filter is used in the fastwhisperapi.
-            if not user_input:
-                logging.info("No transcription was returned. Starting recording again.")
-                continue
-            logging.info(Fore.GREEN + "You said: " + user_input + Fore.RESET)
+                # Check if the user wants to exit the program
+                if _is_exit_request(user_input):
+                    if speculator:
+                        speculator.cancel()
+                    break
 
-            # Check if the user wants to exit the program
-            if "goodbye" in user_input.lower() or "arrivederci" in user_input.lower():
-                break
+                # Continue the speculative response if it was started for this transcript
+                speculation = speculator.on_final(user_input) if speculator else None
 
-            # Append the user's input to the chat history
-            chat_history.append({"role": "user", "content": user_input})
+                # Append the user's input to the chat history
+                context.append({"role": "user", "content": user_input})
 
-            # Get the API key for response generation
-            response_api_key = get_response_api_key()
+                # Get the API key for response generation
+                response_api_key = get_response_api_key()
 
-            # Generate a response
-            response_text = generate_response(Config.RESPONSE_MODEL, response_api_key, chat_history, Config.LOCAL_MODEL_PATH)
-            logging.info(Fore.CYAN + "Response: " + response_text + Fore.RESET)
+                # Get the API key for TTS
+                tts_api_key = get_tts_api_key()
 
-            # Append the assistant's response to the chat history
-            chat_history.append({"role": "assistant", "content": response_text})
+                if Config.STREAMING_PIPELINE:
+                    # Stream the response into per-sentence TTS and overlapped playback
+                    response_text, report = run_streaming_turn(
+                        context.messages, Config.RESPONSE_MODEL, response_api_key, Config.TTS_MODEL, tts_api_key,
+                        Config.LOCAL_MODEL_PATH, barge_in=barge_in,
+                        responses=speculation.stream() if speculation else None,
+                        prefetched_audio=speculation.prefetched_audio if speculation else None)
+                    logging.info(Fore.CYAN + "Response: " + response_text + Fore.RESET)
+                    # Only the part of the reply the user heard is kept if they interrupted it
+                    context.append({"role": "assistant", "content": response_text})
+                    report.log()
+                    continue
 
-            # Determine the output file format based on the TTS model
-            if Config.TTS_MODEL == 'openai' or Config.TTS_MODEL == 'elevenlabs' or Config.TTS_MODEL == 'melotts' or Config.TTS_MODEL == 'cartesia':
-                output_file = 'output.mp3'
-            else:
-                output_file = 'output.wav'
+                report = LatencyReport()
 
-            # Get the API key for TTS
-            tts_api_key = get_tts_api_key()
+                # Generate a response
+                if speculation:
+                    response_text = "".join(speculation.stream())
+                else:
+                    response_text = generate_response(Config.RESPONSE_MODEL, response_api_key, context.messages, Config.LOCAL_MODEL_PATH)
+                report.mark('first_token')
+                logging.info(Fore.CYAN + "Response: " + response_text + Fore.RESET)
 
-            # Convert the response text to speech and save it to the appropriate file
-            text_to_speech(Config.TTS_MODEL, tts_api_key, response_text, output_file, Config.LOCAL_MODEL_PATH)
+                # Append the assistant's response to the chat history
+                context.append({"role": "assistant", "content": response_text})
 
-            # Play the generated speech audio
-            if Config.TTS_MODEL=="cartesia":
-                pass
-            else:
-                play_audio(output_file)
+                if speaks_while_streaming(Config.TTS_MODEL):
+                    # Play the speech while it streams in instead of downloading it to a file first
+                    _speak_streaming(tts_api_key, response_text, report)
+                    report.mark('end_of_turn')
+                    report.log()
+                    continue
+
+                # Determine the output file format based on the TTS model
+                output_file = get_output_file(Config.TTS_MODEL)
+
+                # Some providers (Cartesia) play the audio themselves while it streams
+                plays_audio = get_capabilities('tts', Config.TTS_MODEL).plays_audio
+                if plays_audio:
+                    report.mark('first_audio')
+
+                # Convert the response text to speech and save it to the appropriate file
+                text_to_speech(Config.TTS_MODEL, tts_api_key, response_text, output_file, Config.LOCAL_MODEL_PATH)
+
+                # Play the generated speech audio
+                report.mark('first_audio')
+                if not plays_audio:
+                    play_audio(output_file)
+                report.mark('end_of_turn')
+                report.log()
             
-            # Clean up audio files
-            # delete_file(Config.INPUT_AUDIO)
-            # delete_file(output_file)
-
-        except Exception as e:
-            logging.error(Fore.RED + f"An error occurred: {e}" + Fore.RESET)
-            delete_file(Config.INPUT_AUDIO)
-            if 'output_file' in locals():
-                delete_file(output_file)
-            time.sleep(1)
+                # Clean up audio files
+                # delete_file(Config.INPUT_AUDIO)
+                # delete_file(output_file)
+
+            except Exception as e:
+                logging.error(Fore.RED + f"An error occurred: {e}" + Fore.RESET)
+                delete_file(Config.INPUT_AUDIO)
+                if 'output_file' in locals():
+                    delete_file(output_file)
+                time.sleep(1)
+            finally:
+                end_turn_budget()
+
+async def async_main():
+    """
+    Run the voice assistant on the async backend API.
+
+    Backend calls use the SDKs' async clients with per-call timeouts from Config. Recording
+    and playback run on worker threads so they do not block the event loop.
+    """
+    context = _new_context()
+    _start_tts_cache_warmup()
+
+    while True:
+        with span('turn'):
+            try:
+                # Record audio from the microphone and transcribe it
+                transcription_api_key = get_transcription_api_key()
+                audio = await asyncio.to_thread(_record_utterance)
+                start_turn_budget()
+                user_input = await atranscribe_audio(Config.TRANSCRIPTION_MODEL, transcription_api_key, audio,
+                                                     Config.LOCAL_MODEL_PATH, timeout=Config.TRANSCRIPTION_TIMEOUT)
+
+                if not user_input:
+                    logging.info("No transcription was returned. Starting recording again.")
+                    continue
+                logging.info(Fore.GREEN + "You said: " + user_input + Fore.RESET)
+
+                if _is_exit_request(user_input):
+                    break
+
+                context.append({"role": "user", "content": user_input})
+
+                report = LatencyReport()
+
+                # Generate a response
+                response_text = await agenerate_response(Config.RESPONSE_MODEL, get_response_api_key(), context.messages,
+                                                         Config.LOCAL_MODEL_PATH, timeout=Config.RESPONSE_TIMEOUT)
+                report.mark('first_token')
+                logging.info(Fore.CYAN + "Response: " + response_text + Fore.RESET)
+                context.append({"role": "assistant", "content": response_text})
+
+                if speaks_while_streaming(Config.TTS_MODEL):
+                    await asyncio.to_thread(_speak_streaming, get_tts_api_key(), response_text, report)
+                    report.mark('end_of_turn')
+                    report.log()
+                    continue
+
+                # Convert the response text to speech and play it
+                output_file = get_output_file(Config.TTS_MODEL)
+                plays_audio = get_capabilities('tts', Config.TTS_MODEL).plays_audio
+                if plays_audio:
+                    report.mark('first_audio')
+                await atext_to_speech(Config.TTS_MODEL, get_tts_api_key(), response_text, output_file,
+                                      Config.LOCAL_MODEL_PATH, timeout=Config.TTS_TIMEOUT)
+                report.mark('first_audio')
+                if not plays_audio:
+                    await asyncio.to_thread(play_audio, output_file)
+                report.mark('end_of_turn')
+                report.log()
+
+            except Exception as e:
+                logging.error(Fore.RED + f"An error occurred: {e}" + Fore.RESET)
+                delete_file(Config.INPUT_AUDIO)
+                if 'output_file' in locals():
+                    delete_file(output_file)
+                await asyncio.sleep(1)
+            finally:
+                end_turn_budget()
 
 if __name__ == "__main__":
     main()
@@ -8,7 +8,7 @@ setup(
     packages=find_packages(),
     install_requires=[
         'speechrecognition',
-        'pygame',
+        'pyaudio',
         'openai',
         'groq',
         'deepgram-sdk',
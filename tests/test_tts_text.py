@@ -0,0 +1,28 @@
+import pytest
+
+from voice_assistant.tts_text import normalize_for_speech
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("$5", "five dollars."),
+    ("$1.50", "one dollar and fifty cents."),
+    ("$1,299.99", "one thousand two hundred ninety-nine dollars and ninety-nine cents."),
+    ("1,299.99", "one thousand two hundred ninety-nine point nine nine."),
+    ("10:00", "ten o'clock."),
+    ("10:05 AM", "ten oh five AM."),
+    ("18:30", "eighteen thirty."),
+    ("3.11.7", "three point eleven point seven."),
+    ("-5", "minus five."),
+    ("It is -3.5 degrees", "It is minus three point five degrees."),
+    ("pages 10-20", "pages ten-twenty."),
+    ("50%", "fifty percent."),
+    ("1st", "first."),
+    ("Main St.", "Main Street."),
+    ("I live on Main St. Next year", "I live on Main Street. Next year."),
+    ("123 Main St., Boston", "one hundred twenty-three Main Street, Boston."),
+    ("St. Louis", "Saint Louis."),
+    ("Visit St. Louis.", "Visit Saint Louis."),
+    ("Dr. Smith", "Doctor Smith."),
+])
+def test_normalize_for_speech(text, expected):
+    assert normalize_for_speech(text) == expected
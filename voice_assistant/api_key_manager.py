@@ -1,32 +1,17 @@
 # voice_assistant/api_key_manager.py
 
 from voice_assistant.config import Config
-
-API_KEY_MAPPING= {
-    "transcription":{
-        "openai": Config.OPENAI_API_KEY,
-        "groq": Config.GROQ_API_KEY,
-        "deepgram": Config.DEEPGRAM_API_KEY
-    },
-    "response":{
-        "openai":Config.OPENAI_API_KEY,
-        "groq": Config.GROQ_API_KEY
-    },
-    "tts": {
-        "openai": Config.OPENAI_API_KEY,
-        "deepgram":Config.DEEPGRAM_API_KEY,
-        "elevenlabs": Config.ELEVENLABS_API_KEY
-    }
-}
+from voice_assistant.providers import find_provider
 
 def get_api_key(service, model):
     """
     Select the API key for the specified service and model
     
     Returns:
-    str: The API key for the transcription, response or tts service.
+    str: The API key for the transcription, response or tts service, or None if the model does not need one.
     """
-    return API_KEY_MAPPING.get(service, {}).get(model)
+    provider = find_provider(service, model)
+    return provider.api_key() if provider is not None else None
 
 def get_transcription_api_key():
     """
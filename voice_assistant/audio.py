@@ -1,32 +1,118 @@
 # voice_assistant/audio.py
 
-import speech_recognition as sr
-import pygame
 import time
 import logging
-import pydub
+import wave
 from io import BytesIO
-from pydub import AudioSegment
 from functools import lru_cache
 
+# The audio device modules (capture, playback, speech_recognition, pydub) are imported on first
+# use, so RecordedAudio can be used without them, e.g. by the gateway
+from voice_assistant.tracing import audio_duration, span, traced
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+_MIME_TYPES = {'wav': 'audio/wav', 'flac': 'audio/flac', 'pcm': 'audio/l16', 'mp3': 'audio/mpeg'}
+
+
+class RecordedAudio:
+    """
+    An in-memory recording, encoded in a format a transcription backend can take directly.
+
+    Args:
+    data (bytes): The encoded audio.
+    audio_format (str): 'wav' or 'flac' (16-bit PCM in a container) or 'pcm' (raw 16-bit little-endian PCM).
+    sample_rate (int): Sample rate of the audio in Hz.
+    sample_width (int): Bytes per sample.
+    channels (int): Number of channels.
+    """
+
+    def __init__(self, data, audio_format, sample_rate, sample_width=2, channels=1):
+        self.data = data
+        self.audio_format = audio_format
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.channels = channels
+
+    @property
+    def name(self):
+        """File name to use when uploading the audio."""
+        return f"audio.{self.audio_format}"
+
+    @property
+    def mime_type(self):
+        """MIME type of the encoded audio."""
+        return _MIME_TYPES[self.audio_format]
+
+    def to_wav(self):
+        """
+        Return the audio as a WAV recording, wrapping raw PCM in a WAV header if needed.
+
+        Returns:
+        RecordedAudio: A WAV recording (self if the audio is not raw PCM).
+        """
+        if self.audio_format != 'pcm':
+            return self
+        buffer = BytesIO()
+        with wave.open(buffer, 'wb') as wav_file:
+            wav_file.setnchannels(self.channels)
+            wav_file.setsampwidth(self.sample_width)
+            wav_file.setframerate(self.sample_rate)
+            wav_file.writeframes(self.data)
+        return RecordedAudio(buffer.getvalue(), 'wav', self.sample_rate, self.sample_width, self.channels)
+
+
+def encode_audio_data(audio_data, audio_format='wav', sample_rate=16000):
+    """
+    Encode speech_recognition AudioData in memory, without ffmpeg or disk I/O.
+
+    Args:
+    audio_data (sr.AudioData): The captured audio.
+    audio_format (str): 'wav', 'flac' or 'pcm'.
+    sample_rate (int): Sample rate to resample to (16 kHz is what Whisper-style models use).
+
+    Returns:
+    RecordedAudio: The encoded audio.
+    """
+    if audio_format == 'wav':
+        data = audio_data.get_wav_data(convert_rate=sample_rate, convert_width=2)
+    elif audio_format == 'flac':
+        data = audio_data.get_flac_data(convert_rate=sample_rate, convert_width=2)
+    elif audio_format == 'pcm':
+        data = audio_data.get_raw_data(convert_rate=sample_rate, convert_width=2)
+    else:
+        raise ValueError(f"Unsupported in-memory audio format: {audio_format}")
+    return RecordedAudio(data, audio_format, sample_rate)
+
+
 @lru_cache(maxsize=None)
 def get_recognizer():
     """
     Return a cached speech recognizer instance
     """
+    import speech_recognition as sr
     return sr.Recognizer()
 
+@lru_cache(maxsize=None)
+def get_vad(sample_rate, frame_ms, pause_threshold, phrase_threshold, pre_roll, min_energy):
+    """
+    Return a cached voice activity detector, so its noise floor persists across turns.
+    """
+    from voice_assistant.capture import EnergyVAD
+    return EnergyVAD(sample_rate, frame_ms=frame_ms, pause_threshold=pause_threshold,
+                     phrase_threshold=phrase_threshold, pre_roll=pre_roll, min_energy=min_energy)
+
+@traced('record')
 def record_audio(file_path, timeout=10, phrase_time_limit=None, retries=3, energy_threshold=2000, 
                  pause_threshold=1, phrase_threshold=0.1, dynamic_energy_threshold=True, 
-                 calibration_duration=1):
+                 calibration_duration=1, audio_format='wav', sample_rate=16000,
+                 continuous=False, pre_roll=0.3, min_energy=300):
     """
-    Record audio from the microphone and save it as an MP3 file.
+    Record audio from the microphone and save it as an MP3 file, or return it in memory.
     
     Args:
-    file_path (str): The path to save the recorded audio file.
+    file_path (str): The path to save the recorded audio file. If None, the audio is returned in memory.
     timeout (int): Maximum time to wait for a phrase to start (in seconds).
     phrase_time_limit (int): Maximum time for the phrase to be recorded (in seconds).
     retries (int): Number of retries if recording fails.
@@ -35,7 +121,19 @@ def record_audio(file_path, timeout=10, phrase_time_limit=None, retries=3, energ
     phrase_threshold (float): Minimum length of a phrase to consider for recording (in seconds).
     dynamic_energy_threshold (bool): Whether to enable dynamic energy threshold adjustment.
     calibration_duration (float): Duration of the ambient noise calibration (in seconds).
+    audio_format (str): In-memory format ('wav', 'flac' or 'pcm'), used when file_path is None.
+    sample_rate (int): In-memory sample rate, used when file_path is None.
+    continuous (bool): Use the always-open microphone stream and streaming VAD instead of
+        opening and calibrating a new microphone for every turn.
+    pre_roll (float): Seconds of audio kept before the detected start of speech (continuous mode).
+    min_energy (float): Minimum RMS energy counted as speech (continuous mode).
+
+    Returns:
+    RecordedAudio: The recording when file_path is None, otherwise None.
     """
+    import speech_recognition as sr
+    from voice_assistant.capture import get_microphone_stream
+
     recognizer = get_recognizer()
     recognizer.energy_threshold = energy_threshold
     recognizer.pause_threshold = pause_threshold
@@ -44,19 +142,27 @@ def record_audio(file_path, timeout=10, phrase_time_limit=None, retries=3, energ
     
     for attempt in range(retries):
         try:
+            if continuous:
+                stream = get_microphone_stream(sample_rate)
+                vad = get_vad(stream.sample_rate, stream.frame_ms, pause_threshold, phrase_threshold, pre_roll, min_energy)
+                logging.info("Recording started")
+                with span('record.listen') as listen:
+                    audio_data = stream.listen(vad, timeout=timeout, phrase_time_limit=phrase_time_limit)
+                    listen.set(audio_seconds=_duration(audio_data))
+                logging.info("Recording complete")
+                return _save_audio_data(audio_data, file_path, audio_format, sample_rate)
+
             with sr.Microphone() as source:
                 logging.info("Calibrating for ambient noise...")
-                recognizer.adjust_for_ambient_noise(source, duration=calibration_duration)
+                with span('record.calibrate'):
+                    recognizer.adjust_for_ambient_noise(source, duration=calibration_duration)
                 logging.info("Recording started")
                 # Listen for the first phrase and extract it into audio data
-                audio_data = recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_time_limit)
+                with span('record.listen') as listen:
+                    audio_data = recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_time_limit)
+                    listen.set(audio_seconds=_duration(audio_data))
                 logging.info("Recording complete")
-
-                # Convert the recorded audio data to an MP3 file
-                wav_data = audio_data.get_wav_data()
-                audio_segment = pydub.AudioSegment.from_wav(BytesIO(wav_data))
-                mp3_data = audio_segment.export(file_path, format="mp3", bitrate="128k", parameters=["-ar", "22050", "-ac", "1"])
-                return
+                return _save_audio_data(audio_data, file_path, audio_format, sample_rate)
         except sr.WaitTimeoutError:
             logging.warning(f"Listening timed out, retrying... ({attempt + 1}/{retries})")
         except Exception as e:
@@ -66,22 +172,91 @@ def record_audio(file_path, timeout=10, phrase_time_limit=None, retries=3, energ
         
     logging.error("Recording failed after all retries")
 
+def stream_audio_frames(timeout=10, phrase_time_limit=None, pause_threshold=1, phrase_threshold=0.1,
+                        sample_rate=16000, pre_roll=0.3, min_energy=300):
+    """
+    Yield the frames of the next utterance from the always-open microphone while the user speaks.
+
+    Args:
+    timeout (int): Maximum time to wait for a phrase to start (in seconds).
+    phrase_time_limit (int): Maximum time for the phrase to be recorded (in seconds).
+    pause_threshold (float): How much silence ends the phrase if the consumer has not stopped earlier (in seconds).
+    phrase_threshold (float): Minimum length of speech that starts a phrase (in seconds).
+    sample_rate (int): Capture sample rate.
+    pre_roll (float): Seconds of audio kept before the detected start of speech.
+    min_energy (float): Minimum RMS energy counted as speech.
+
+    Returns:
+    generator: 16-bit mono PCM frames.
+    """
+    from voice_assistant.capture import get_microphone_stream
+    stream = get_microphone_stream(sample_rate)
+    vad = get_vad(stream.sample_rate, stream.frame_ms, pause_threshold, phrase_threshold, pre_roll, min_energy)
+    return stream.utterance_frames(vad, timeout=timeout, phrase_time_limit=phrase_time_limit)
+
+def wait_for_barge_in(stop_event, sample_rate=16000, pause_threshold=1, phrase_threshold=0.1, pre_roll=0.3,
+                      min_energy=300, min_speech=0.3, energy_ratio=6.0):
+    """
+    Block until the user starts speaking on the always-open microphone, or stop_event is set.
+
+    The VAD is shared with record_audio and stream_audio_frames (for the same thresholds), so
+    the utterance that interrupted the assistant is continued by the next recording.
+
+    Args:
+    stop_event (threading.Event): Set to stop watching.
+    sample_rate (int): Capture sample rate.
+    pause_threshold (float): How much silence ends a phrase (in seconds).
+    phrase_threshold (float): Minimum length of speech that starts a phrase (in seconds).
+    pre_roll (float): Seconds of audio kept before the detected start of speech.
+    min_energy (float): Minimum RMS energy counted as speech.
+    min_speech (float): Seconds of continuous speech needed to count as barge-in.
+    energy_ratio (float): Speech threshold over the noise floor while the assistant is speaking.
+
+    Returns:
+    bool: True if the user started speaking.
+    """
+    from voice_assistant.capture import get_microphone_stream
+    stream = get_microphone_stream(sample_rate)
+    vad = get_vad(stream.sample_rate, stream.frame_ms, pause_threshold, phrase_threshold, pre_roll, min_energy)
+    return stream.watch_for_speech(vad, stop_event, min_speech=min_speech, energy_ratio=energy_ratio)
+
+def _duration(audio_data):
+    """
+    Return the duration of speech_recognition AudioData in seconds.
+    """
+    return len(audio_data.frame_data) / (audio_data.sample_rate * audio_data.sample_width)
+
+def _save_audio_data(audio_data, file_path, audio_format, sample_rate):
+    """
+    Return the recording in memory when file_path is None, otherwise save it as an MP3 file.
+    """
+    with span('record.encode', format=audio_format if file_path is None else 'mp3') as encode:
+        if file_path is None:
+            recording = encode_audio_data(audio_data, audio_format, sample_rate)
+            encode.set(bytes=len(recording.data))
+            return recording
+
+        # Convert the recorded audio data to an MP3 file
+        import pydub
+        wav_data = audio_data.get_wav_data()
+        audio_segment = pydub.AudioSegment.from_wav(BytesIO(wav_data))
+        audio_segment.export(file_path, format="mp3", bitrate="128k", parameters=["-ar", "22050", "-ac", "1"])
+
+def _trace_playback(span, arguments, result):
+    span.set(audio_seconds=audio_duration(arguments['file_path']))
+
+@traced('playback', annotate=_trace_playback)
 def play_audio(file_path):
     """
-    Play an audio file using pygame.
+    Play an audio file on the shared playback engine and wait until it has finished.
     
     Args:
     file_path (str): The path to the audio file to play.
     """
     try:
-        pygame.mixer.init()
-        pygame.mixer.music.load(file_path)
-        pygame.mixer.music.play()
-        while pygame.mixer.music.get_busy():
-            pygame.time.wait(100)
-    except pygame.error as e:
-        logging.error(f"Failed to play audio: {e}")
+        from voice_assistant.playback import get_playback_engine
+        engine = get_playback_engine()
+        engine.play_file(file_path)
+        engine.wait()
     except Exception as e:
-        logging.error(f"An unexpected error occurred while playing audio: {e}")
-    finally:
-        pygame.mixer.quit()
\ No newline at end of file
+        logging.error(f"An unexpected error occurred while playing audio: {e}")
\ No newline at end of file
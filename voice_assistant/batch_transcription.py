@@ -0,0 +1,235 @@
+# voice_assistant/batch_transcription.py
+"""
+Bulk transcription of audio files, e.g. to re-transcribe call recordings.
+
+transcribe_batch walks directories and manifests and transcribes the files with a bounded
+number of requests in flight. Requests are throttled with a token bucket per provider and
+failed files are retried with exponential backoff. Every result is appended to a JSONL file
+as soon as it is ready, and the transcribed files are recorded in a checkpoint file, so an
+interrupted job resumes where it stopped. Providers with the batch capability (local) get
+several recordings per inference call.
+
+A manifest is a text file with one audio path per line, or a JSONL file with a "path" field
+per line; relative paths are resolved against the manifest's directory.
+
+Usage:
+    python -m voice_assistant.batch_transcription SOURCE [SOURCE ...] --output results.jsonl
+        [--model openai] [--concurrency 8] [--rpm 20] [--retries 3] [--batch-size 8] [--checkpoint FILE]
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from colorama import Fore
+
+from voice_assistant.config import Config
+from voice_assistant.providers import get_provider
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac', '.ogg', '.m4a', '.mp4', '.webm')
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: acquire() blocks until a token is available.
+
+    Args:
+    rate (float): Tokens added per second.
+    capacity (float): Maximum number of tokens, i.e. the largest burst.
+    """
+
+    def __init__(self, rate, capacity=1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+
+def find_audio_files(sources):
+    """
+    Expand directories (recursively) and manifests into audio file paths.
+
+    Args:
+    sources (list): Directories, manifests (.txt or .jsonl) and audio files.
+
+    Returns:
+    list: The audio file paths, in order and without duplicates.
+    """
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            for directory, _, files in sorted(os.walk(source)):
+                paths.extend(os.path.join(directory, name) for name in sorted(files)
+                             if name.lower().endswith(AUDIO_EXTENSIONS))
+        elif source.lower().endswith(('.txt', '.jsonl')):
+            paths.extend(_read_manifest(source))
+        else:
+            paths.append(source)
+    return list(dict.fromkeys(paths))
+
+
+def _read_manifest(manifest):
+    base = os.path.dirname(os.path.abspath(manifest))
+    with open(manifest) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            path = json.loads(line)["path"] if manifest.lower().endswith('.jsonl') else line
+            yield os.path.join(base, path)
+
+
+def _read_checkpoint(checkpoint_path):
+    if not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path) as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+def _with_retries(request, retries, backoff):
+    """
+    Call request, retrying failures with exponential backoff and jitter.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return request()
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            logging.warning(f"Transcription failed ({e}), retrying in {delay:.1f} s")
+            time.sleep(delay)
+
+
+def transcribe_batch(sources, output_path, model=None, api_key=None, local_model_path=None, concurrency=None,
+                     requests_per_minute=None, retries=None, batch_size=None, checkpoint_path=None):
+    """
+    Transcribe the audio files in the sources and write the results as JSONL.
+
+    Each line of the output is {"path", "text", "model", "seconds"} for a transcribed file, or
+    {"path", "error", "model"} for a file that still failed after the retries. Lines are
+    written in completion order. Files listed in the checkpoint are skipped; failed files are
+    not checkpointed, so they are tried again when the job is resumed.
+
+    Args:
+    sources (list): Directories, manifests and audio files (see find_audio_files).
+    output_path (str): The JSONL file. Appended to when resuming from a checkpoint.
+    model (str): The transcription provider, defaults to Config.TRANSCRIPTION_MODEL.
+    api_key (str): The API key for the transcription service.
+    local_model_path (str): The path to the local model (if applicable).
+    concurrency (int): Requests in flight, defaults to Config.BATCH_CONCURRENCY for the provider.
+    requests_per_minute (float): Request rate limit, defaults to Config.BATCH_RATE_LIMITS for the provider.
+    retries (int): Retries per request, defaults to Config.BATCH_RETRIES.
+    batch_size (int): Recordings per request for providers with the batch capability, defaults to Config.BATCH_SIZE.
+    checkpoint_path (str): The checkpoint file, defaults to output_path + '.checkpoint'.
+
+    Returns:
+    dict: The number of files transcribed, skipped (already in the checkpoint) and failed.
+    """
+    model = model or Config.TRANSCRIPTION_MODEL
+    provider = get_provider('transcription', model)
+    concurrency = concurrency or Config.BATCH_CONCURRENCY.get(model, Config.BATCH_DEFAULT_CONCURRENCY)
+    requests_per_minute = requests_per_minute or Config.BATCH_RATE_LIMITS.get(model)
+    retries = Config.BATCH_RETRIES if retries is None else retries
+    batch_size = (batch_size or Config.BATCH_SIZE) if provider.capabilities.batch else 1
+    checkpoint_path = checkpoint_path or f"{output_path}.checkpoint"
+
+    done = _read_checkpoint(checkpoint_path)
+    paths = find_audio_files(sources)
+    pending = [path for path in paths if path not in done]
+    counts = {"transcribed": 0, "skipped": len(paths) - len(pending), "failed": 0}
+    logging.info(Fore.CYAN + f"Batch transcription with {model}: {len(pending)} files to transcribe, "
+                 f"{counts['skipped']} already done" + Fore.RESET)
+    bucket = TokenBucket(requests_per_minute / 60.0) if requests_per_minute else None
+
+    def transcribe(batch):
+        def request():
+            if bucket is not None:
+                bucket.acquire()
+            if len(batch) == 1:
+                return [provider.transcribe(api_key, batch[0], local_model_path)]
+            return provider.transcribe_batch(api_key, batch, local_model_path)
+        start = time.perf_counter()
+        texts = _with_retries(request, retries, backoff=Config.BATCH_BACKOFF)
+        return texts, (time.perf_counter() - start) / len(batch)
+
+    batches = iter([pending[i:i + batch_size] for i in range(0, len(pending), batch_size)])
+    # Resuming appends to the output of the interrupted job, a new job starts a new output
+    with open(output_path, "a" if done else "w") as output, open(checkpoint_path, "a") as checkpoint, \
+            ThreadPoolExecutor(max_workers=concurrency) as pool:
+        in_flight = {}
+        while True:
+            # Only submit what can run, so long jobs do not queue every file up front
+            while len(in_flight) < concurrency:
+                batch = next(batches, None)
+                if batch is None:
+                    break
+                in_flight[pool.submit(transcribe, batch)] = batch
+            if not in_flight:
+                break
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                batch = in_flight.pop(future)
+                try:
+                    texts, seconds = future.result()
+                except Exception as e:
+                    logging.error(f"{Fore.RED}Failed to transcribe {len(batch)} file(s): {e}{Fore.RESET}")
+                    for path in batch:
+                        output.write(json.dumps({"path": path, "error": str(e), "model": model}) + "\n")
+                    counts["failed"] += len(batch)
+                    output.flush()
+                    continue
+                for path, text in zip(batch, texts):
+                    output.write(json.dumps({"path": path, "text": text, "model": model,
+                                             "seconds": round(seconds, 3)}) + "\n")
+                output.flush()
+                # The checkpoint is written after the output, so a crash repeats a result instead of losing it
+                checkpoint.write("".join(f"{path}\n" for path in batch))
+                checkpoint.flush()
+                counts["transcribed"] += len(batch)
+    logging.info(Fore.CYAN + f"Batch transcription finished: {counts}" + Fore.RESET)
+    return counts
+
+
+def main():
+    from voice_assistant.api_key_manager import get_api_key
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="+", help="Directories, manifests (.txt, .jsonl) or audio files")
+    parser.add_argument("--output", required=True, help="JSONL file to write the transcripts to")
+    parser.add_argument("--model", default=Config.TRANSCRIPTION_MODEL, help="Transcription provider")
+    parser.add_argument("--concurrency", type=int, help="Requests in flight")
+    parser.add_argument("--rpm", type=float, help="Maximum requests per minute")
+    parser.add_argument("--retries", type=int, help="Retries per request")
+    parser.add_argument("--batch-size", type=int, help="Recordings per inference call (local)")
+    parser.add_argument("--checkpoint", help="Checkpoint file, defaults to OUTPUT.checkpoint")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    counts = transcribe_batch(args.sources, args.output, args.model, get_api_key("transcription", args.model),
+                              Config.LOCAL_MODEL_PATH, args.concurrency, args.rpm, args.retries, args.batch_size,
+                              args.checkpoint)
+    if counts["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
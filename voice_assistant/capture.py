@@ -0,0 +1,453 @@
+# voice_assistant/capture.py
+
+import collections
+import logging
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
+import pyaudio
+import speech_recognition as sr
+from pydub import AudioSegment
+
+from voice_assistant.config import Config
+from voice_assistant.playback import decode_audio
+
+
+class RingBuffer:
+    """
+    Fixed-size buffer of audio frames. When full, the oldest frames are dropped.
+
+    Args:
+    capacity (int): Maximum number of frames to hold.
+    """
+
+    def __init__(self, capacity):
+        self._frames = collections.deque(maxlen=capacity)
+        self._condition = threading.Condition()
+        self.dropped = 0
+
+    def write(self, frame):
+        """
+        Append a frame, overwriting the oldest one if the buffer is full.
+
+        Args:
+        frame (bytes): The audio frame.
+        """
+        with self._condition:
+            if len(self._frames) == self._frames.maxlen:
+                self.dropped += 1
+            self._frames.append(frame)
+            self._condition.notify()
+
+    def read(self, timeout=None):
+        """
+        Pop the oldest frame, waiting up to timeout seconds for one to arrive.
+
+        Args:
+        timeout (float): Seconds to wait, or None to wait forever.
+
+        Returns:
+        bytes: The frame, or None on timeout.
+        """
+        with self._condition:
+            if not self._frames and not self._condition.wait_for(lambda: self._frames, timeout):
+                return None
+            return self._frames.popleft()
+
+    def clear(self):
+        """
+        Discard all buffered frames.
+        """
+        with self._condition:
+            self._frames.clear()
+
+
+class EnergyVAD:
+    """
+    Incremental energy-based voice activity detector with an adaptive noise floor.
+
+    Frames are classified as speech when their RMS energy exceeds the noise floor by
+    energy_ratio (and min_energy). The noise floor follows the energy of non-speech frames,
+    so it adapts continuously instead of being calibrated before each turn.
+
+    Args:
+    sample_rate (int): Sample rate of the frames in Hz.
+    frame_ms (int): Duration of one frame in milliseconds.
+    pause_threshold (float): Seconds of silence that end an utterance.
+    phrase_threshold (float): Seconds of speech needed to start an utterance.
+    pre_roll (float): Seconds of audio kept from before the start of speech.
+    energy_ratio (float): How far above the noise floor a frame must be to count as speech.
+    min_energy (float): Minimum RMS energy for speech, regardless of the noise floor.
+    noise_adapt (float): Smoothing factor of the noise floor update (0-1).
+    """
+
+    def __init__(self, sample_rate, frame_ms=30, pause_threshold=1.0, phrase_threshold=0.1, pre_roll=0.3,
+                 energy_ratio=3.0, min_energy=300, noise_adapt=0.05):
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.pause_frames = max(1, int(pause_threshold * 1000 / frame_ms))
+        self.start_frames = max(1, int(phrase_threshold * 1000 / frame_ms))
+        self.energy_ratio = energy_ratio
+        self.min_energy = min_energy
+        self.noise_adapt = noise_adapt
+        self.noise_floor = None
+        self._pre_roll = collections.deque(maxlen=max(1, int(pre_roll * 1000 / frame_ms)) + self.start_frames)
+        self.reset()
+
+    def reset(self):
+        """
+        Drop any partial utterance. The noise floor is kept.
+        """
+        self._pre_roll.clear()
+        self._frames = []
+        self._speech_run = 0
+        self._silence_run = 0
+        self.in_speech = False
+
+    def is_speech(self, frame):
+        """
+        Classify a frame and update the noise floor when it is not speech.
+
+        Args:
+        frame (bytes): 16-bit mono PCM frame.
+
+        Returns:
+        bool: True if the frame contains speech.
+        """
+        samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+        energy = float(np.sqrt(np.mean(samples * samples))) if samples.size else 0.0
+        if self.noise_floor is None:
+            self.noise_floor = energy
+        speech = energy > max(self.noise_floor * self.energy_ratio, self.min_energy)
+        if not speech:
+            self.noise_floor += self.noise_adapt * (energy - self.noise_floor)
+        return speech
+
+    def process(self, frame):
+        """
+        Feed one frame to the detector.
+
+        Args:
+        frame (bytes): 16-bit mono PCM frame.
+
+        Returns:
+        bytes: The raw PCM of a completed utterance, or None if no utterance ended on this frame.
+        """
+        speech = self.is_speech(frame)
+        if not self.in_speech:
+            self._pre_roll.append(frame)
+            self._speech_run = self._speech_run + 1 if speech else 0
+            if self._speech_run >= self.start_frames:
+                self.in_speech = True
+                self._frames = list(self._pre_roll)
+                self._pre_roll.clear()
+                self._silence_run = 0
+            return None
+
+        self._frames.append(frame)
+        self._silence_run = 0 if speech else self._silence_run + 1
+        if self._silence_run >= self.pause_frames:
+            return self.finish()
+        return None
+
+    @property
+    def pending(self):
+        """Frames of the utterance in progress, starting with the pre-roll."""
+        return list(self._frames)
+
+    def finish(self):
+        """
+        End the current utterance, e.g. when a phrase time limit is reached.
+
+        Returns:
+        bytes: The raw PCM of the utterance, or None if no utterance was in progress.
+        """
+        if not self.in_speech:
+            return None
+        utterance = b"".join(self._frames)
+        self.reset()
+        return utterance
+
+
+class MicrophoneStream:
+    """
+    An always-open microphone feeding a ring buffer from PyAudio's capture thread.
+
+    Args:
+    sample_rate (int): Capture sample rate in Hz.
+    frame_ms (int): Frame duration in milliseconds.
+    buffer_seconds (float): Capacity of the ring buffer.
+    device_index (int): PyAudio input device, or None for the default device.
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=30, buffer_seconds=30, device_index=None):
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.device_index = device_index
+        self.frames_per_buffer = int(sample_rate * frame_ms / 1000)
+        self.buffer = RingBuffer(int(buffer_seconds * 1000 / frame_ms))
+        self._audio = None
+        self._stream = None
+        self._resume = False
+
+    def start(self):
+        """
+        Open the input stream. Frames are written to the ring buffer from then on.
+        """
+        if self._stream is not None:
+            return
+        self._audio = pyaudio.PyAudio()
+        self._stream = self._audio.open(format=pyaudio.paInt16, channels=1, rate=self.sample_rate, input=True,
+                                        input_device_index=self.device_index,
+                                        frames_per_buffer=self.frames_per_buffer,
+                                        stream_callback=self._on_frame)
+        self._stream.start_stream()
+        logging.info(f"Microphone stream opened at {self.sample_rate} Hz")
+
+    def _on_frame(self, in_data, frame_count, time_info, status):
+        self.buffer.write(in_data)
+        return (None, pyaudio.paContinue)
+
+    def close(self):
+        """
+        Stop and close the input stream.
+        """
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._audio is not None:
+            self._audio.terminate()
+            self._audio = None
+
+    def _is_active(self):
+        return self._stream is not None and self._stream.is_active()
+
+    def listen(self, vad, timeout=None, phrase_time_limit=None):
+        """
+        Wait for the next utterance.
+
+        Frames captured before the call (e.g. while the assistant was speaking) are discarded.
+
+        Args:
+        vad (EnergyVAD): The detector to segment the audio with.
+        timeout (float): Maximum time to wait for speech to start (in seconds).
+        phrase_time_limit (float): Maximum length of the utterance (in seconds).
+
+        Returns:
+        sr.AudioData: The utterance, including the pre-roll.
+
+        Raises:
+        sr.WaitTimeoutError: If no speech started within timeout.
+        """
+        frames = self.utterance_frames(vad, timeout=timeout, phrase_time_limit=phrase_time_limit)
+        return sr.AudioData(b"".join(frames), self.sample_rate, 2)
+
+    def utterance_frames(self, vad, timeout=None, phrase_time_limit=None):
+        """
+        Yield the frames of the next utterance while it is being spoken.
+
+        The pre-roll is yielded as soon as speech starts, then each frame as it is captured,
+        until the VAD detects the end of the utterance. Consumers that detect the end earlier
+        (e.g. a streaming transcriber) can simply stop iterating. If watch_for_speech detected
+        speech, the utterance it started is continued instead of discarded.
+
+        Args:
+        vad (EnergyVAD): The detector to segment the audio with.
+        timeout (float): Maximum time to wait for speech to start (in seconds).
+        phrase_time_limit (float): Maximum length of the utterance (in seconds).
+
+        Yields:
+        bytes: 16-bit mono PCM frames.
+
+        Raises:
+        sr.WaitTimeoutError: If no speech started within timeout.
+        """
+        self.start()
+        started = time.monotonic()
+        speech_frames = 0
+        max_frames = None if phrase_time_limit is None else int(phrase_time_limit * 1000 / self.frame_ms)
+        if self._resume and vad.in_speech:
+            pending = vad.pending
+            speech_frames = len(pending)
+            yield from pending
+        else:
+            self.buffer.clear()
+            vad.reset()
+        self._resume = False
+        while True:
+            frame = self.buffer.read(timeout=1.0)
+            if frame is None:
+                # The stream stopped delivering frames
+                if not self._is_active():
+                    raise OSError("Microphone stream is not active")
+                continue
+
+            was_in_speech = vad.in_speech
+            utterance = vad.process(frame)
+            if was_in_speech:
+                yield frame
+            elif vad.in_speech:
+                yield from vad.pending
+            if vad.in_speech:
+                speech_frames += 1
+                if max_frames is not None and speech_frames >= max_frames:
+                    utterance = vad.finish()
+            if utterance is not None:
+                return
+            if not vad.in_speech and timeout is not None and time.monotonic() - started > timeout:
+                raise sr.WaitTimeoutError("listening timed out while waiting for phrase to start")
+
+
+    def watch_for_speech(self, vad, stop_event, min_speech=0.3, energy_ratio=None):
+        """
+        Block until the user starts speaking or stop_event is set, e.g. to detect barge-in
+        while the assistant is talking.
+
+        When speech is detected, the frames are kept in the VAD and the next call to
+        utterance_frames continues the same utterance, so its start is not lost.
+
+        Args:
+        vad (EnergyVAD): The detector shared with utterance_frames.
+        stop_event (threading.Event): Set to stop watching.
+        min_speech (float): Seconds of continuous speech required, to ignore short noises.
+        energy_ratio (float): Stricter speech threshold to use while watching, to avoid
+            triggering on the assistant's own voice picked up by the microphone.
+
+        Returns:
+        bool: True if speech was detected, False if stop_event was set first.
+        """
+        self.start()
+        self.buffer.clear()
+        vad.reset()
+        required = max(1, int(min_speech * 1000 / self.frame_ms))
+        default_ratio = vad.energy_ratio
+        if energy_ratio is not None:
+            vad.energy_ratio = energy_ratio
+        try:
+            speech_frames = 0
+            while not stop_event.is_set():
+                frame = self.buffer.read(timeout=0.1)
+                if frame is None:
+                    continue
+                vad.process(frame)
+                speech_frames = speech_frames + 1 if vad.in_speech else 0
+                if speech_frames >= required:
+                    self._resume = True
+                    return True
+            return False
+        finally:
+            vad.energy_ratio = default_ratio
+
+
+class FileMicrophoneStream(MicrophoneStream):
+    """
+    A stand-in microphone that speaks audio files into the ring buffer, for reproducible benchmarks.
+
+    Like a user taking turns with the assistant, each file is only spoken once the next
+    utterance is being listened for, after lead seconds of silence, and the rest of it is
+    dropped if listening stops early (e.g. endpointing on a pause). Silence is produced between
+    files and after the last one, paced like a real device.
+
+    Args:
+    files (list): The audio files, one utterance each.
+    sample_rate (int): Capture sample rate in Hz.
+    frame_ms (int): Frame duration in milliseconds.
+    lead (float): Seconds of silence before each utterance.
+    speed (float): Pace of the frames relative to real time.
+    """
+
+    def __init__(self, files, sample_rate=16000, frame_ms=30, lead=0.5, speed=1.0):
+        super().__init__(sample_rate=sample_rate, frame_ms=frame_ms)
+        self.files = list(files)
+        self.lead = lead
+        self.speed = speed
+        self.utterance_ends = []  # time.perf_counter() of the last voiced frame of each utterance
+        self.finished = threading.Event()
+        self._listens = 0
+        self._listening = False
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """
+        Start producing frames.
+        """
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._feed, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """
+        Stop producing frames.
+        """
+        self._running = False
+
+    def _is_active(self):
+        return self._running
+
+    def utterance_frames(self, vad, timeout=None, phrase_time_limit=None):
+        self._listens += 1
+        self._listening = True
+        try:
+            yield from super().utterance_frames(vad, timeout=timeout, phrase_time_limit=phrase_time_limit)
+        finally:
+            self._listening = False
+
+    def _load(self, path):
+        with open(path, "rb") as audio_file:
+            pcm, sample_rate, channels = decode_audio(audio_file.read())
+        segment = AudioSegment(pcm, sample_width=2, frame_rate=sample_rate, channels=channels)
+        return segment.set_channels(1).set_frame_rate(self.sample_rate).raw_data
+
+    def _feed(self):
+        frame_bytes = self.frames_per_buffer * 2
+        silence = bytes(frame_bytes)
+        next_frame = time.perf_counter()
+
+        def write(frame):
+            nonlocal next_frame
+            next_frame += self.frame_ms / 1000 / self.speed
+            time.sleep(max(0.0, next_frame - time.perf_counter()))
+            self.buffer.write(frame)
+
+        for index, path in enumerate(self.files):
+            pcm = self._load(path)
+            while self._running and self._listens <= index:
+                write(silence)
+            for _ in range(int(self.lead * 1000 / self.frame_ms)):
+                write(silence)
+            last_voiced = time.perf_counter()
+            for offset in range(0, len(pcm), frame_bytes):
+                if not self._running:
+                    return
+                if not self._listening:
+                    break
+                frame = pcm[offset:offset + frame_bytes].ljust(frame_bytes, b"\0")
+                write(frame)
+                samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+                if np.sqrt(np.mean(samples * samples)) >= Config.VAD_MIN_ENERGY:
+                    last_voiced = time.perf_counter()
+            self.utterance_ends.append(last_voiced)
+        self.finished.set()
+        while self._running:
+            write(silence)
+
+
+@lru_cache(maxsize=None)
+def get_microphone_stream(sample_rate=16000, frame_ms=30):
+    """
+    Return the shared microphone stream, opening it on first use. With INPUT_AUDIO_FILES set,
+    the files are spoken into a stand-in microphone instead.
+    """
+    if Config.INPUT_AUDIO_FILES:
+        stream = FileMicrophoneStream(Config.INPUT_AUDIO_FILES, sample_rate=sample_rate, frame_ms=frame_ms,
+                                      speed=Config.INPUT_AUDIO_FILES_SPEED)
+    else:
+        stream = MicrophoneStream(sample_rate=sample_rate, frame_ms=frame_ms)
+    stream.start()
+    return stream
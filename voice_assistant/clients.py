@@ -0,0 +1,301 @@
+# voice_assistant/clients.py
+
+import asyncio
+import logging
+import threading
+import weakref
+
+from voice_assistant.config import Config
+
+_clients = {}
+_lock = threading.Lock()
+# Async clients hold connections bound to the event loop they were created on
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _default_base_url(provider):
+    """
+    Return the configured base URL for a provider, or None to use the SDK default.
+    """
+    return {
+        'openai': Config.OPENAI_BASE_URL,
+        'groq': Config.GROQ_BASE_URL,
+        'deepgram': Config.DEEPGRAM_BASE_URL,
+        'faster_whisper': Config.LOCAL_MODEL_PATH or Config.LOCAL_WHISPER_MODEL,
+        'llama_cpp': Config.LOCAL_LLM_PATH or Config.LOCAL_MODEL_PATH,
+    }.get(provider)
+
+
+# The SDKs are imported by the builders, on first use, so only the selected providers are loaded
+def _openai(api_key, base_url):
+    from openai import OpenAI
+    return OpenAI(api_key=api_key, base_url=base_url)
+
+
+def _groq(api_key, base_url):
+    from groq import Groq
+    return Groq(api_key=api_key, base_url=base_url)
+
+
+def _deepgram(api_key, base_url):
+    from deepgram import DeepgramClient, DeepgramClientOptions
+    if base_url:
+        return DeepgramClient(api_key, DeepgramClientOptions(url=base_url))
+    return DeepgramClient(api_key)
+
+
+def _elevenlabs(api_key, base_url):
+    from elevenlabs.client import ElevenLabs
+    return ElevenLabs(api_key=api_key)
+
+
+def _cartesia(api_key, base_url):
+    from cartesia import Cartesia
+    return Cartesia(api_key=api_key)
+
+
+def _http(api_key, base_url):
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=Config.HTTP_POOL_CONNECTIONS, pool_maxsize=Config.HTTP_POOL_MAXSIZE)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _faster_whisper(api_key, model_path):
+    # In-process model: loaded once from the model directory (or size name, e.g. 'base.en') and kept resident
+    try:
+        from faster_whisper import WhisperModel
+    except ImportError:
+        raise ImportError("Local transcription requires faster-whisper: pip install faster-whisper")
+    return WhisperModel(model_path, device=Config.LOCAL_WHISPER_DEVICE, compute_type=Config.LOCAL_WHISPER_COMPUTE_TYPE,
+                        cpu_threads=Config.LOCAL_WHISPER_THREADS, num_workers=Config.LOCAL_WHISPER_WORKERS)
+
+
+def _llama_cpp(api_key, model_path):
+    # In-process GGUF model, loaded once and kept resident
+    try:
+        from llama_cpp import Llama, LlamaRAMCache
+    except ImportError:
+        raise ImportError("The local response model requires llama-cpp-python: pip install llama-cpp-python")
+    llm = Llama(model_path=model_path, n_ctx=Config.LOCAL_LLM_CONTEXT_SIZE,
+                n_threads=Config.LOCAL_LLM_THREADS or None, verbose=False)
+    if Config.LOCAL_LLM_STATE_CACHE_MB:
+        # The context itself only holds the last prompt; the cache restores the longest matching
+        # state of other conversations
+        llm.set_cache(LlamaRAMCache(capacity_bytes=Config.LOCAL_LLM_STATE_CACHE_MB * 1024 * 1024))
+    return llm
+
+
+def _ollama(api_key, base_url):
+    import ollama
+    return ollama.Client()
+
+
+def _async_openai(api_key, base_url):
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=api_key, base_url=base_url)
+
+
+def _async_groq(api_key, base_url):
+    from groq import AsyncGroq
+    return AsyncGroq(api_key=api_key, base_url=base_url)
+
+
+def _async_elevenlabs(api_key, base_url):
+    from elevenlabs.client import AsyncElevenLabs
+    return AsyncElevenLabs(api_key=api_key)
+
+
+def _async_ollama(api_key, base_url):
+    import ollama
+    return ollama.AsyncClient()
+
+
+def _async_http(api_key, base_url):
+    import httpx
+    limits = httpx.Limits(max_connections=Config.HTTP_POOL_MAXSIZE,
+                          max_keepalive_connections=Config.HTTP_POOL_MAXSIZE)
+    return httpx.AsyncClient(limits=limits, timeout=None)
+
+
+# Client builders by provider: (api_key, base_url) -> client
+_builders = {
+    'openai': _openai,
+    'groq': _groq,
+    'deepgram': _deepgram,
+    'elevenlabs': _elevenlabs,
+    'cartesia': _cartesia,
+    'http': _http,
+    'faster_whisper': _faster_whisper,
+    'llama_cpp': _llama_cpp,
+    'ollama': _ollama,
+}
+
+_async_builders = {
+    'openai': _async_openai,
+    'groq': _async_groq,
+    # The Deepgram client serves both the sync and the async (asyncrest) APIs
+    'deepgram': _deepgram,
+    'elevenlabs': _async_elevenlabs,
+    'ollama': _async_ollama,
+    'http': _async_http,
+}
+
+
+def register_client(provider, builder=None, async_builder=None):
+    """
+    Register the client builders of a provider.
+
+    Builders are called with (api_key, base_url) the first time get_client or get_async_client
+    needs a client for the provider, so they should import the provider's SDK themselves.
+
+    Args:
+    provider (str): The provider name.
+    builder (callable): Builds the sync client.
+    async_builder (callable): Builds the async client.
+    """
+    if builder is not None:
+        _builders[provider] = builder
+    if async_builder is not None:
+        _async_builders[provider] = async_builder
+
+
+def _build_client(provider, api_key, base_url):
+    builder = _builders.get(provider)
+    if builder is None:
+        raise ValueError(f"Unsupported client provider: {provider}")
+    return builder(api_key, base_url)
+
+
+def get_client(provider, api_key=None, base_url=None):
+    """
+    Return a shared client for the provider, building it on first use.
+
+    Clients are cached by (provider, api_key, base_url), so every turn reuses the same
+    HTTP connection pool instead of paying for a new pool and TLS handshake.
+
+    Args:
+    provider (str): The provider name ('openai', 'groq', 'deepgram', 'elevenlabs', 'cartesia', 'ollama', 'http',
+        'faster_whisper', 'llama_cpp').
+    api_key (str): The API key for the provider.
+    base_url (str): Optional base URL override. Defaults to the one configured in Config. For the
+        in-process models ('faster_whisper', 'llama_cpp'), the model path.
+
+    Returns:
+    object: The provider's SDK client, a requests.Session for 'http', or the loaded model.
+    """
+    if base_url is None:
+        base_url = _default_base_url(provider)
+    key = (provider, api_key, base_url)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _build_client(provider, api_key, base_url)
+                _clients[key] = client
+    return client
+
+
+def _build_async_client(provider, api_key, base_url):
+    builder = _async_builders.get(provider)
+    if builder is None:
+        raise ValueError(f"Unsupported async client provider: {provider}")
+    return builder(api_key, base_url)
+
+
+def get_async_client(provider, api_key=None, base_url=None):
+    """
+    Return a shared async client for the provider on the running event loop.
+
+    Like get_client, but clients are cached per event loop because their connection pools
+    cannot be shared across loops. Must be called from a coroutine.
+
+    Args:
+    provider (str): The provider name ('openai', 'groq', 'deepgram', 'elevenlabs', 'ollama', 'http').
+    api_key (str): The API key for the provider.
+    base_url (str): Optional base URL override. Defaults to the one configured in Config.
+
+    Returns:
+    object: The provider's async SDK client, or an httpx.AsyncClient for 'http'.
+    """
+    if base_url is None:
+        base_url = _default_base_url(provider)
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    key = (provider, api_key, base_url)
+    if key not in clients:
+        clients[key] = _build_async_client(provider, api_key, base_url)
+    return clients[key]
+
+
+def get_http_session():
+    """
+    Return the shared requests session used for the local HTTP servers.
+
+    Returns:
+    requests.Session: A session with a keep-alive connection pool.
+    """
+    return get_client('http')
+
+
+def _warm_up(provider, client, url=None):
+    if provider in ('openai', 'groq'):
+        client.with_options(max_retries=0, timeout=5).models.list()
+    elif provider == 'http' and url:
+        client.get(url, timeout=5)
+    elif provider == 'faster_whisper':
+        # The first inference allocates the model's buffers
+        import numpy as np
+        segments, _ = client.transcribe(np.zeros(16000, dtype=np.float32), beam_size=1, without_timestamps=True)
+        list(segments)
+    elif provider == 'llama_cpp':
+        # Every conversation starts with the system prompt, so its KV cache is prefilled up front
+        client.create_chat_completion(messages=[{"role": "system", "content": Config.SYSTEM_PROMPT}], max_tokens=1)
+    elif provider == 'ollama':
+        # An empty prompt loads the model without generating
+        client.generate(model=Config.OLLAMA_LLM, keep_alive=Config.OLLAMA_KEEP_ALIVE)
+
+
+def prewarm_clients(targets):
+    """
+    Build clients ahead of the first turn and open a connection for the ones that pool.
+
+    Failures are logged and ignored, the client is still built lazily on first use.
+
+    Args:
+    targets (list): (provider, api_key, url) tuples. For 'http' the url is the endpoint to touch.
+    """
+    for provider, api_key, url in targets:
+        try:
+            if provider == 'http':
+                client = get_http_session()
+            else:
+                client = get_client(provider, api_key)
+            _warm_up(provider, client, url)
+            logging.info(f"Prewarmed {provider} client")
+        except Exception as e:
+            logging.warning(f"Failed to prewarm {provider} client: {e}")
+
+
+def prewarm_configured_clients():
+    """
+    Prewarm the clients for the transcription, response and TTS models selected in Config.
+    """
+    from voice_assistant.api_key_manager import get_transcription_api_key, get_response_api_key, get_tts_api_key
+    from voice_assistant.providers import get_provider
+
+    targets = []
+    selections = (
+        ('transcription', Config.TRANSCRIPTION_MODEL, get_transcription_api_key()),
+        ('response', Config.RESPONSE_MODEL, get_response_api_key()),
+        ('tts', Config.TTS_MODEL, get_tts_api_key()),
+    )
+    for stage, model, api_key in selections:
+        targets.extend(get_provider(stage, model).prewarm_targets(api_key))
+
+    # Deduplicate, e.g. when OpenAI is used for both transcription and TTS
+    prewarm_clients(list(dict.fromkeys(targets)))
@@ -19,9 +19,11 @@ class Config:
         DEEPGRAM_API_KEY (str): API key for Deepgram services.
         ELEVENLABS_API_KEY (str): API key for ElevenLabs services.
         LOCAL_MODEL_PATH (str): Path to the local model.
+        STREAMING_PIPELINE (bool): Whether to stream the response through sentence-level TTS.
     """
     # Model selection
-    TRANSCRIPTION_MODEL = 'deepgram'  # possible values: openai, groq, deepgram, fastwhisperapi
+    # Providers installed through entry points can be selected by name too (see providers.py)
+    TRANSCRIPTION_MODEL = 'deepgram'  # possible values: openai, groq, deepgram, fastwhisperapi, local
     RESPONSE_MODEL = 'openai'  # possible values: openai, groq, ollama
     TTS_MODEL = 'openai'  # possible values: openai, deepgram, elevenlabs, melotts, cartesia, piper
 
@@ -34,9 +36,24 @@ class Config:
 
     # LLM Selection
     OLLAMA_LLM="llama3:8b"
+    OLLAMA_KEEP_ALIVE = -1  # keep the Ollama model loaded between turns (-1 for ever, or e.g. '30m')
     GROQ_LLM="llama3-8b-8192"
     OPENAI_LLM="gpt-4o"
 
+    # System prompt of every conversation
+    SYSTEM_PROMPT = """ You are a helpful Assistant called Verbi. 
+         You are friendly and fun and you will help the users with their requests.
+         Your answers are short and concise. """
+
+    # Keep the prompt under a token budget in long conversations. When it is exceeded, the oldest
+    # turns are summarized in the background ('summarize', an extra request to the response model)
+    # or dropped ('drop'); the system prompt and recent turns are left unchanged so provider prompt
+    # caching keeps hitting. Tokens are estimated as characters / 4 unless tiktoken is installed.
+    CONTEXT_TOKEN_BUDGET = None  # e.g. 4000, None for no limit
+    CONTEXT_KEEP_RECENT = 4  # most recent messages that are never summarized or dropped
+    CONTEXT_STRATEGY = 'summarize'  # possible values: summarize, drop
+    CONTEXT_COMPACT_RATIO = 0.5  # fraction of the budget left after compacting
+
     # API keys and paths
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
@@ -45,12 +62,176 @@ class Config:
     LOCAL_MODEL_PATH = os.getenv("LOCAL_MODEL_PATH")
     CARTESIA_API_KEY = os.getenv("CARTESIA_API_KEY")
 
+    # Optional base URL overrides, e.g. to point the SDKs at a proxy or a compatible local server
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
+    GROQ_BASE_URL = os.getenv("GROQ_BASE_URL")
+    DEEPGRAM_BASE_URL = os.getenv("DEEPGRAM_BASE_URL")
+
     # for serving the MeloTTS model
     TTS_PORT_LOCAL = 5150
 
+    # FastWhisperAPI server
+    FASTWHISPERAPI_URL = os.getenv("FASTWHISPERAPI_URL", "http://localhost:8000")
+
+    # Run the main loop on the async backend API, with per-call timeouts in seconds
+    ASYNC_MAIN = False
+    TRANSCRIPTION_TIMEOUT = 30
+    RESPONSE_TIMEOUT = 60
+    TTS_TIMEOUT = 60
+
+    # In-process transcription for TRANSCRIPTION_MODEL = 'local' with faster-whisper (pip install faster-whisper).
+    # The model is loaded once from LOCAL_MODEL_PATH (or LOCAL_WHISPER_MODEL, downloaded by size name)
+    # and kept resident; recordings are passed as PCM without a file round trip.
+    LOCAL_WHISPER_MODEL = 'base.en'
+    LOCAL_WHISPER_DEVICE = 'cpu'
+    LOCAL_WHISPER_COMPUTE_TYPE = 'int8'
+    LOCAL_WHISPER_BEAM_SIZE = 1
+    LOCAL_WHISPER_THREADS = 0  # CPU threads per inference, 0 for the CTranslate2 default
+    LOCAL_WHISPER_WORKERS = 1  # inferences that can run in parallel
+    LOCAL_WHISPER_VAD_FILTER = False  # drop non-speech with Silero VAD before decoding
+    LOCAL_WHISPER_LANGUAGE = 'en'  # None to detect the language
+
+    # In-process LLM for RESPONSE_MODEL = 'local' with llama.cpp (pip install llama-cpp-python).
+    # The GGUF model is loaded once from LOCAL_LLM_PATH (LOCAL_MODEL_PATH if not set) and kept
+    # resident. The KV cache of the unchanged conversation prefix is reused between turns, so a
+    # turn only prefills the new messages.
+    LOCAL_LLM_PATH = os.getenv("LOCAL_LLM_PATH")
+    LOCAL_LLM_CONTEXT_SIZE = 4096
+    LOCAL_LLM_THREADS = 0  # 0 for the llama.cpp default
+    LOCAL_LLM_MAX_TOKENS = 256
+    LOCAL_LLM_TEMPERATURE = 0.7
+    LOCAL_LLM_STATE_CACHE_MB = 0  # also keep the KV states of other conversations (gateway sessions) in RAM
+
+    # Failover: providers tried in order when the selected one fails or its circuit breaker is open
+    # (after CIRCUIT_FAILURE_THRESHOLD failures in a row, for CIRCUIT_RESET_TIMEOUT seconds).
+    # With HEDGE_REQUESTS, a request that has not answered within the provider's p95 latency is
+    # also sent to the next provider and the first answer is used.
+    TRANSCRIPTION_FALLBACKS = []  # e.g. ['groq', 'openai']
+    RESPONSE_FALLBACKS = []
+    TTS_FALLBACKS = []  # only providers writing the same audio format as TTS_MODEL are used
+    HEDGE_REQUESTS = False
+    HEDGE_DELAY = 1.0  # seconds, until a provider has HEALTH_MIN_SAMPLES latencies for its p95
+    HEALTH_MIN_SAMPLES = 5
+    HEALTH_EWMA_ALPHA = 0.2
+    CIRCUIT_FAILURE_THRESHOLD = 3
+    CIRCUIT_RESET_TIMEOUT = 30
+
+    # Seconds from the end of the user's speech to the start of the reply, None for no deadlines.
+    # Each stage must answer by the turn deadline minus the shares reserved for the stages after it.
+    TURN_LATENCY_BUDGET = None
+    STAGE_BUDGET_SHARES = {'transcription': 0.25, 'response': 0.5, 'tts': 0.25}
+
+    # Shared client pools: build clients once and warm their connections at startup
+    PREWARM_CLIENTS = True
+    HTTP_POOL_CONNECTIONS = 4
+    HTTP_POOL_MAXSIZE = 16
+
+    # Record a span for every stage and backend call (recording, transcription, LLM, TTS, playback)
+    # to TRACE_FILE as JSON lines, and log p50/p95 per stage and provider at exit. With
+    # TRACE_OPENTELEMETRY, spans are also exported through OpenTelemetry (requires opentelemetry-api).
+    TRACING = False
+    TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+    TRACE_OPENTELEMETRY = False
+
+    # Cache LLM responses for repeated queries, keyed on the model, system prompt and the last
+    # RESPONSE_CACHE_CONTEXT_TURNS messages. Set RESPONSE_CACHE_PATH to keep the cache across restarts.
+    RESPONSE_CACHE = False
+    RESPONSE_CACHE_SIZE = 256
+    RESPONSE_CACHE_TTL = 3600  # seconds, None to keep entries until evicted
+    RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH")  # e.g. response_cache.sqlite3
+    RESPONSE_CACHE_CONTEXT_TURNS = 1
+
+    # TTS front-end: rewrite replies for speech (drop markdown, code, URLs and emoji, spell out
+    # numbers and abbreviations), and synthesize replies longer than TTS_CHUNK_MAX_CHARS as chunks
+    # on up to TTS_SYNTHESIS_WORKERS parallel requests, joined in order into one gapless clip
+    TTS_NORMALIZE_TEXT = True
+    TTS_CHUNK_MAX_CHARS = 250
+    TTS_CHUNK_MIN_CHARS = 40  # a shorter last chunk is merged into the previous one
+    TTS_SYNTHESIS_WORKERS = 4  # 1 to synthesize a reply in one request
+
+    # TTS providers that stream (OpenAI, Deepgram, ElevenLabs, MeloTTS, Piper) are played while the
+    # PCM streams in instead of being downloaded to a file and decoded. TTS_JITTER_BUFFER_MS of
+    # audio is held back before playback starts to absorb uneven network chunks. With
+    # TTS_RECORD_AUDIO, the streamed speech is also saved as WAV (output.wav, output_<n>.wav per segment).
+    TTS_JITTER_BUFFER_MS = 100
+    TTS_RECORD_AUDIO = False
+
+    # Cache synthesized speech on disk, keyed by model, voice, format, speed and text. With
+    # TTS_CACHE_SENTENCES, replies are cached per sentence so repeated sentences also hit.
+    # Run `python -m voice_assistant.tts_cache` to pre-render TTS_CACHE_WARMUP_PHRASES.
+    TTS_CACHE = False
+    TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "tts_cache")
+    TTS_CACHE_MAX_BYTES = 200 * 1024 * 1024
+    TTS_CACHE_MEMORY_BYTES = 16 * 1024 * 1024
+    TTS_CACHE_SENTENCES = True
+    TTS_CACHE_WARMUP_PHRASES = [
+        "Goodbye!",
+        "Error in generating response",
+        "Sorry, I didn't catch that.",
+    ]
+
+    # Multi-session gateway (voice_gateway.py)
+    GATEWAY_MAX_CONCURRENT_TURNS = 32  # turns processed at once across all sessions
+    GATEWAY_MAX_QUEUED_TURNS = 64  # turns waiting for a slot before new ones are rejected
+    GATEWAY_SESSION_MAX_TURNS = 1  # concurrent turns per session
+    GATEWAY_SESSION_TTL = 1800  # seconds of inactivity before a session is removed
+    GATEWAY_TTS_CONCURRENCY = 2  # sentences synthesized at once per session
+
     # temp file generated by the initial STT model
     INPUT_AUDIO = "test.mp3"
 
+    # Keep the recording in memory instead of encoding it to INPUT_AUDIO with ffmpeg
+    IN_MEMORY_AUDIO = False
+    INPUT_AUDIO_FORMAT = 'wav'  # possible values: wav, flac
+    INPUT_SAMPLE_RATE = 16000
+
+    # Keep one microphone stream open and segment it with a streaming VAD instead of
+    # opening and calibrating the microphone on every turn
+    CONTINUOUS_CAPTURE = False
+    VAD_PRE_ROLL = 0.3  # seconds kept before the detected start of speech
+    VAD_MIN_ENERGY = 300  # minimum RMS energy counted as speech
+
+    # Stand-in devices for benchmarks: speak these audio files into the microphone stream, one
+    # utterance per turn (requires CONTINUOUS_CAPTURE), and discard the output audio
+    INPUT_AUDIO_FILES = []
+    INPUT_AUDIO_FILES_SPEED = 1.0  # pace relative to real time
+    NULL_AUDIO_OUTPUT = False
+
+    # Transcribe while the user is speaking (requires CONTINUOUS_CAPTURE). Deepgram streams natively
+    # and ends the utterance on its endpointing, other models re-transcribe the audio so far in batch.
+    STREAMING_TRANSCRIPTION = False
+    STREAMING_ENDPOINTING_MS = 300
+    STREAMING_PARTIAL_INTERVAL = 1.0  # seconds of audio between batch partial transcripts
+
+    # Start generating the response once a partial transcript is stable (requires STREAMING_TRANSCRIPTION).
+    # The result is used if the final transcript matches, otherwise it is cancelled. With
+    # SPECULATIVE_TTS and STREAMING_PIPELINE, the first sentence is also synthesized ahead of time.
+    SPECULATIVE_RESPONSE = False
+    SPECULATION_STABLE_PARTIALS = 2  # identical partials in a row before speculating
+    SPECULATION_MIN_WORDS = 2
+    SPECULATIVE_TTS = False
+
+    # Batch transcription of directories and manifests (python -m voice_assistant.batch_transcription).
+    # Requests in flight and request rate (per minute, token bucket) per provider; failed files are
+    # retried with exponential backoff starting at BATCH_BACKOFF seconds. Providers with the batch
+    # capability (local) get BATCH_SIZE recordings per inference call.
+    BATCH_CONCURRENCY = {'openai': 8, 'groq': 4, 'deepgram': 8, 'fastwhisperapi': 2, 'local': 1}
+    BATCH_DEFAULT_CONCURRENCY = 4
+    BATCH_RATE_LIMITS = {'groq': 20}  # None or missing for no limit
+    BATCH_RETRIES = 3
+    BATCH_BACKOFF = 1.0
+    BATCH_SIZE = 8
+
+    # Stream the LLM response into sentence-level TTS and overlap synthesis with playback
+    STREAMING_PIPELINE = False
+
+    # Let the user interrupt the assistant (requires STREAMING_PIPELINE and CONTINUOUS_CAPTURE).
+    # Without echo cancellation, use headphones or raise BARGE_IN_ENERGY_RATIO so the assistant's
+    # own voice does not trigger it.
+    BARGE_IN = False
+    BARGE_IN_MIN_SPEECH = 0.3  # seconds of speech needed to interrupt
+    BARGE_IN_ENERGY_RATIO = 6.0  # speech threshold over the noise floor while the assistant speaks
+
     @staticmethod
     def validate_config():
         """
@@ -59,24 +240,20 @@ class Config:
         Raises:
             ValueError: If a required environment variable is not set.
         """
-        Config._validate_model('TRANSCRIPTION_MODEL', [
-            'openai', 'groq', 'deepgram', 'fastwhisperapi', 'local'])
-        Config._validate_model('RESPONSE_MODEL', [
-            'openai', 'groq', 'ollama', 'local'])
-        Config._validate_model('TTS_MODEL', [
-            'openai', 'deepgram', 'elevenlabs', 'melotts', 'cartesia', 'local', 'piper'])
-
-        Config._validate_api_key('TRANSCRIPTION_MODEL', 'openai', 'OPENAI_API_KEY')
-        Config._validate_api_key('TRANSCRIPTION_MODEL', 'groq', 'GROQ_API_KEY')
-        Config._validate_api_key('TRANSCRIPTION_MODEL', 'deepgram', 'DEEPGRAM_API_KEY')
-
-        Config._validate_api_key('RESPONSE_MODEL', 'openai', 'OPENAI_API_KEY')
-        Config._validate_api_key('RESPONSE_MODEL', 'groq', 'GROQ_API_KEY')
-
-        Config._validate_api_key('TTS_MODEL', 'openai', 'OPENAI_API_KEY')
-        Config._validate_api_key('TTS_MODEL', 'deepgram', 'DEEPGRAM_API_KEY')
-        Config._validate_api_key('TTS_MODEL', 'elevenlabs', 'ELEVENLABS_API_KEY')
-        Config._validate_api_key('TTS_MODEL', 'cartesia', 'CARTESIA_API_KEY')
+        from voice_assistant.providers import get_provider, provider_names
+
+        for attribute, stage in (('TRANSCRIPTION_MODEL', 'transcription'), ('RESPONSE_MODEL', 'response'),
+                                 ('TTS_MODEL', 'tts')):
+            Config._validate_model(attribute, provider_names(stage))
+            provider = get_provider(stage, getattr(Config, attribute))
+            if provider.api_key_setting:
+                Config._validate_api_key(attribute, provider.name, provider.api_key_setting)
+            for fallback in getattr(Config, f"{stage.upper()}_FALLBACKS"):
+                if fallback not in provider_names(stage):
+                    raise ValueError(f"Invalid {stage.upper()}_FALLBACKS. Must be one of {provider_names(stage)}")
+                setting = get_provider(stage, fallback).api_key_setting
+                if setting and not getattr(Config, setting):
+                    raise ValueError(f"{setting} is required for {fallback} models")
 
     @staticmethod
     def _validate_model(attribute, valid_options):
@@ -0,0 +1,230 @@
+# voice_assistant/context.py
+
+import logging
+import threading
+from functools import lru_cache
+
+from colorama import Fore
+
+from voice_assistant.config import Config
+
+# Per-message overhead of the chat format (role and separators)
+_MESSAGE_OVERHEAD = 4
+
+_SUMMARY_PROMPT = ("Summarize the conversation below for your own future reference in a few sentences. "
+                   "Keep names, facts, preferences, decisions and open questions. Do not add anything new.")
+_SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+
+@lru_cache(maxsize=None)
+def _get_encoding():
+    # Loaded on first use: the encoding may have to be downloaded
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logging.warning(f"tiktoken is unavailable, estimating token counts instead: {e}")
+        return None
+
+
+def count_tokens(text):
+    """
+    Count the tokens in a text with tiktoken if it is installed, else estimate them
+    (about four characters per token for English).
+
+    Args:
+    text (str): The text.
+
+    Returns:
+    int: The number of tokens.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def message_tokens(message):
+    """
+    Return the tokens a chat message takes up in the prompt.
+    """
+    return count_tokens(message['content']) + _MESSAGE_OVERHEAD
+
+
+class ConversationContext:
+    """
+    Chat history that stays under a token budget.
+
+    Token counts are tracked per message as they are added. When the history exceeds the
+    budget, the oldest turns are folded until it is back under budget * compact_ratio, keeping
+    at least keep_recent messages. With the 'summarize' strategy, the folded turns are replaced
+    by a summary generated on a background thread. With 'drop', they are removed.
+
+    The system prompt is never changed, and kept messages are never rewritten, so the prompt
+    prefix stays byte-stable between compactions and provider prompt caching keeps hitting.
+    Folding a large block at once keeps compactions, and prefix changes, rare.
+
+    Args:
+    system_prompt (str): The system prompt.
+    budget (int): Token budget of the prompt, or None for no limit.
+    keep_recent (int): Number of most recent messages that are never folded.
+    strategy (str): 'summarize' or 'drop'.
+    compact_ratio (float): Fraction of the budget to compact down to.
+    model (str): The response model used for summaries.
+    api_key (str): The API key for the response model.
+    local_model_path (str): The path to the local model (if applicable).
+    """
+
+    def __init__(self, system_prompt, budget=None, keep_recent=4, strategy='summarize', compact_ratio=0.5,
+                 model=None, api_key=None, local_model_path=None):
+        self.system_message = {"role": "system", "content": system_prompt}
+        self.budget = budget
+        self.keep_recent = keep_recent
+        self.strategy = strategy
+        self.compact_ratio = compact_ratio
+        self.model = model
+        self.api_key = api_key
+        self.local_model_path = local_model_path
+        self.summary_message = None
+        self.compactions = 0
+        self._turns = []
+        self._turn_tokens = []
+        # Without a budget, tokens are only counted when asked for (see tokens)
+        self._fixed_tokens = message_tokens(self.system_message) if budget is not None else 0
+        self._lock = threading.Lock()
+        self._compacting = False
+        self._idle = threading.Event()
+        self._idle.set()
+
+    @property
+    def messages(self):
+        """
+        The messages to send: system prompt, summary of folded turns (if any) and the kept turns.
+        """
+        with self._lock:
+            prefix = [self.system_message] if self.summary_message is None else [self.system_message, self.summary_message]
+            return prefix + self._turns
+
+    @property
+    def tokens(self):
+        """
+        The number of tokens in the messages.
+        """
+        if self.budget is None:
+            return sum(message_tokens(message) for message in self.messages)
+        with self._lock:
+            return self._fixed_tokens + sum(self._turn_tokens)
+
+    def append(self, message):
+        """
+        Add a message and start a compaction if the history went over budget.
+
+        Args:
+        message (dict): A chat message with 'role' and 'content'.
+        """
+        with self._lock:
+            self._turns.append(message)
+            self._turn_tokens.append(message_tokens(message) if self.budget is not None else 0)
+            self._compact()
+
+    def _compact(self):
+        # Called with the lock held
+        if self._compacting or self.budget is None:
+            return
+        if self._fixed_tokens + sum(self._turn_tokens) <= self.budget:
+            return
+        count = self._fold_count()
+        if not count:
+            return
+        if self.strategy == 'drop':
+            self._replace(count, None)
+            return
+        self._compacting = True
+        self._idle.clear()
+        threading.Thread(target=self._summarize, args=(self._turns[:count],), daemon=True).start()
+
+    def wait(self, timeout=None):
+        """
+        Block until running compactions have finished, e.g. before measuring the prompt size.
+
+        Returns:
+        bool: False if the timeout expired first.
+        """
+        return self._idle.wait(timeout)
+
+    def _fold_count(self):
+        # Fold the oldest turns until the rest fits in budget * compact_ratio
+        target = self.budget * self.compact_ratio - self._fixed_tokens
+        foldable = len(self._turns) - self.keep_recent
+        remaining = sum(self._turn_tokens)
+        count = 0
+        while count < foldable and remaining > target:
+            remaining -= self._turn_tokens[count]
+            count += 1
+        # Keep whole exchanges: the kept turns start with a user message
+        while count < foldable and self._turns[count]['role'] != 'user':
+            count += 1
+        return count
+
+    def _replace(self, count, summary):
+        del self._turns[:count]
+        del self._turn_tokens[:count]
+        if summary:
+            self.summary_message = {"role": "system", "content": _SUMMARY_PREFIX + summary}
+        elif self.strategy == 'drop':
+            self.summary_message = None
+        self._fixed_tokens = message_tokens(self.system_message)
+        if self.summary_message is not None:
+            self._fixed_tokens += message_tokens(self.summary_message)
+        self.compactions += 1
+
+    def _summarize(self, folded):
+        from voice_assistant.response_generation import generate_response
+
+        summary = None
+        try:
+            lines = []
+            if self.summary_message is not None:
+                lines.append(self.summary_message['content'])
+            lines.extend(f"{message['role']}: {message['content']}" for message in folded)
+            request = [{"role": "system", "content": _SUMMARY_PROMPT}, {"role": "user", "content": "\n".join(lines)}]
+            summary = generate_response(self.model, self.api_key, request, self.local_model_path)
+            if summary == "Error in generating response":
+                summary = None
+        except Exception as e:
+            logging.error(f"Failed to summarize the conversation: {e}")
+        with self._lock:
+            # New turns may have been appended meanwhile; the folded ones are still at the start
+            if self._turns[:len(folded)] == folded:
+                if summary is None:
+                    logging.warning("Summary failed, dropping the oldest turns instead")
+                self._replace(len(folded), summary)
+            self._compacting = False
+            logging.info(Fore.LIGHTBLACK_EX + f"Compacted the conversation to "
+                         f"{self._fixed_tokens + sum(self._turn_tokens)} tokens" + Fore.RESET)
+            # Turns added during the summary may have pushed it over the budget again
+            self._compact()
+            if not self._compacting:
+                self._idle.set()
+
+
+def new_conversation_context(system_prompt=None, model=None, api_key=None):
+    """
+    Create a conversation context configured from Config.
+
+    Args:
+    system_prompt (str): The system prompt, defaults to Config.SYSTEM_PROMPT.
+    model (str): The response model used for summaries, defaults to Config.RESPONSE_MODEL.
+    api_key (str): The API key for the response model.
+
+    Returns:
+    ConversationContext: The context.
+    """
+    return ConversationContext(system_prompt or Config.SYSTEM_PROMPT, Config.CONTEXT_TOKEN_BUDGET,
+                               Config.CONTEXT_KEEP_RECENT, Config.CONTEXT_STRATEGY, Config.CONTEXT_COMPACT_RATIO,
+                               model or Config.RESPONSE_MODEL, api_key, Config.LOCAL_MODEL_PATH)
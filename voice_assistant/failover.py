@@ -0,0 +1,489 @@
+# voice_assistant/failover.py
+"""
+Failover, hedged requests and deadlines for the provider calls of each stage.
+
+Every stage has a provider chain: the selected model followed by its fallbacks from Config
+(TRANSCRIPTION_FALLBACKS, RESPONSE_FALLBACKS, TTS_FALLBACKS). A request goes to the first
+provider whose circuit breaker is closed and moves on to the next one when it fails. With
+HEDGE_REQUESTS, a request that has not answered within the provider's p95 latency is also sent
+to the next provider, and whichever answers first wins.
+
+With TURN_LATENCY_BUDGET, each turn gets a deadline from the moment the user stops speaking.
+Each stage must answer by the turn deadline minus the share of the budget reserved for the
+stages after it (STAGE_BUDGET_SHARES), so time a stage does not use is passed on to the next.
+"""
+
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+from colorama import Fore
+
+from voice_assistant.api_key_manager import get_api_key
+from voice_assistant.config import Config
+from voice_assistant.providers import STAGES, find_provider
+from voice_assistant.tracing import percentile
+
+_FALLBACK_SETTINGS = {
+    'transcription': 'TRANSCRIPTION_FALLBACKS',
+    'response': 'RESPONSE_FALLBACKS',
+    'tts': 'TTS_FALLBACKS',
+}
+
+# (turn deadline, budget) of the current turn, from time.monotonic()
+_turn_budget = contextvars.ContextVar("verbi_turn_budget", default=None)
+
+
+class ProviderHealth:
+    """
+    Latency and error tracking with a circuit breaker for one provider.
+
+    The circuit opens after failure_threshold consecutive failures and requests skip the provider.
+    After reset_timeout seconds one trial request is let through (half-open): its success closes
+    the circuit, its failure opens it again.
+
+    Args:
+    name (str): The provider, for logging.
+    alpha (float): Weight of the newest sample in the moving averages.
+    failure_threshold (int): Consecutive failures that open the circuit.
+    reset_timeout (float): Seconds an open circuit waits before a trial request.
+    window (int): Latencies kept for the p95.
+    """
+
+    def __init__(self, name, alpha=0.2, failure_threshold=3, reset_timeout=30.0, window=50):
+        self.name = name
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.latency = None
+        self.error_rate = 0.0
+        self.failures = 0
+        self.state = 'closed'
+        self._opened_at = None
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def available(self):
+        """
+        Return whether a request may be sent to the provider, letting one trial through an open circuit.
+        """
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                return True
+            return False
+
+    def record_success(self, seconds):
+        with self._lock:
+            self.latency = seconds if self.latency is None else self.alpha * seconds + (1 - self.alpha) * self.latency
+            self.error_rate *= 1 - self.alpha
+            self._latencies.append(seconds)
+            self.failures = 0
+            if self.state != 'closed':
+                logging.info(Fore.GREEN + f"{self.name} recovered, circuit closed" + Fore.RESET)
+            self.state = 'closed'
+
+    def record_failure(self):
+        with self._lock:
+            self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                logging.warning(Fore.YELLOW + f"{self.name} failed {self.failures} times, circuit opened" + Fore.RESET)
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+    def p95(self):
+        """
+        Return the p95 latency in seconds, or None until enough requests have completed.
+        """
+        with self._lock:
+            if len(self._latencies) < Config.HEALTH_MIN_SAMPLES:
+                return None
+            return percentile(list(self._latencies), 95)
+
+    def hedge_delay(self):
+        """
+        Return how long to wait for this provider before hedging the request.
+        """
+        p95 = self.p95()
+        return p95 if p95 is not None else Config.HEDGE_DELAY
+
+    def snapshot(self):
+        """
+        Return the health as a dict.
+        """
+        return {"provider": self.name, "state": self.state, "latency": self.latency, "p95": self.p95(),
+                "error_rate": self.error_rate, "failures": self.failures}
+
+
+_health = {}
+_health_lock = threading.Lock()
+
+
+def get_health(operation, name):
+    """
+    Return the shared health of a provider for an operation ('transcription', 'response.stream', ...).
+    Streams are tracked apart from whole responses because their latency is the time to the first chunk.
+    """
+    key = (operation, name)
+    with _health_lock:
+        health = _health.get(key)
+        if health is None:
+            health = ProviderHealth(f"{operation} provider {name}", Config.HEALTH_EWMA_ALPHA,
+                                    Config.CIRCUIT_FAILURE_THRESHOLD, Config.CIRCUIT_RESET_TIMEOUT)
+            _health[key] = health
+        return health
+
+
+def health_report():
+    """
+    Return the health of every provider used so far.
+    """
+    with _health_lock:
+        return [dict(health.snapshot(), operation=operation) for (operation, _), health in _health.items()]
+
+
+def provider_chain(stage, model, operation=None, supports=None):
+    """
+    Return the providers to try for a request: the model and its fallbacks, skipping the ones
+    whose circuit is open (all of them are tried if every circuit is open).
+
+    Args:
+    stage (str): 'transcription', 'response' or 'tts'.
+    model (str): The selected model.
+    operation (str): The health to check, defaults to the stage.
+    supports (callable): Called with a fallback provider, returns False to leave it out.
+    """
+    names = [model]
+    for name in getattr(Config, _FALLBACK_SETTINGS[stage]):
+        provider = find_provider(stage, name)
+        if name not in names and provider is not None and (supports is None or supports(provider)):
+            names.append(name)
+    available = [name for name in names if get_health(operation or stage, name).available()]
+    return available or names
+
+
+def start_turn_budget(budget=None):
+    """
+    Start the latency budget of a turn, e.g. when the user stops speaking.
+
+    Args:
+    budget (float): Seconds for the turn, defaults to Config.TURN_LATENCY_BUDGET (None for no deadlines).
+    """
+    budget = Config.TURN_LATENCY_BUDGET if budget is None else budget
+    _turn_budget.set((time.monotonic() + budget, budget) if budget else None)
+
+
+def end_turn_budget():
+    """
+    Stop applying deadlines, e.g. once the first audio of the reply is playing.
+    """
+    _turn_budget.set(None)
+
+
+def stage_deadline(stage):
+    """
+    Return the time.monotonic() deadline of a stage in the current turn, or None.
+
+    The stage gets the turn deadline minus the budget reserved for the stages after it; if that
+    has already passed, it may use the rest of the turn budget.
+    """
+    current = _turn_budget.get()
+    if current is None:
+        return None
+    deadline, budget = current
+    later = STAGES[STAGES.index(stage) + 1:]
+    reserved = budget * sum(Config.STAGE_BUDGET_SHARES.get(name, 0) for name in later)
+    if deadline - reserved > time.monotonic():
+        return deadline - reserved
+    return deadline
+
+
+def _api_key(stage, model, api_key, name):
+    return api_key if name == model else get_api_key(stage, name)
+
+
+def _record(health, started, future):
+    if future.cancelled():
+        # A hedged request that lost the race says nothing about the provider
+        return
+    if future.exception() is not None:
+        health.record_failure()
+    else:
+        health.record_success(time.monotonic() - started)
+
+
+def _start_thread(function, *args):
+    """
+    Run function on a daemon thread (in a copy of the current context) and return its Future.
+    Threads are not pooled: a hung request must not hold up the requests after it.
+    """
+    future = Future()
+    context = contextvars.copy_context()
+
+    def run():
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(context.run(function, *args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def _discard_later(future, discard):
+    """
+    Release the result of a request that lost the race once it completes.
+    """
+    def release(done):
+        if discard is not None and not done.cancelled() and done.exception() is None:
+            try:
+                discard(done.result())
+            except Exception as e:
+                logging.debug(f"Failed to discard a hedged result: {e}")
+    future.add_done_callback(release)
+
+
+def _run_chain(operation, chain, attempt, deadline=None, discard=None):
+    """
+    Run attempt(name) on the chain with failover, hedging and the deadline.
+
+    Returns:
+    tuple: The name of the provider that answered and its result.
+    """
+    if not Config.HEDGE_REQUESTS and deadline is None:
+        # Nothing to race: try the providers one after the other on this thread
+        error = None
+        for name in chain:
+            health = get_health(operation, name)
+            started = time.monotonic()
+            try:
+                result = attempt(name)
+            except Exception as e:
+                health.record_failure()
+                logging.warning(Fore.YELLOW + f"{operation} provider {name} failed: {e}" + Fore.RESET)
+                error = e
+                continue
+            health.record_success(time.monotonic() - started)
+            return name, result
+        raise error
+
+    remaining = list(chain)
+    pending = {}
+    error = None
+
+    def launch():
+        name = remaining.pop(0)
+        health = get_health(operation, name)
+        future = _start_thread(attempt, name)
+        future.add_done_callback(lambda done, started=time.monotonic(): _record(health, started, done))
+        pending[future] = name
+        return health
+
+    health = launch()
+    while pending:
+        timeout = health.hedge_delay() if Config.HEDGE_REQUESTS and remaining else None
+        if deadline is not None:
+            left = max(0.0, deadline - time.monotonic())
+            timeout = left if timeout is None else min(timeout, left)
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            name = pending.pop(future)
+            if future.exception() is None:
+                for loser in pending:
+                    _discard_later(loser, discard)
+                return name, future.result()
+            error = future.exception()
+            logging.warning(Fore.YELLOW + f"{operation} provider {name} failed: {error}" + Fore.RESET)
+        if done:
+            if not pending and remaining:
+                # Fail over to the next provider
+                health = launch()
+            continue
+        if deadline is not None and time.monotonic() >= deadline:
+            for loser in pending:
+                _discard_later(loser, discard)
+            raise TimeoutError(f"{operation} did not answer within the turn latency budget")
+        if remaining:
+            logging.info(Fore.YELLOW + f"{operation} provider {pending[next(iter(pending))]} is slow, "
+                         f"hedging with {remaining[0]}" + Fore.RESET)
+            health = launch()
+    raise error
+
+
+def call(stage, model, api_key, request, discard=None, supports=None):
+    """
+    Send a request to the stage's provider chain.
+
+    Args:
+    stage (str): 'transcription', 'response' or 'tts'.
+    model (str): The selected model.
+    api_key (str): The API key of the selected model (fallbacks use their configured keys).
+    request (callable): Called with (provider, api_key), returns the result.
+    discard (callable): Called with the result of a hedged request that lost the race.
+    supports (callable): Called with a fallback provider, returns False to leave it out.
+
+    Returns:
+    The result of the first provider that answered.
+    """
+    def attempt(name):
+        return request(find_provider(stage, name), _api_key(stage, model, api_key, name))
+    chain = provider_chain(stage, model, supports=supports)
+    return _run_chain(stage, chain, attempt, stage_deadline(stage), discard)[1]
+
+
+def stream(stage, model, api_key, open_stream, supports=None):
+    """
+    Stream from the stage's provider chain. Failover and hedging apply until the first chunk;
+    after that the provider that produced it streams the rest.
+
+    Args:
+    open_stream (callable): Called with (provider, api_key), returns a generator.
+
+    Yields:
+    The chunks of the first provider that produced one.
+    """
+    operation = f"{stage}.stream"
+
+    def attempt(name):
+        chunks = open_stream(find_provider(stage, name), _api_key(stage, model, api_key, name))
+        try:
+            for chunk in chunks:
+                if chunk:
+                    return chunks, chunk
+        except BaseException:
+            chunks.close()
+            raise
+        return chunks, None
+
+    chain = provider_chain(stage, model, operation, supports)
+    _, (chunks, first) = _run_chain(operation, chain, attempt, stage_deadline(stage),
+                                    discard=lambda result: result[0].close())
+    try:
+        if first is not None:
+            yield first
+        yield from chunks
+    finally:
+        chunks.close()
+
+
+def _deadline(stage, timeout):
+    deadline = stage_deadline(stage)
+    if timeout is not None:
+        deadline = min(deadline or float('inf'), time.monotonic() + timeout)
+    return deadline
+
+
+async def _arun_chain(operation, chain, attempt, deadline=None, discard=None):
+    """
+    Like _run_chain, with attempt(name) returning a coroutine. Requests that lose the race are cancelled.
+    """
+    remaining = list(chain)
+    pending = {}
+    error = None
+
+    def launch():
+        name = remaining.pop(0)
+        health = get_health(operation, name)
+        task = asyncio.ensure_future(attempt(name))
+        task.add_done_callback(lambda done, started=time.monotonic(): _record(health, started, done))
+        pending[task] = name
+        return health
+
+    async def cancel_pending():
+        tasks = list(pending)
+        pending.clear()
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                result = await task
+            except BaseException:
+                continue
+            if discard is not None:
+                await discard(result)
+
+    health = launch()
+    try:
+        while pending:
+            timeout = health.hedge_delay() if Config.HEDGE_REQUESTS and remaining else None
+            if deadline is not None:
+                left = max(0.0, deadline - time.monotonic())
+                timeout = left if timeout is None else min(timeout, left)
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = pending.pop(task)
+                if task.exception() is None:
+                    return name, task.result()
+                error = task.exception()
+                logging.warning(Fore.YELLOW + f"{operation} provider {name} failed: {error!r}" + Fore.RESET)
+            if done:
+                if not pending and remaining:
+                    health = launch()
+                continue
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"{operation} did not answer within the deadline")
+            if remaining:
+                logging.info(Fore.YELLOW + f"{operation} provider {pending[next(iter(pending))]} is slow, "
+                             f"hedging with {remaining[0]}" + Fore.RESET)
+                health = launch()
+        raise error
+    finally:
+        # Cancelling the caller, a timeout or an error also cancels the requests still running
+        await cancel_pending()
+
+
+async def acall(stage, model, api_key, request, timeout=None, discard=None, supports=None):
+    """
+    Asynchronously send a request to the stage's provider chain, see call.
+
+    Args:
+    request (callable): Called with (provider, api_key), returns a coroutine.
+    timeout (float): Seconds to wait at most, on top of the stage deadline.
+    discard (callable): Coroutine function called with the result of a request that lost the race.
+    """
+    async def attempt(name):
+        return await request(find_provider(stage, name), _api_key(stage, model, api_key, name))
+    chain = provider_chain(stage, model, supports=supports)
+    return (await _arun_chain(stage, chain, attempt, _deadline(stage, timeout), discard))[1]
+
+
+async def astream(stage, model, api_key, open_stream, supports=None):
+    """
+    Asynchronously stream from the stage's provider chain, see stream.
+
+    Args:
+    open_stream (callable): Called with (provider, api_key), returns an async generator.
+    """
+    operation = f"{stage}.stream"
+
+    async def attempt(name):
+        chunks = open_stream(find_provider(stage, name), _api_key(stage, model, api_key, name))
+        try:
+            async for chunk in chunks:
+                if chunk:
+                    return chunks, chunk
+        except BaseException:
+            await chunks.aclose()
+            raise
+        return chunks, None
+
+    async def discard(result):
+        await result[0].aclose()
+
+    chain = provider_chain(stage, model, operation, supports)
+    _, (chunks, first) = await _arun_chain(operation, chain, attempt, stage_deadline(stage), discard)
+    try:
+        if first is not None:
+            yield first
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        await chunks.aclose()
@@ -1,7 +1,16 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from melo.api import TTS
 from config import Config
+import asyncio
+import collections
+import logging
+import queue
+import threading
+import time
+import numpy as np
+import soundfile as sf
 import torch
 import uuid
 
@@ -10,7 +19,7 @@ app = FastAPI()
 class TextToSpeechRequest(BaseModel):
     """
     Model representing a text-to-speech request.
-    
+
     Attributes:
         text (str): The text to convert to speech.
         language (str): The language of the text.
@@ -27,7 +36,7 @@ class TextToSpeechRequest(BaseModel):
 def get_device():
     """
     Determine the appropriate device for running the TTS model.
-    
+
     Returns:
         str: The device to use ('cuda', 'mps', or 'cpu').
     """
@@ -38,40 +47,221 @@ def get_device():
     else:
         return 'cpu'
 
+
+class SynthesisJob:
+    """
+    One request: its sentences and the queue its audio is delivered on.
+
+    Audio chunks (16-bit PCM bytes, one per sentence) are put on the asyncio queue of the
+    request's event loop, followed by None when the job is done or an Exception if it failed.
+    """
+
+    def __init__(self, text, speaker_id, speed, loop):
+        self.text = text
+        self.speaker_id = speaker_id
+        self.speed = speed
+        self.sentences = None
+        self.cancelled = False
+        self.output = asyncio.Queue()
+        self._loop = loop
+
+    def emit(self, item):
+        self._loop.call_soon_threadsafe(self.output.put_nowait, item)
+
+
+class SynthesisWorker:
+    """
+    Run every synthesis on one thread that owns the model.
+
+    Requests that arrive within batch_window of each other are collected into a micro-batch.
+    Each round synthesizes the next sentence of up to max_batch requests, so concurrent
+    requests all get their first sentence early instead of waiting for whole replies ahead
+    of them. MeloTTS infers one sentence at a time, so a batch is processed sentence by
+    sentence on the model thread rather than as one padded tensor.
+
+    Args:
+        model (TTS): The loaded MeloTTS model.
+        max_batch (int): Requests served per round.
+        batch_window (float): Seconds to wait for more requests before starting a round.
+    """
+
+    def __init__(self, model, max_batch=8, batch_window=0.005):
+        self.model = model
+        self.sample_rate = model.hps.data.sampling_rate
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.requests = 0
+        self.audio_seconds = 0.0
+        self.compute_seconds = 0.0
+        self.last_batch_size = 0
+        self._queue = queue.Queue()
+        self._active = collections.deque()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, job):
+        """
+        Queue a job for synthesis.
+        """
+        self.requests += 1
+        self._queue.put(job)
+
+    def synthesize(self, text, speaker_id, speed=1.0):
+        """
+        Synthesize text directly, bypassing the queue. Only used before the worker serves requests.
+        """
+        return self.model.tts_to_file(text, speaker_id, None, speed=speed, quiet=True)
+
+    def metrics(self):
+        """
+        Return the queue depth and the real-time factor (compute time / audio time) so far.
+        """
+        pending_sentences = sum(len(job.sentences or ()) for job in list(self._active))
+        return {
+            "device": device,
+            "queued_requests": self._queue.qsize(),
+            "active_requests": len(self._active),
+            "pending_sentences": pending_sentences,
+            "last_batch_size": self.last_batch_size,
+            "requests": self.requests,
+            "audio_seconds": round(self.audio_seconds, 3),
+            "compute_seconds": round(self.compute_seconds, 3),
+            "rtf": round(self.compute_seconds / self.audio_seconds, 4) if self.audio_seconds else None,
+        }
+
+    def _collect(self):
+        # Block for the first request, then give concurrent ones a moment to join the batch
+        if not self._active:
+            self._active.append(self._queue.get())
+            deadline = time.monotonic() + self.batch_window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    self._active.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        while True:
+            try:
+                self._active.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+    def _run(self):
+        while True:
+            self._collect()
+            batch = [self._active.popleft() for _ in range(min(self.max_batch, len(self._active)))]
+            self.last_batch_size = len(batch)
+            for job in batch:
+                if job.cancelled:
+                    continue
+                try:
+                    if job.sentences is None:
+                        job.sentences = collections.deque(
+                            self.model.split_sentences_into_pieces(job.text, self.model.language, quiet=True))
+                    if job.sentences:
+                        job.emit(self._synthesize_sentence(job, job.sentences.popleft()))
+                    if job.sentences:
+                        self._active.append(job)
+                    else:
+                        job.emit(None)
+                except Exception as e:
+                    logging.error(f"Synthesis failed: {e}")
+                    job.emit(e)
+
+    def _synthesize_sentence(self, job, sentence):
+        start = time.perf_counter()
+        with torch.inference_mode():
+            audio = self.model.tts_to_file(sentence, job.speaker_id, None, speed=job.speed, quiet=True)
+        self.compute_seconds += time.perf_counter() - start
+        self.audio_seconds += len(audio) / self.sample_rate
+        return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+
+
 # Initialize the TTS model
 device = get_device()  # Determine the appropriate device
 model = TTS(language='EN', device=device)
 speaker_ids = model.hps.data.spk2id
+worker = SynthesisWorker(model)
+
+# Warm up the model so the first request does not pay for lazy initialization and caches
+for _ in range(2):
+    worker.synthesize("Warming up the speech model.", speaker_ids['EN-US'])
+
+
+async def _stream_audio(request: TextToSpeechRequest):
+    if request.accent not in speaker_ids:
+        raise HTTPException(status_code=400, detail="Invalid accent specified")
+    job = SynthesisJob(request.text, speaker_ids[request.accent], request.speed, asyncio.get_running_loop())
+    worker.submit(job)
+
+    async def chunks():
+        try:
+            while True:
+                item = await job.output.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Stop synthesizing if the client goes away
+            job.cancelled = True
+
+    return chunks()
+
+
+@app.post("/synthesize/")
+async def synthesize(request: TextToSpeechRequest):
+    """
+    Synthesize the text and stream the audio back, one sentence at a time.
+
+    Args:
+        request (TextToSpeechRequest): The request containing text and other parameters.
+
+    Returns:
+        StreamingResponse: Raw 16-bit mono PCM at the model's sample rate (X-Sample-Rate header).
+    """
+    chunks = await _stream_audio(request)
+    return StreamingResponse(chunks, media_type=f"audio/L16; rate={worker.sample_rate}; channels=1",
+                             headers={"X-Sample-Rate": str(worker.sample_rate)})
 
 
 @app.post("/generate-audio/")
-def generate_audio(request: TextToSpeechRequest):
+async def generate_audio(request: TextToSpeechRequest):
     """
     Generate an audio file from the given text.
 
+    Kept for clients that share a filesystem with the server; new clients should use /synthesize/.
+
     Args:
         request (TextToSpeechRequest): The request containing text and other parameters.
 
     Returns:
         dict: A dictionary containing a message and the file path of the generated audio.
-    
+
     Raises:
         HTTPException: If the specified accent is invalid or if there is an error during audio generation.
     """
-    if request.accent not in speaker_ids:
-        raise HTTPException(status_code=400, detail="Invalid accent specified")
-    
     try:
-        # Use the provided filename or generate a unique one
-        output_filename = request.filename
-        
-        # Generate the audio file
-        model.tts_to_file(request.text, speaker_ids[request.accent], output_filename, speed=request.speed)
-        
-        return {"message": "Audio file generated successfully", "file_path": output_filename}
+        pcm = b"".join([chunk async for chunk in await _stream_audio(request)])
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        await asyncio.to_thread(sf.write, request.filename, samples, worker.sample_rate)
+        return {"message": "Audio file generated successfully", "file_path": request.filename}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Report the queue depth and the real-time factor of the model.
+    """
+    return worker.metrics()
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=Config.TTS_PORT_LOCAL)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=Config.TTS_PORT_LOCAL)
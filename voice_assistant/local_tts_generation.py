@@ -1,51 +1,96 @@
-import requests
+import io
+import wave
+
+from voice_assistant.clients import get_http_session
 from voice_assistant.config import Config
 
 
-def generate_audio_file_melotts(text, language='EN', accent='EN-US', speed=1.0, filename=None):
+def pcm_to_wav(pcm, sample_rate, channels=1, sample_width=2):
     """
-    Generate an audio file from the given text using the FastAPI endpoint.
+    Wrap raw 16-bit PCM in a WAV header.
+
+    Args:
+        pcm (bytes): The PCM samples.
+        sample_rate (int): The sample rate in Hz.
+        channels (int): The number of channels.
+        sample_width (int): Bytes per sample.
+
+    Returns:
+        bytes: The WAV file.
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(sample_width)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def stream_audio_melotts(text, language='EN', accent='EN-US', speed=1.0):
+    """
+    Stream speech for the given text from the MeloTTS server, one sentence at a time.
 
     Args:
         text (str): The text to convert to speech.
         language (str): The language of the text. Default is 'EN'.
         accent (str): The accent to use for the speech. Default is 'EN-US'.
         speed (float): The speed of the speech. Default is 1.0.
-        filename (str, optional): The desired name for the output audio file. If None, a unique name will be generated.
 
     Returns:
-        dict: A dictionary containing the message and the file path of the generated audio.
+        tuple: The sample rate and an iterator of 16-bit mono PCM chunks.
+    """
+    url = f"http://localhost:{Config.TTS_PORT_LOCAL}/synthesize/"
+    payload = {"text": text, "language": language, "accent": accent, "speed": speed}
+    response = get_http_session().post(url, json=payload, stream=True)
+    response.raise_for_status()
+    sample_rate = int(response.headers["X-Sample-Rate"])
+    return sample_rate, response.iter_content(chunk_size=None)
+
+
+def generate_audio_melotts(text, language='EN', accent='EN-US', speed=1.0):
+    """
+    Generate speech for the given text with the MeloTTS server.
+
+    Args:
+        text (str): The text to convert to speech.
+        language (str): The language of the text. Default is 'EN'.
+        accent (str): The accent to use for the speech. Default is 'EN-US'.
+        speed (float): The speed of the speech. Default is 1.0.
+
+    Returns:
+        bytes: The speech as a WAV file.
     """
-    # Define the API endpoint
-    url = f"http://localhost:{Config.TTS_PORT_LOCAL}/generate-audio/"
+    sample_rate, chunks = stream_audio_melotts(text, language, accent, speed)
+    return pcm_to_wav(b"".join(chunks), sample_rate)
 
-    # Define the payload
-    payload = {
-        "text": text,
-        "language": language,
-        "accent": accent,
-        "speed": speed
-    }
 
-    if filename:
-        payload["filename"] = filename
+def generate_audio_file_melotts(text, language='EN', accent='EN-US', speed=1.0, filename=None):
+    """
+    Generate an audio file from the given text using the FastAPI endpoint.
 
-    # Set the headers
-    headers = {
-        "Content-Type": "application/json"
-    }
+    The server streams the audio back, so the client does not need to share a filesystem with it.
 
-    # Make the POST request
-    response = requests.post(url, json=payload, headers=headers)
+    Args:
+        text (str): The text to convert to speech.
+        language (str): The language of the text. Default is 'EN'.
+        accent (str): The accent to use for the speech. Default is 'EN-US'.
+        speed (float): The speed of the speech. Default is 1.0.
+        filename (str, optional): The desired name for the output audio file. Default is 'output.wav'.
 
-    # Check the response
-    if response.status_code == 200:
-        return response.json()
-    else:
-        response.raise_for_status()
+    Returns:
+        dict: A dictionary containing the message and the file path of the generated audio.
+    """
+    filename = filename or "output.wav"
+    audio = generate_audio_melotts(text, language, accent, speed)
+    with open(filename, "wb") as f:
+        f.write(audio)
+    return {"message": "Audio file generated successfully", "file_path": filename}
 
 # Example usage of the function
 if __name__ == "__main__":
+    import requests
+
     try:
         result = generate_audio_file_melotts(
             text="What is the purpose of life?",
@@ -59,4 +104,4 @@ if __name__ == "__main__":
     except requests.HTTPError as http_err:
         print(f"HTTP error occurred: {http_err}")
     except Exception as err:
-        print(f"Other error occurred: {err}")
\ No newline at end of file
+        print(f"Other error occurred: {err}")
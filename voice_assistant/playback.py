@@ -0,0 +1,332 @@
+# voice_assistant/playback.py
+
+import logging
+import queue
+import threading
+import time
+import wave
+from functools import lru_cache
+from io import BytesIO
+
+import pyaudio
+import soundfile as sf
+from pydub import AudioSegment
+
+from voice_assistant.config import Config
+
+_SAMPLE_FORMATS = {
+    'int16': (pyaudio.paInt16, 2),
+    'float32': (pyaudio.paFloat32, 4),
+}
+
+
+def decode_audio(data):
+    """
+    Decode an encoded audio buffer (WAV, FLAC, OGG or MP3) to 16-bit PCM.
+
+    Args:
+    data (bytes): The encoded audio.
+
+    Returns:
+    tuple: (pcm bytes, sample rate, channels).
+    """
+    try:
+        samples, sample_rate = sf.read(BytesIO(data), dtype='int16', always_2d=True)
+        return samples.tobytes(), sample_rate, samples.shape[1]
+    except Exception:
+        # Older libsndfile builds cannot read MP3, fall back to ffmpeg
+        segment = AudioSegment.from_file(BytesIO(data)).set_sample_width(2)
+        return segment.raw_data, segment.frame_rate, segment.channels
+
+
+class NullOutputStream:
+    """
+    An output stream that discards the audio but takes as long as playing it would.
+
+    Args:
+    bytes_per_second (int): The byte rate of the audio.
+    """
+
+    def __init__(self, bytes_per_second):
+        self.bytes_per_second = bytes_per_second
+        self._next_write = None
+
+    def write(self, data):
+        now = time.perf_counter()
+        if self._next_write is None or self._next_write < now:
+            self._next_write = now
+        self._next_write += len(data) / self.bytes_per_second
+        time.sleep(max(0.0, self._next_write - now))
+
+    def stop_stream(self):
+        self._next_write = None
+
+    def close(self):
+        pass
+
+
+class PlaybackEngine:
+    """
+    Long-lived audio output that plays PCM chunks from a queue on a worker thread.
+
+    Playback starts as soon as the first chunk is queued. The output stream stays open between
+    utterances and is only reopened when the sample format changes. Audio is written in small
+    blocks so stop() takes effect within block_ms.
+
+    Args:
+    block_ms (int): Size of the blocks written to the device, bounds the stop latency.
+    null_output (bool): Discard the audio instead of opening an output device (playback still takes real time).
+    """
+
+    def __init__(self, block_ms=20, null_output=False):
+        self.block_ms = block_ms
+        self.null_output = null_output
+        self._queue = queue.Queue()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._audio = None
+        self._stream = None
+        self._stream_format = None
+        self._progress = None
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def play_pcm(self, data, sample_rate, channels=1, sample_format='int16'):
+        """
+        Queue raw PCM for playback and return immediately.
+
+        Args:
+        data (bytes): The PCM samples.
+        sample_rate (int): Sample rate in Hz.
+        channels (int): Number of interleaved channels.
+        sample_format (str): 'int16' or 'float32'.
+        """
+        if data:
+            self._queue.put(('pcm', (data, (sample_rate, channels, sample_format)), self._generation))
+
+    def play_buffer(self, data):
+        """
+        Decode an encoded audio buffer and queue it for playback.
+
+        Args:
+        data (bytes): WAV, FLAC, OGG or MP3 audio.
+        """
+        pcm, sample_rate, channels = decode_audio(data)
+        self.play_pcm(pcm, sample_rate, channels)
+
+    def play_file(self, file_path):
+        """
+        Decode an audio file and queue it for playback.
+
+        Args:
+        file_path (str): The path to the audio file.
+        """
+        with open(file_path, "rb") as audio_file:
+            self.play_buffer(audio_file.read())
+
+    def add_marker(self, callback):
+        """
+        Queue a callback that runs when playback reaches this point.
+
+        Args:
+        callback (callable): Called with True when everything queued before it was played,
+            or False if playback was stopped first.
+        """
+        self._queue.put(('marker', callback, self._generation))
+
+    def stop(self):
+        """
+        Stop playback immediately and drop everything that is queued.
+
+        Returns:
+        float: The fraction of the chunk that was playing when stopped, or None if nothing was playing.
+        """
+        progress = self._progress
+        with self._lock:
+            self._generation += 1
+        while True:
+            try:
+                kind, payload, _ = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'marker':
+                self._call_marker(payload, False)
+            self._queue.task_done()
+        if progress is None:
+            return None
+        played, total = progress
+        return played / total if total else 0.0
+
+    def wait(self):
+        """
+        Block until everything queued so far has been played (or stopped).
+        """
+        self._queue.join()
+
+    def close(self):
+        """
+        Stop playback and release the output device.
+        """
+        self.stop()
+        self._close_stream()
+        if self._audio is not None:
+            self._audio.terminate()
+            self._audio = None
+
+    def _run(self):
+        while True:
+            kind, payload, generation = self._queue.get()
+            try:
+                current = generation == self._generation
+                if kind == 'marker':
+                    self._call_marker(payload, current)
+                elif current:
+                    self._write(payload, generation)
+            except Exception as e:
+                logging.error(f"Failed to play audio: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, payload, generation):
+        data, stream_format = payload
+        sample_rate, channels, sample_format = stream_format
+        stream = self._open_stream(stream_format)
+        block = int(sample_rate * self.block_ms / 1000) * channels * _SAMPLE_FORMATS[sample_format][1]
+        # Blocks are written as views of the queued chunk instead of copies
+        view = memoryview(data)
+        try:
+            for offset in range(0, len(data), block):
+                if generation != self._generation:
+                    return
+                self._progress = (offset, len(data))
+                stream.write(view[offset:offset + block])
+        finally:
+            self._progress = None
+
+    def _open_stream(self, stream_format):
+        if self._stream is not None and self._stream_format == stream_format:
+            return self._stream
+        self._close_stream()
+        sample_rate, channels, sample_format = stream_format
+        if self.null_output:
+            self._stream = NullOutputStream(sample_rate * channels * _SAMPLE_FORMATS[sample_format][1])
+            self._stream_format = stream_format
+            return self._stream
+        if self._audio is None:
+            self._audio = pyaudio.PyAudio()
+        self._stream = self._audio.open(format=_SAMPLE_FORMATS[sample_format][0], channels=channels,
+                                        rate=sample_rate, output=True,
+                                        frames_per_buffer=int(sample_rate * self.block_ms / 1000))
+        self._stream_format = stream_format
+        return self._stream
+
+    def _close_stream(self):
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+            self._stream_format = None
+
+    @staticmethod
+    def _call_marker(callback, completed):
+        try:
+            callback(completed)
+        except Exception as e:
+            logging.error(f"Playback marker failed: {e}")
+
+
+class JitterBuffer:
+    """
+    Feeds 16-bit mono PCM streamed from a TTS provider to the playback engine.
+
+    Network chunks arrive unevenly, so the first prebuffer_ms of audio is held back before
+    playback starts and later chunks are queued as soon as they arrive. Chunks are queued as
+    they are, without copying; only a sample split across two chunks is carried over to the
+    next one, so the device always receives whole samples.
+
+    Args:
+    engine (PlaybackEngine): The engine to play on.
+    prebuffer_ms (int): Audio held back before playback starts.
+    on_start (callable): Called just before the first audio is queued, e.g. to add a marker.
+    record_path (str): Also write the audio to this WAV file, or None to only play it.
+    """
+
+    def __init__(self, engine, prebuffer_ms=0, on_start=None, record_path=None):
+        self.engine = engine
+        self.prebuffer_ms = prebuffer_ms
+        self.on_start = on_start
+        self.record_path = record_path
+        self.started = False
+        self._pending = []
+        self._pending_bytes = 0
+        self._carry = b""
+        self._recording = None
+
+    def write(self, pcm, sample_rate):
+        """
+        Add the next chunk of the stream.
+
+        Args:
+        pcm (bytes): 16-bit mono PCM.
+        sample_rate (int): Sample rate in Hz.
+        """
+        if self._carry:
+            pcm = self._carry + pcm
+            self._carry = b""
+        if len(pcm) % 2:
+            self._carry = pcm[-1:]
+            pcm = pcm[:-1]
+        if not pcm:
+            return
+        if self.record_path is not None:
+            self._record(pcm, sample_rate)
+        if self.started:
+            self.engine.play_pcm(pcm, sample_rate)
+            return
+        self._pending.append((pcm, sample_rate))
+        self._pending_bytes += len(pcm)
+        if self._pending_bytes >= sample_rate * 2 * self.prebuffer_ms / 1000:
+            self._start()
+
+    def close(self, discard=False):
+        """
+        End the stream: queue the audio still held back and finish the recording.
+
+        Args:
+        discard (bool): Drop the held back audio instead, e.g. after playback was stopped.
+
+        Returns:
+        bool: True if any audio was queued for playback.
+        """
+        if self._pending and not discard:
+            self._start()
+        self._pending = []
+        if self._recording is not None:
+            self._recording.close()
+            self._recording = None
+            logging.info(f"Recorded speech to {self.record_path}")
+        return self.started
+
+    def _start(self):
+        self.started = True
+        if self.on_start is not None:
+            self.on_start()
+        for pcm, sample_rate in self._pending:
+            self.engine.play_pcm(pcm, sample_rate)
+        self._pending = []
+
+    def _record(self, pcm, sample_rate):
+        if self._recording is None:
+            self._recording = wave.open(self.record_path, 'wb')
+            self._recording.setnchannels(1)
+            self._recording.setsampwidth(2)
+            self._recording.setframerate(sample_rate)
+        self._recording.writeframes(pcm)
+
+
+@lru_cache(maxsize=None)
+def get_playback_engine():
+    """
+    Return the shared playback engine, starting it on first use.
+    """
+    return PlaybackEngine(null_output=Config.NULL_AUDIO_OUTPUT)
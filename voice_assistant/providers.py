@@ -0,0 +1,259 @@
+# voice_assistant/providers.py
+"""
+Registry of the transcription, response and TTS providers.
+
+A provider implements one stage of the assistant for one backend and describes what it can do
+in its Capabilities, so the pipeline can pick the streaming or in-memory path the provider
+supports. The built-in providers are registered by their stage modules (transcription,
+response_generation and text_to_speech).
+
+Other packages can add providers without changing Verbi by declaring an entry point in one of
+the groups 'verbi.transcription', 'verbi.response' or 'verbi.tts', named after the model
+value used in Config, e.g. in their setup.py:
+
+    entry_points={'verbi.transcription': ['fastengine = fastengine.verbi:FastEngineTranscription']}
+
+The entry point is only loaded when its model is first selected.
+"""
+
+import asyncio
+import logging
+from collections import namedtuple
+from functools import lru_cache
+from importlib import import_module, metadata
+
+from voice_assistant.config import Config
+
+STAGES = ('transcription', 'response', 'tts')
+
+# Modules that register the built-in providers of each stage
+_BUILTIN_MODULES = {
+    'transcription': 'voice_assistant.transcription',
+    'response': 'voice_assistant.response_generation',
+    'tts': 'voice_assistant.text_to_speech',
+}
+
+# What a provider supports:
+#   streaming: transcription while the audio is captured (stream), token streaming (stream) or
+#       speech streamed as 16-bit PCM while it is synthesized (stream_speech)
+#   input_formats: in-memory audio formats the transcription takes without conversion, preferred first
+#   output_format: format of the synthesized audio file ('mp3' or 'wav')
+#   sample_rate: sample rate of the synthesized audio in Hz, None if only known per request
+#   batch: transcribe_batch runs several recordings in one inference call
+#   plays_audio: the TTS plays the audio on the playback engine itself instead of writing a file
+Capabilities = namedtuple('Capabilities',
+                          ['streaming', 'input_formats', 'output_format', 'sample_rate', 'batch', 'plays_audio'],
+                          defaults=(False, ('wav', 'flac'), 'wav', None, False, False))
+
+# A chunk of 16-bit mono PCM from TTSProvider.stream_speech
+AudioChunk = namedtuple('AudioChunk', ['pcm', 'sample_rate'])
+
+
+class Provider:
+    """
+    Base class of the providers. Subclasses set the name (the model value in Config), the Config
+    attribute holding their API key and their capabilities.
+    """
+    stage = None
+    name = None
+    api_key_setting = None
+    # Name of the shared client in voice_assistant.clients, if the provider uses one
+    client = None
+    capabilities = Capabilities()
+
+    def api_key(self):
+        """
+        Return the configured API key of the provider, or None if it does not need one.
+        """
+        return getattr(Config, self.api_key_setting, None) if self.api_key_setting else None
+
+    def prewarm_targets(self, api_key):
+        """
+        Return the (client, api_key, url) tuples to prewarm before the first turn, see clients.prewarm_clients.
+        """
+        return [(self.client, api_key, None)] if self.client else []
+
+
+class TranscriptionProvider(Provider):
+    """
+    Speech-to-text. Audio is a file path or a RecordedAudio in one of capabilities.input_formats.
+    """
+    stage = 'transcription'
+
+    def transcribe(self, api_key, audio, local_model_path=None):
+        """
+        Return the transcript of the audio.
+        """
+        raise NotImplementedError
+
+    async def atranscribe(self, api_key, audio, local_model_path=None):
+        """
+        Asynchronously return the transcript of the audio. Runs transcribe on a worker thread by default.
+        """
+        return await asyncio.to_thread(self.transcribe, api_key, audio, local_model_path)
+
+    def stream(self, api_key, frames, sample_rate, local_model_path=None):
+        """
+        Transcribe 16-bit mono PCM frames while they are captured (capabilities.streaming).
+
+        Yields:
+        TranscriptEvent: Partial transcripts, followed by exactly one final transcript.
+        """
+        raise NotImplementedError
+
+    def transcribe_batch(self, api_key, audios, local_model_path=None):
+        """
+        Return the transcripts of several recordings. Transcribes them one by one unless capabilities.batch.
+        """
+        return [self.transcribe(api_key, audio, local_model_path) for audio in audios]
+
+
+class ResponseProvider(Provider):
+    """
+    Response generation from the chat history.
+    """
+    stage = 'response'
+
+    def generate(self, api_key, chat_history, local_model_path=None):
+        """
+        Return the response to the chat history.
+        """
+        raise NotImplementedError
+
+    def stream(self, api_key, chat_history, local_model_path=None):
+        """
+        Yield the response in chunks as it is generated. Closing the generator should abort the request.
+        """
+        yield self.generate(api_key, chat_history, local_model_path)
+
+    async def agenerate(self, api_key, chat_history, local_model_path=None):
+        """
+        Asynchronously return the response. Runs generate on a worker thread by default.
+        """
+        return await asyncio.to_thread(self.generate, api_key, chat_history, local_model_path)
+
+    async def astream(self, api_key, chat_history, local_model_path=None):
+        """
+        Asynchronously yield the response in chunks as it is generated.
+        """
+        yield await self.agenerate(api_key, chat_history, local_model_path)
+
+
+class TTSProvider(Provider):
+    """
+    Text-to-speech.
+    """
+    stage = 'tts'
+    # Voice and speed the audio is generated with, part of the TTS cache key; None if not cacheable
+    voice = None
+    speed = 1.0
+
+    def synthesize(self, api_key, text, output_file_path, local_model_path=None, cancel_event=None):
+        """
+        Write the speech for the text to output_file_path in capabilities.output_format.
+        """
+        raise NotImplementedError
+
+    async def asynthesize(self, api_key, text, output_file_path, local_model_path=None):
+        """
+        Asynchronously write the speech for the text. Runs synthesize on a worker thread by default.
+        """
+        await asyncio.to_thread(self.synthesize, api_key, text, output_file_path, local_model_path)
+
+    def stream_speech(self, api_key, text, local_model_path=None):
+        """
+        Yield the speech for the text while it is synthesized (capabilities.streaming).
+
+        Yields:
+        AudioChunk: 16-bit mono PCM.
+        """
+        raise NotImplementedError
+
+
+_providers = {stage: {} for stage in STAGES}
+
+
+def register_provider(provider):
+    """
+    Register a provider under its stage and name, replacing any provider registered before.
+
+    Args:
+    provider (Provider or type): A provider instance, or a provider class to instantiate. The
+        argument is returned unchanged, so this can be used as a class decorator.
+    """
+    instance = provider() if isinstance(provider, type) else provider
+    if instance.stage not in _providers:
+        raise ValueError(f"Unknown provider stage: {instance.stage}")
+    _providers[instance.stage][instance.name] = instance
+    return provider
+
+
+@lru_cache(maxsize=None)
+def _entry_points(stage):
+    """
+    Return the entry points of a stage by name.
+    """
+    group = f"verbi.{stage}"
+    try:
+        entry_points = metadata.entry_points(group=group)
+    except TypeError:
+        # Python < 3.10
+        entry_points = metadata.entry_points().get(group, [])
+    return {entry_point.name: entry_point for entry_point in entry_points}
+
+
+def find_provider(stage, name):
+    """
+    Return the provider of a stage by name, or None if there is none.
+
+    Args:
+    stage (str): 'transcription', 'response' or 'tts'.
+    name (str): The model value used in Config, e.g. 'openai'.
+
+    Returns:
+    Provider: The registered provider.
+    """
+    if stage not in _providers:
+        raise ValueError(f"Unknown provider stage: {stage}")
+    provider = _providers[stage].get(name)
+    if provider is None:
+        import_module(_BUILTIN_MODULES[stage])
+        provider = _providers[stage].get(name)
+    if provider is None and name in _entry_points(stage):
+        try:
+            loaded = _entry_points(stage)[name].load()
+            instance = loaded() if isinstance(loaded, type) else loaded
+            instance.stage, instance.name = stage, name
+            register_provider(instance)
+            provider = instance
+        except Exception as e:
+            logging.error(f"Failed to load {stage} provider {name}: {e}")
+    return provider
+
+
+def get_provider(stage, name):
+    """
+    Return the provider of a stage by name.
+
+    Raises:
+    ValueError: If there is no such provider.
+    """
+    provider = find_provider(stage, name)
+    if provider is None:
+        raise ValueError(f"Unsupported {stage} model: {name}")
+    return provider
+
+
+def get_capabilities(stage, name):
+    """
+    Return the capabilities of a provider.
+    """
+    return get_provider(stage, name).capabilities
+
+
+def provider_names(stage):
+    """
+    Return the names of all the providers of a stage, including the ones from entry points.
+    """
+    import_module(_BUILTIN_MODULES[stage])
+    return list(dict.fromkeys(list(_providers[stage]) + list(_entry_points(stage))))
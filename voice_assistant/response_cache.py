@@ -0,0 +1,186 @@
+# voice_assistant/response_cache.py
+
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from colorama import Fore
+
+from voice_assistant.config import Config
+
+_PUNCTUATION = re.compile(r"[^\w\s']")
+_WHITESPACE = re.compile(r"\s+")
+
+# Responses that report a failure instead of answering are never cached
+_ERROR_RESPONSES = ("Error in generating response",)
+
+
+def normalize_text(text):
+    """
+    Normalize text for cache lookups: lowercase, no punctuation, single spaces.
+
+    Args:
+    text (str): The text to normalize.
+
+    Returns:
+    str: The normalized text.
+    """
+    text = _PUNCTUATION.sub(" ", (text or "").lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def _llm_name(model):
+    return {
+        'openai': Config.OPENAI_LLM,
+        'groq': Config.GROQ_LLM,
+        'ollama': Config.OLLAMA_LLM,
+    }.get(model, model)
+
+
+class ResponseCache:
+    """
+    Cache LLM responses keyed on the model, the system prompt and the last turns of the conversation.
+
+    Entries are kept in memory with LRU and TTL eviction. With a path, they are also stored
+    in a SQLite database so they survive restarts; memory misses fall through to disk.
+
+    Args:
+    max_entries (int): Entries kept in memory (and on disk) before the least recently used are evicted.
+    ttl (float): Seconds an entry stays valid, or None to keep entries until evicted.
+    path (str): Path of the SQLite database, or None for a memory-only cache.
+    context_turns (int): Number of trailing user/assistant messages included in the key.
+    """
+
+    def __init__(self, max_entries=256, ttl=3600, path=None, context_turns=1):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.context_turns = context_turns
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses "
+                             "(key TEXT PRIMARY KEY, response TEXT, created REAL, used REAL)")
+            self._db.commit()
+
+    def key(self, model, chat_history):
+        """
+        Return the cache key for a request.
+
+        Args:
+        model (str): The response model.
+        chat_history (list): The chat history as a list of messages.
+
+        Returns:
+        str: A hex digest of the model, system prompt and last context_turns normalized messages.
+        """
+        system = [message['content'] for message in chat_history if message['role'] == 'system']
+        turns = [(message['role'], normalize_text(message['content']))
+                 for message in chat_history if message['role'] != 'system']
+        payload = json.dumps([model, _llm_name(model), system, turns[-self.context_turns:]])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, model, chat_history):
+        """
+        Return the cached response for a request, or None.
+        """
+        key = self.key(model, chat_history)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[0], now):
+                del self._entries[key]
+                entry = None
+            if entry is None and self._db is not None:
+                entry = self._load(key, now)
+                if entry is not None:
+                    self._store(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        logging.info(Fore.CYAN + f"Response cache hit (hits={self.hits}, misses={self.misses})" + Fore.RESET)
+        return entry[1]
+
+    def put(self, model, chat_history, response):
+        """
+        Store the response for a request. Empty and error responses are ignored.
+        """
+        if not response or response in _ERROR_RESPONSES:
+            return
+        key = self.key(model, chat_history)
+        entry = (time.time(), response)
+        with self._lock:
+            self._store(key, entry)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, response, entry[0], entry[0]))
+                self._db.execute("DELETE FROM responses WHERE key NOT IN "
+                                 "(SELECT key FROM responses ORDER BY used DESC LIMIT ?)", (self.max_entries,))
+                self._db.commit()
+
+    def clear(self):
+        """
+        Remove all entries and reset the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self):
+        """
+        Return the hit/miss counters.
+
+        Returns:
+        dict: hits, misses, hit_rate and the number of entries in memory.
+        """
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0, "entries": len(self._entries)}
+
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self, key, now):
+        row = self._db.execute("SELECT created, response FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if self._expired(row[0], now):
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+            return None
+        self._db.execute("UPDATE responses SET used = ? WHERE key = ?", (now, key))
+        self._db.commit()
+        return row[0], row[1]
+
+
+@lru_cache(maxsize=None)
+def get_response_cache():
+    """
+    Return the shared response cache, or None if RESPONSE_CACHE is disabled.
+
+    Returns:
+    ResponseCache: The cache configured in Config.
+    """
+    if not Config.RESPONSE_CACHE:
+        return None
+    return ResponseCache(Config.RESPONSE_CACHE_SIZE, Config.RESPONSE_CACHE_TTL,
+                         Config.RESPONSE_CACHE_PATH, Config.RESPONSE_CACHE_CONTEXT_TURNS)
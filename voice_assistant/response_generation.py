@@ -1,20 +1,28 @@
 # voice_assistant/response_generation.py
 
+import asyncio
 import logging
+import threading
 
-from openai import OpenAI
-from groq import Groq
-import ollama
-
+from voice_assistant import failover
+from voice_assistant.clients import get_client, get_async_client
 from voice_assistant.config import Config
+from voice_assistant.providers import Capabilities, ResponseProvider, register_provider
+from voice_assistant.response_cache import get_response_cache
+from voice_assistant.tracing import traced
+
 
+def _trace_prompt(span, arguments, result):
+    span.set(bytes_sent=sum(len(message['content'].encode()) for message in arguments['chat_history']))
 
+
+@traced('llm', annotate=_trace_prompt)
 def generate_response(model:str, api_key:str, chat_history:list, local_model_path:str=None):
     """
     Generate a response using the specified model.
     
     Args:
-    model (str): The model to use for response generation ('openai', 'groq', 'local').
+    model (str): The response provider ('openai', 'groq', 'ollama', 'local' or a plugin).
     api_key (str): The API key for the response generation service.
     chat_history (list): The chat history as a list of messages.
     local_model_path (str): The path to the local model (if applicable).
@@ -22,43 +30,360 @@ def generate_response(model:str, api_key:str, chat_history:list, local_model_pat
     Returns:
     str: The generated response text.
     """
+    cache = get_response_cache()
+    if cache is not None:
+        cached = cache.get(model, chat_history)
+        if cached is not None:
+            return cached
     try:
-        if model == 'openai':
-            return _generate_openai_response(api_key, chat_history)
-        elif model == 'groq':
-            return _generate_groq_response(api_key, chat_history)
-        elif model == 'ollama':
-            return _generate_ollama_response(chat_history)
-        elif model == 'local':
-            # Placeholder for local LLM response generation
-            return "Generated response from local model"
-        else:
-            raise ValueError("Unsupported response generation model")
+        response = failover.call('response', model, api_key,
+                                 lambda provider, key: provider.generate(key, chat_history, local_model_path))
+        if cache is not None:
+            cache.put(model, chat_history, response)
+        return response
     except Exception as e:
         logging.error(f"Failed to generate response: {e}")
         return "Error in generating response"
 
-def _generate_openai_response(api_key, chat_history):
-    client = OpenAI(api_key=api_key)
+def _generate_chat_completion(provider, api_key, llm, chat_history):
+    client = get_client(provider, api_key)
     response = client.chat.completions.create(
-        model=Config.OPENAI_LLM,
+        model=llm,
         messages=chat_history
     )
     return response.choices[0].message.content
 
 
-def _generate_groq_response(api_key, chat_history):
-    client = Groq(api_key=api_key)
-    response = client.chat.completions.create(
-        model=Config.GROQ_LLM,
+def _generate_ollama_response(chat_history):
+    client = get_client('ollama')
+    response = client.chat(
+        model=Config.OLLAMA_LLM,
+        messages=chat_history,
+        keep_alive=Config.OLLAMA_KEEP_ALIVE,
+    )
+    return response['message']['content']
+
+
+# A llama.cpp context holds the KV cache of one prompt at a time, so local requests take turns
+_local_llm_lock = threading.Lock()
+
+
+def _local_llm(local_model_path):
+    return get_client('llama_cpp', None, Config.LOCAL_LLM_PATH or local_model_path)
+
+
+def _generate_local_response(chat_history, local_model_path):
+    llm = _local_llm(local_model_path)
+    with _local_llm_lock:
+        # llama.cpp reuses the KV cache of the longest prefix shared with the previous prompt
+        response = llm.create_chat_completion(
+            messages=chat_history,
+            max_tokens=Config.LOCAL_LLM_MAX_TOKENS,
+            temperature=Config.LOCAL_LLM_TEMPERATURE,
+        )
+    return response['choices'][0]['message']['content']
+
+@traced('llm', annotate=_trace_prompt)
+def stream_response(model:str, api_key:str, chat_history:list, local_model_path:str=None):
+    """
+    Stream a response from the specified model, yielding text as it is generated.
+    
+    Args:
+    model (str): The response provider ('openai', 'groq', 'ollama', 'local' or a plugin).
+    api_key (str): The API key for the response generation service.
+    chat_history (list): The chat history as a list of messages.
+    local_model_path (str): The path to the local model (if applicable).
+
+    Yields:
+    str: Chunks of the generated response text.
+    """
+    cache = get_response_cache()
+    if cache is not None:
+        cached = cache.get(model, chat_history)
+        if cached is not None:
+            yield cached
+            return
+    produced = False
+    parts = []
+    try:
+        chunks = failover.stream('response', model, api_key,
+                                 lambda provider, key: provider.stream(key, chat_history, local_model_path))
+        try:
+            for chunk in chunks:
+                if chunk:
+                    produced = True
+                    parts.append(chunk)
+                    yield chunk
+        finally:
+            chunks.close()
+        # Only complete responses are cached, not ones cut short by the consumer
+        if cache is not None:
+            cache.put(model, chat_history, "".join(parts))
+    except Exception as e:
+        logging.error(f"Failed to generate response: {e}")
+        if not produced:
+            yield "Error in generating response"
+
+def _stream_chat_completion(provider, api_key, llm, chat_history):
+    client = get_client(provider, api_key)
+    stream = client.chat.completions.create(
+        model=llm,
+        messages=chat_history,
+        stream=True
+    )
+    try:
+        for chunk in stream:
+            if chunk.choices:
+                yield chunk.choices[0].delta.content
+    finally:
+        # Abort the HTTP request if the consumer stops early, e.g. on barge-in
+        stream.close()
+
+
+def _stream_ollama_response(chat_history):
+    client = get_client('ollama')
+    stream = client.chat(
+        model=Config.OLLAMA_LLM,
+        messages=chat_history,
+        stream=True,
+        keep_alive=Config.OLLAMA_KEEP_ALIVE,
+    )
+    try:
+        for chunk in stream:
+            yield chunk['message']['content']
+    finally:
+        stream.close()
+
+
+def _stream_local_response(chat_history, local_model_path):
+    llm = _local_llm(local_model_path)
+    with _local_llm_lock:
+        stream = llm.create_chat_completion(
+            messages=chat_history,
+            max_tokens=Config.LOCAL_LLM_MAX_TOKENS,
+            temperature=Config.LOCAL_LLM_TEMPERATURE,
+            stream=True,
+        )
+        try:
+            for chunk in stream:
+                yield chunk['choices'][0]['delta'].get('content')
+        finally:
+            # Stops decoding if the consumer stops early, e.g. on barge-in
+            stream.close()
+
+
+@traced('llm', annotate=_trace_prompt)
+async def agenerate_response(model:str, api_key:str, chat_history:list, local_model_path:str=None, timeout:float=None):
+    """
+    Asynchronously generate a response using the specified model.
+
+    Cancelling the awaiting task cancels the request.
+
+    Args:
+    model (str): The response provider ('openai', 'groq', 'ollama', 'local' or a plugin).
+    api_key (str): The API key for the response generation service.
+    chat_history (list): The chat history as a list of messages.
+    local_model_path (str): The path to the local model (if applicable).
+    timeout (float): Seconds to wait before giving up, or None to wait indefinitely.
+
+    Returns:
+    str: The generated response text.
+    """
+    cache = get_response_cache()
+    if cache is not None:
+        cached = cache.get(model, chat_history)
+        if cached is not None:
+            return cached
+    try:
+        response = await failover.acall('response', model, api_key,
+                                        lambda provider, key: provider.agenerate(key, chat_history, local_model_path),
+                                        timeout)
+        if cache is not None:
+            cache.put(model, chat_history, response)
+        return response
+    except Exception as e:
+        logging.error(f"Failed to generate response: {e!r}")
+        return "Error in generating response"
+
+@traced('llm', annotate=_trace_prompt)
+async def astream_response(model:str, api_key:str, chat_history:list, local_model_path:str=None):
+    """
+    Asynchronously stream a response from the specified model.
+
+    Closing the generator (or cancelling the consuming task) aborts the request.
+
+    Args:
+    model (str): The response provider ('openai', 'groq', 'ollama', 'local' or a plugin).
+    api_key (str): The API key for the response generation service.
+    chat_history (list): The chat history as a list of messages.
+    local_model_path (str): The path to the local model (if applicable).
+
+    Yields:
+    str: Chunks of the generated response text.
+    """
+    cache = get_response_cache()
+    if cache is not None:
+        cached = cache.get(model, chat_history)
+        if cached is not None:
+            yield cached
+            return
+    produced = False
+    parts = []
+    try:
+        chunks = failover.astream('response', model, api_key,
+                                  lambda provider, key: provider.astream(key, chat_history, local_model_path))
+        try:
+            async for chunk in chunks:
+                if chunk:
+                    produced = True
+                    parts.append(chunk)
+                    yield chunk
+        finally:
+            await chunks.aclose()
+        if cache is not None:
+            cache.put(model, chat_history, "".join(parts))
+    except Exception as e:
+        logging.error(f"Failed to generate response: {e!r}")
+        if not produced:
+            yield "Error in generating response"
+
+async def _agenerate_chat_completion(provider, api_key, llm, chat_history):
+    client = get_async_client(provider, api_key)
+    response = await client.chat.completions.create(
+        model=llm,
         messages=chat_history
     )
     return response.choices[0].message.content
 
 
-def _generate_ollama_response(chat_history):
-    response = ollama.chat(
+async def _agenerate_ollama_response(chat_history):
+    client = get_async_client('ollama')
+    response = await client.chat(
+        model=Config.OLLAMA_LLM,
+        messages=chat_history,
+        keep_alive=Config.OLLAMA_KEEP_ALIVE,
+    )
+    return response['message']['content']
+
+
+async def _astream_chat_completion(provider, api_key, llm, chat_history):
+    client = get_async_client(provider, api_key)
+    stream = await client.chat.completions.create(
+        model=llm,
+        messages=chat_history,
+        stream=True
+    )
+    try:
+        async for chunk in stream:
+            if chunk.choices:
+                yield chunk.choices[0].delta.content
+    finally:
+        await stream.close()
+
+
+async def _astream_ollama_response(chat_history):
+    client = get_async_client('ollama')
+    stream = await client.chat(
         model=Config.OLLAMA_LLM,
         messages=chat_history,
+        stream=True,
+        keep_alive=Config.OLLAMA_KEEP_ALIVE,
     )
-    return response['message']['content']
\ No newline at end of file
+    try:
+        async for chunk in stream:
+            yield chunk['message']['content']
+    finally:
+        await stream.aclose()
+
+
+class ChatCompletionResponse(ResponseProvider):
+    """
+    Response generation with an OpenAI-compatible chat completions API.
+
+    Args:
+    name (str): The provider, also the name of its client in voice_assistant.clients.
+    api_key_setting (str): The Config attribute holding the API key.
+    llm_setting (str): The Config attribute holding the model name.
+    """
+    capabilities = Capabilities(streaming=True)
+
+    def __init__(self, name, api_key_setting, llm_setting):
+        self.name = name
+        self.client = name
+        self.api_key_setting = api_key_setting
+        self.llm_setting = llm_setting
+
+    def generate(self, api_key, chat_history, local_model_path=None):
+        return _generate_chat_completion(self.client, api_key, getattr(Config, self.llm_setting), chat_history)
+
+    def stream(self, api_key, chat_history, local_model_path=None):
+        return _stream_chat_completion(self.client, api_key, getattr(Config, self.llm_setting), chat_history)
+
+    async def agenerate(self, api_key, chat_history, local_model_path=None):
+        return await _agenerate_chat_completion(self.client, api_key, getattr(Config, self.llm_setting), chat_history)
+
+    def astream(self, api_key, chat_history, local_model_path=None):
+        return _astream_chat_completion(self.client, api_key, getattr(Config, self.llm_setting), chat_history)
+
+
+register_provider(ChatCompletionResponse('openai', 'OPENAI_API_KEY', 'OPENAI_LLM'))
+register_provider(ChatCompletionResponse('groq', 'GROQ_API_KEY', 'GROQ_LLM'))
+
+
+async def _astream_in_thread(chunks):
+    """
+    Iterate a blocking generator on worker threads.
+    """
+    end = object()
+    try:
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, end)
+            if chunk is end:
+                return
+            yield chunk
+    finally:
+        try:
+            await asyncio.to_thread(chunks.close)
+        except ValueError:
+            # Cancelled while a worker thread is still in next(); the generator is closed when collected
+            pass
+
+
+@register_provider
+class OllamaResponse(ResponseProvider):
+    name = 'ollama'
+    # The model is loaded at startup and kept loaded with OLLAMA_KEEP_ALIVE
+    client = 'ollama'
+    capabilities = Capabilities(streaming=True)
+
+    def generate(self, api_key, chat_history, local_model_path=None):
+        return _generate_ollama_response(chat_history)
+
+    def stream(self, api_key, chat_history, local_model_path=None):
+        return _stream_ollama_response(chat_history)
+
+    async def agenerate(self, api_key, chat_history, local_model_path=None):
+        return await _agenerate_ollama_response(chat_history)
+
+    def astream(self, api_key, chat_history, local_model_path=None):
+        return _astream_ollama_response(chat_history)
+
+
+@register_provider
+class LocalResponse(ResponseProvider):
+    """
+    In-process response generation with llama.cpp. The model is loaded once and kept resident;
+    async calls run on worker threads.
+    """
+    name = 'local'
+    client = 'llama_cpp'
+    capabilities = Capabilities(streaming=True)
+
+    def generate(self, api_key, chat_history, local_model_path=None):
+        return _generate_local_response(chat_history, local_model_path)
+
+    def stream(self, api_key, chat_history, local_model_path=None):
+        return _stream_local_response(chat_history, local_model_path)
+
+    def astream(self, api_key, chat_history, local_model_path=None):
+        return _astream_in_thread(self.stream(api_key, chat_history, local_model_path))
@@ -0,0 +1,297 @@
+# voice_assistant/session.py
+
+import asyncio
+import collections
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+from voice_assistant.api_key_manager import get_api_key
+from voice_assistant.config import Config
+from voice_assistant.context import new_conversation_context
+from voice_assistant.failover import end_turn_budget, start_turn_budget
+from voice_assistant.providers import get_capabilities, get_provider
+from voice_assistant.response_generation import astream_response
+from voice_assistant.streaming import SentenceSegmenter, get_output_file
+from voice_assistant.text_to_speech import atext_to_speech
+from voice_assistant.transcription import atranscribe_audio
+
+
+class SessionBusyError(Exception):
+    """Raised when a session already runs its maximum number of concurrent turns."""
+
+
+class ServerBusyError(Exception):
+    """Raised when the server's turn queue is full."""
+
+
+class Session:
+    """
+    One conversation with its own chat history, temporary audio files and backend selection.
+
+    Sessions only hold per-conversation state. Backend clients come from the shared client
+    registry, so all sessions on the same event loop share their connection pools.
+
+    Args:
+    transcription_model (str): The transcription model, defaults to Config.TRANSCRIPTION_MODEL.
+    response_model (str): The response model, defaults to Config.RESPONSE_MODEL.
+    tts_model (str): The TTS model, defaults to Config.TTS_MODEL.
+    system_prompt (str): The system prompt of the conversation.
+    """
+
+    def __init__(self, transcription_model=None, response_model=None, tts_model=None, system_prompt=None):
+        self.id = uuid.uuid4().hex
+        self.transcription_model = transcription_model or Config.TRANSCRIPTION_MODEL
+        self.response_model = response_model or Config.RESPONSE_MODEL
+        self.tts_model = tts_model or Config.TTS_MODEL
+        # Unknown models are rejected here rather than on the first turn
+        for stage, model in (('transcription', self.transcription_model), ('response', self.response_model)):
+            get_provider(stage, model)
+        if get_capabilities('tts', self.tts_model).plays_audio:
+            raise ValueError(f"{self.tts_model} plays audio on the local device and cannot be used in a session")
+        self.context = new_conversation_context(system_prompt, self.response_model,
+                                                get_api_key("response", self.response_model))
+        self.active_turns = 0
+        self.turns = 0
+        self.last_active = time.monotonic()
+        self._directory = tempfile.mkdtemp(prefix=f"verbi-{self.id}-")
+        self._tts_slots = asyncio.Semaphore(Config.GATEWAY_TTS_CONCURRENCY)
+
+    def close(self):
+        """
+        Delete the session's temporary audio files.
+        """
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+    async def stream_turn(self, audio):
+        """
+        Run one turn and yield its results as they become available.
+
+        The reply is streamed from the LLM and split into sentences. Each sentence is
+        synthesized while the LLM keeps generating, and audio is yielded in order.
+
+        Args:
+        audio (RecordedAudio): The user's utterance.
+
+        Yields:
+        dict: Events: {'type': 'transcript'}, {'type': 'response'} per sentence,
+            {'type': 'audio'} per synthesized sentence and a final {'type': 'done'}.
+        """
+        self.turns += 1
+        turn = self.turns
+        started = time.perf_counter()
+        latency = {}
+
+        def mark(milestone):
+            latency.setdefault(milestone, round((time.perf_counter() - started) * 1000, 1))
+            if milestone == 'first_audio':
+                # The turn latency budget only covers the reply until its first audio
+                end_turn_budget()
+
+        start_turn_budget()
+        user_input = await atranscribe_audio(self.transcription_model,
+                                             get_api_key("transcription", self.transcription_model), audio,
+                                             Config.LOCAL_MODEL_PATH, timeout=Config.TRANSCRIPTION_TIMEOUT)
+        mark('transcript')
+        yield {"type": "transcript", "text": user_input}
+        if not user_input:
+            end_turn_budget()
+            yield {"type": "done", "latency": latency}
+            return
+        self.context.append({"role": "user", "content": user_input})
+
+        segmenter = SentenceSegmenter()
+        pending = collections.deque()
+        response_parts = []
+        # One chunk can complete several segments, so segments are numbered on their own
+        segments = 0
+        try:
+            async for chunk in astream_response(self.response_model, get_api_key("response", self.response_model),
+                                                self.context.messages, Config.LOCAL_MODEL_PATH):
+                mark('first_token')
+                response_parts.append(chunk)
+                for segment in segmenter.feed(chunk):
+                    pending.append(asyncio.create_task(self._synthesize(turn, segments, segment)))
+                    segments += 1
+                # Send the audio that is ready without waiting for the rest of the reply
+                while pending and pending[0].done():
+                    for event in self._segment_events(pending.popleft().result(), mark):
+                        yield event
+            for segment in segmenter.flush():
+                pending.append(asyncio.create_task(self._synthesize(turn, segments, segment)))
+                segments += 1
+            while pending:
+                for event in self._segment_events(await pending.popleft(), mark):
+                    yield event
+        finally:
+            for task in pending:
+                task.cancel()
+            end_turn_budget()
+            self.context.append({"role": "assistant", "content": "".join(response_parts)})
+            self.last_active = time.monotonic()
+
+        mark('end_of_turn')
+        yield {"type": "done", "latency": latency}
+
+    @staticmethod
+    def _segment_events(result, mark):
+        segment, audio_format, data = result
+        yield {"type": "response", "text": segment}
+        if data:
+            mark('first_audio')
+            yield {"type": "audio", "format": audio_format, "data": data}
+
+    async def _synthesize(self, turn, index, segment):
+        async with self._tts_slots:
+            output_file = os.path.join(self._directory, f"{turn}_{index}_{get_output_file(self.tts_model)}")
+            await atext_to_speech(self.tts_model, get_api_key("tts", self.tts_model), segment, output_file,
+                                  Config.LOCAL_MODEL_PATH, timeout=Config.TTS_TIMEOUT)
+            try:
+                data = await asyncio.to_thread(_read_and_delete, output_file)
+            except FileNotFoundError:
+                logging.error(f"Session {self.id}: no audio was generated for {segment!r}")
+                data = b""
+            return segment, os.path.splitext(output_file)[1][1:], data
+
+
+def _read_and_delete(file_path):
+    with open(file_path, "rb") as f:
+        data = f.read()
+    os.remove(file_path)
+    return data
+
+
+class SessionManager:
+    """
+    Keep track of sessions and admit turns within the configured concurrency limits.
+
+    Args:
+    max_concurrent_turns (int): Turns processed at once across all sessions.
+    max_queued_turns (int): Turns allowed to wait for a slot before new ones are rejected.
+    session_max_turns (int): Concurrent turns allowed per session.
+    session_ttl (float): Seconds of inactivity after which a session is removed.
+    """
+
+    def __init__(self, max_concurrent_turns=None, max_queued_turns=None, session_max_turns=None, session_ttl=None):
+        self.max_concurrent_turns = max_concurrent_turns or Config.GATEWAY_MAX_CONCURRENT_TURNS
+        self.max_queued_turns = max_queued_turns if max_queued_turns is not None else Config.GATEWAY_MAX_QUEUED_TURNS
+        self.session_max_turns = session_max_turns or Config.GATEWAY_SESSION_MAX_TURNS
+        self.session_ttl = session_ttl or Config.GATEWAY_SESSION_TTL
+        self.sessions = {}
+        self.active_turns = 0
+        self.queued_turns = 0
+        self.rejected_turns = 0
+        self.completed_turns = 0
+        self._slots = asyncio.Semaphore(self.max_concurrent_turns)
+
+    def create(self, **kwargs):
+        """
+        Create a session, removing expired ones first.
+
+        Returns:
+        Session: The new session.
+        """
+        self.expire()
+        session = Session(**kwargs)
+        self.sessions[session.id] = session
+        return session
+
+    def get(self, session_id):
+        """
+        Return the session with the given id, or None.
+        """
+        return self.sessions.get(session_id)
+
+    def remove(self, session_id):
+        """
+        Remove a session and delete its files.
+        """
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+
+    def expire(self):
+        """
+        Remove sessions that have been idle for longer than session_ttl.
+        """
+        now = time.monotonic()
+        for session_id, session in list(self.sessions.items()):
+            if not session.active_turns and now - session.last_active > self.session_ttl:
+                self.remove(session_id)
+
+    def check_admission(self, session):
+        """
+        Check that a turn could be queued now, without reserving its place.
+
+        Raises:
+        SessionBusyError: If the session already runs its maximum number of turns.
+        ServerBusyError: If the turn queue is full.
+        """
+        if session.active_turns >= self.session_max_turns:
+            self.rejected_turns += 1
+            raise SessionBusyError(f"Session {session.id} already has {session.active_turns} turn(s) in progress")
+        if self.active_turns >= self.max_concurrent_turns and self.queued_turns >= self.max_queued_turns:
+            self.rejected_turns += 1
+            raise ServerBusyError("Too many turns in progress")
+
+    def admit(self, session):
+        """
+        Check that a turn can be queued, and reserve its place.
+
+        Raises:
+        SessionBusyError: If the session already runs its maximum number of turns.
+        ServerBusyError: If the turn queue is full.
+        """
+        self.check_admission(session)
+        session.active_turns += 1
+        self.queued_turns += 1
+
+    async def run_turn(self, session, audio):
+        """
+        Admit the turn, wait for a free slot and stream it.
+
+        The turn is admitted when the generator starts, so a turn whose events are never read
+        holds no reservation. Call check_admission() first to reject it up front.
+
+        Raises:
+        SessionBusyError: If the session already runs its maximum number of turns.
+        ServerBusyError: If the turn queue is full.
+
+        Yields:
+        dict: The events of Session.stream_turn.
+        """
+        self.admit(session)
+        queued = True
+        try:
+            async with self._slots:
+                queued = False
+                self.queued_turns -= 1
+                self.active_turns += 1
+                try:
+                    async for event in session.stream_turn(audio):
+                        yield event
+                    self.completed_turns += 1
+                finally:
+                    self.active_turns -= 1
+        finally:
+            if queued:
+                # The client went away while the turn was still waiting for a slot
+                self.queued_turns -= 1
+            session.active_turns -= 1
+
+    def metrics(self):
+        """
+        Return the current load of the server.
+        """
+        return {
+            "sessions": len(self.sessions),
+            "active_turns": self.active_turns,
+            "queued_turns": self.queued_turns,
+            "completed_turns": self.completed_turns,
+            "rejected_turns": self.rejected_turns,
+            "max_concurrent_turns": self.max_concurrent_turns,
+            "max_queued_turns": self.max_queued_turns,
+        }
@@ -0,0 +1,265 @@
+# voice_assistant/speculation.py
+
+import logging
+import os
+import threading
+from concurrent.futures import Future
+
+from colorama import Fore
+
+from voice_assistant.context import count_tokens
+from voice_assistant.providers import get_capabilities
+from voice_assistant.response_cache import normalize_text
+from voice_assistant.response_generation import stream_response
+from voice_assistant.streaming import SentenceSegmenter, delete_prefetched_audio, get_output_file
+from voice_assistant.text_to_speech import text_to_speech
+
+
+class Speculation:
+    """
+    A response generated in the background for one partial transcript.
+
+    prefetched_audio maps the first segment of the response to a Future of its audio file
+    (None if synthesis failed), in the form run_streaming_turn takes. Whoever pops an entry
+    owns the file.
+    """
+
+    def __init__(self, transcript, chat_history):
+        self.transcript = transcript
+        self.key = normalize_text(transcript)
+        self.chat_history = chat_history
+        self.first_segment = None
+        self.prefetched_audio = {}
+        self.complete = False
+        self.used = False
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+        self._parts = []
+        self._changed = threading.Condition()
+
+    @property
+    def text(self):
+        """
+        The response generated so far.
+        """
+        return "".join(self._parts)
+
+    def stream(self):
+        """
+        Yield the response chunks: those generated so far at once, then the rest as they arrive.
+
+        Closing the generator before the response is complete cancels it, aborting the LLM request.
+
+        Yields:
+        str: The response chunks, as they came from the LLM.
+        """
+        index = 0
+        try:
+            while True:
+                with self._changed:
+                    self._changed.wait_for(lambda: index < len(self._parts) or self.done.is_set())
+                    chunks = self._parts[index:]
+                    finished = self.done.is_set()
+                index += len(chunks)
+                yield from chunks
+                if finished:
+                    return
+        finally:
+            if not self.done.is_set():
+                self.cancelled.set()
+
+    def _append(self, chunk):
+        with self._changed:
+            self._parts.append(chunk)
+            self._changed.notify_all()
+
+    def _finish(self):
+        with self._changed:
+            self.done.set()
+            self._changed.notify_all()
+
+
+class SpeculativeResponder:
+    """
+    Start generating the response while the user is still speaking.
+
+    Once the same partial transcript has been seen stable_partials times in a row, a response
+    for it is streamed on a background thread (and, with tts_model, its first segment is
+    synthesized on another thread). If the final transcript matches, the turn continues the
+    speculative response where it is, without waiting for it to finish; otherwise it is
+    cancelled, aborting the LLM request, and the turn runs as usual.
+
+    Args:
+    model (str): The model to use for response generation.
+    api_key (str): The API key for the response generation service.
+    local_model_path (str): The path to the local model (if applicable).
+    stable_partials (int): Consecutive identical partials needed before speculating.
+    min_words (int): Partials with fewer words are not speculated on.
+    tts_model (str): If set, also synthesize the first segment of the speculative response.
+    tts_api_key (str): The API key for the TTS service.
+    """
+
+    def __init__(self, model, api_key, local_model_path=None, stable_partials=2, min_words=2,
+                 tts_model=None, tts_api_key=None):
+        self.model = model
+        self.api_key = api_key
+        self.local_model_path = local_model_path
+        self.stable_partials = stable_partials
+        self.min_words = min_words
+        # Providers that play audio while they synthesize (Cartesia) cannot be prefetched
+        self.tts_model = tts_model if tts_model and not get_capabilities('tts', tts_model).plays_audio else None
+        self.tts_api_key = tts_api_key
+        self.attempts = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted_tokens = 0
+        self._current = None
+        self._last_partial = None
+        self._repeats = 0
+        self._lock = threading.Lock()
+
+    def on_partial(self, chat_history, transcript):
+        """
+        Feed a partial transcript; starts or cancels speculation as it stabilizes or changes.
+
+        Args:
+        chat_history (list): The chat history without the current user turn.
+        transcript (str): The partial transcript.
+        """
+        key = normalize_text(transcript)
+        if key == self._last_partial:
+            self._repeats += 1
+        else:
+            self._last_partial = key
+            self._repeats = 1
+            if self._current is not None and self._current.key != key:
+                self._discard()
+
+        if (self._current is None and self._repeats >= self.stable_partials
+                and len(key.split()) >= self.min_words):
+            self._start(chat_history, transcript)
+
+    def on_final(self, transcript):
+        """
+        Resolve the turn with the final transcript.
+
+        Args:
+        transcript (str): The final transcript.
+
+        Returns:
+        Speculation: The speculation if it matches the final transcript, else None. It may still
+            be generating; read it with Speculation.stream().
+        """
+        speculation = self._current
+        self._current = None
+        self._last_partial = None
+        self._repeats = 0
+        if speculation is None:
+            return None
+        # A speculation that stopped without completing (e.g. it failed) is not used
+        if speculation.key != normalize_text(transcript) or (speculation.done.is_set() and not speculation.complete):
+            self._cancel(speculation)
+            self.misses += 1
+            self._log()
+            return None
+        with self._lock:
+            speculation.used = True
+        self.hits += 1
+        self._log()
+        return speculation
+
+    def cancel(self):
+        """
+        Drop any speculation in progress, e.g. when the turn is abandoned.
+        """
+        if self._current is not None:
+            self._discard()
+
+    def stats(self):
+        """
+        Return the speculation counters.
+
+        Returns:
+        dict: attempts, hits, misses, hit_rate and wasted_tokens (completion tokens thrown away).
+        """
+        resolved = self.hits + self.misses
+        return {"attempts": self.attempts, "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / resolved if resolved else 0.0, "wasted_tokens": self.wasted_tokens}
+
+    def _start(self, chat_history, transcript):
+        speculation = Speculation(transcript, list(chat_history) + [{"role": "user", "content": transcript}])
+        self._current = speculation
+        self.attempts += 1
+        logging.info(Fore.LIGHTBLACK_EX + f"Speculating on: {transcript}" + Fore.RESET)
+        threading.Thread(target=self._run, args=(speculation,), daemon=True).start()
+
+    def _discard(self):
+        self._cancel(self._current)
+        self._current = None
+        self.misses += 1
+
+    def _cancel(self, speculation):
+        # Does not wait for the thread: if it is still running, it accounts for the waste when it stops
+        with self._lock:
+            speculation.cancelled.set()
+            if speculation.done.is_set():
+                self._discard_output(speculation)
+
+    def _discard_output(self, speculation):
+        if not speculation.used:
+            self.wasted_tokens += count_tokens(speculation.text)
+        while speculation.prefetched_audio:
+            delete_prefetched_audio(speculation.prefetched_audio.popitem()[1])
+
+    def _run(self, speculation):
+        # Segmented like run_streaming_turn segments the same chunks, so the turn looks up the
+        # prefetched audio under the segment it actually produces
+        segmenter = SentenceSegmenter()
+        responses = stream_response(self.model, self.api_key, speculation.chat_history, self.local_model_path)
+        try:
+            for chunk in responses:
+                if speculation.cancelled.is_set():
+                    return
+                if self.tts_model and speculation.first_segment is None:
+                    segments = segmenter.feed(chunk)
+                    if segments:
+                        # Registered before the chunk is published, so the turn cannot reach the segment first
+                        self._prefetch_first_segment(speculation, segments[0])
+                speculation._append(chunk)
+            else:
+                if self.tts_model and speculation.first_segment is None:
+                    segments = segmenter.flush()
+                    if segments:
+                        self._prefetch_first_segment(speculation, segments[0])
+                speculation.complete = True
+        except Exception as e:
+            logging.error(f"Speculative response failed: {e}")
+        finally:
+            # Closing the generator aborts the LLM request if it was cancelled
+            responses.close()
+            with self._lock:
+                speculation._finish()
+                if speculation.cancelled.is_set():
+                    self._discard_output(speculation)
+
+    def _prefetch_first_segment(self, speculation, segment):
+        """
+        Synthesize the segment on its own thread, so the LLM stream keeps being consumed.
+        """
+        output_file = get_output_file(self.tts_model, f"speculative_{id(speculation)}")
+        future = Future()
+
+        def synthesize():
+            try:
+                text_to_speech(self.tts_model, self.tts_api_key, segment, output_file, self.local_model_path)
+            finally:
+                future.set_result(output_file if os.path.exists(output_file) else None)
+
+        speculation.first_segment = segment
+        speculation.prefetched_audio[segment] = future
+        threading.Thread(target=synthesize, daemon=True).start()
+
+    def _log(self):
+        stats = self.stats()
+        logging.info(Fore.LIGHTBLACK_EX + f"Speculation: hits={stats['hits']}, misses={stats['misses']}, "
+                     f"hit_rate={stats['hit_rate']:.0%}, wasted_tokens={stats['wasted_tokens']}" + Fore.RESET)
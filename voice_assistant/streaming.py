@@ -0,0 +1,345 @@
+# voice_assistant/streaming.py
+
+import contextvars
+import logging
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+from colorama import Fore
+
+from voice_assistant.config import Config
+from voice_assistant.failover import end_turn_budget
+from voice_assistant.providers import get_capabilities
+from voice_assistant.response_generation import stream_response
+from voice_assistant.text_to_speech import play_speech, speaks_while_streaming, text_to_speech
+from voice_assistant.tracing import current_span
+from voice_assistant.utils import delete_file
+
+# Sentence ends: terminal punctuation (optionally followed by closing quotes/brackets) and whitespace, or a newline.
+_SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+|\n+')
+# Clause ends: used to split long sentences so TTS can start before the full sentence is generated.
+_CLAUSE_END = re.compile(r'[,;:—]\s+')
+_ABBREVIATIONS = ("mr.", "mrs.", "ms.", "dr.", "st.", "vs.", "e.g.", "i.e.", "etc.")
+
+
+class SentenceSegmenter:
+    """
+    Incrementally split streamed LLM text into sentence or clause sized segments for TTS.
+
+    Args:
+    min_chars (int): Segments shorter than this are held back and merged with the next one.
+    clause_chars (int): Split on clause punctuation once the pending text reaches this length.
+    """
+
+    def __init__(self, min_chars=12, clause_chars=80):
+        self.min_chars = min_chars
+        self.clause_chars = clause_chars
+        self._buffer = ""
+
+    def feed(self, text):
+        """
+        Add streamed text and return any segments that are complete.
+
+        Args:
+        text (str): The next chunk of generated text.
+
+        Returns:
+        list: Completed segments, in order.
+        """
+        self._buffer += text
+        segments = []
+        while True:
+            end = self._find_boundary()
+            if end is None:
+                break
+            segment = self._buffer[:end].strip()
+            self._buffer = self._buffer[end:]
+            if segment:
+                segments.append(segment)
+        return segments
+
+    def flush(self):
+        """
+        Return whatever text is still pending at the end of the stream.
+
+        Returns:
+        list: The final segment, if any.
+        """
+        segment = self._buffer.strip()
+        self._buffer = ""
+        return [segment] if segment else []
+
+    def _find_boundary(self):
+        for match in _SENTENCE_END.finditer(self._buffer):
+            end = match.end()
+            candidate = self._buffer[:end].strip()
+            if len(candidate) < self.min_chars:
+                continue
+            if candidate.lower().endswith(_ABBREVIATIONS):
+                continue
+            return end
+        if len(self._buffer) >= self.clause_chars:
+            boundary = None
+            for match in _CLAUSE_END.finditer(self._buffer):
+                if match.start() >= self.min_chars:
+                    boundary = match.end()
+            return boundary
+        return None
+
+
+class LatencyReport:
+    """
+    Collect the latency milestones of a single conversational turn.
+
+    All times are measured from the moment the response request was started.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token = None
+        self.first_audio = None
+        self.end_of_turn = None
+        self.barge_in = None
+
+    def mark(self, milestone):
+        """
+        Record a milestone ('first_token', 'first_audio', 'barge_in' or 'end_of_turn') if it has not been recorded yet.
+
+        Args:
+        milestone (str): The name of the milestone.
+        """
+        if getattr(self, milestone) is None:
+            setattr(self, milestone, time.perf_counter())
+
+    def as_dict(self):
+        """
+        Return the milestones in milliseconds relative to the start of the turn.
+
+        Returns:
+        dict: Milestone name to elapsed milliseconds (None if never reached).
+        """
+        return {
+            name: None if value is None else round((value - self.start) * 1000, 1)
+            for name, value in (("first_token", self.first_token),
+                                ("first_audio", self.first_audio),
+                                ("barge_in", self.barge_in),
+                                ("end_of_turn", self.end_of_turn))
+        }
+
+    def log(self, label="Latency"):
+        """
+        Log the report and add its milestones to the current trace span.
+
+        Args:
+        label (str): Prefix for the log line.
+        """
+        milestones = self.as_dict()
+        current_span().set(**{f"{name}_ms": ms for name, ms in milestones.items()})
+        parts = [f"{name}={ms}ms" for name, ms in milestones.items() if name != 'barge_in' or ms is not None]
+        logging.info(Fore.YELLOW + f"{label}: " + ", ".join(parts) + Fore.RESET)
+
+
+def get_output_file(tts_model, index=None, streamed=False):
+    """
+    Return the output file name for the given TTS model.
+
+    Args:
+    tts_model (str): The configured TTS model.
+    index (int): Segment index, used to give each streamed segment its own file.
+    streamed (bool): The file records streamed PCM, which is saved as WAV.
+
+    Returns:
+    str: The output file path.
+    """
+    extension = 'wav' if streamed else get_capabilities('tts', tts_model).output_format
+    if index is None:
+        return f'output.{extension}'
+    return f'output_{index}.{extension}'
+
+
+def delete_prefetched_audio(output_file):
+    """
+    Delete a prefetched audio file, or a Future of one once its synthesis has finished.
+    """
+    if isinstance(output_file, Future):
+        # Still synthesizing: delete the file once it is written
+        output_file.add_done_callback(lambda future: future.result() and delete_file(future.result()))
+    else:
+        delete_file(output_file)
+
+
+def _heard_text(segments, heard, playing, fraction):
+    """
+    Reconstruct the part of the reply that was actually played before an interruption.
+    """
+    parts = [segments[index] for index in sorted(heard)]
+    if playing is not None and fraction:
+        words = segments[playing].split()
+        parts.append(" ".join(words[:round(len(words) * fraction)]))
+    return " ".join(part for part in parts if part)
+
+
+def run_streaming_turn(chat_history, response_model, response_api_key, tts_model, tts_api_key, local_model_path=None,
+                       barge_in=None, responses=None, prefetched_audio=None):
+    """
+    Run one assistant turn with LLM streaming, per-segment TTS and overlapped playback.
+
+    The LLM output is split into segments as it streams. A TTS worker synthesizes each segment
+    while the LLM keeps generating and queues it on the playback engine, so segment N plays
+    while segment N+1 is being synthesized. TTS providers that stream PCM are played as the
+    audio arrives through a jitter buffer, without an intermediate file (unless the TTS cache
+    is used); Config.TTS_RECORD_AUDIO also saves each segment as WAV.
+
+    If barge_in is given, it runs for the whole turn. When it reports that the user started
+    speaking, playback is stopped, pending synthesis is dropped and the LLM request is aborted.
+
+    Args:
+    chat_history (list): The chat history as a list of messages.
+    response_model (str): The model to use for response generation.
+    response_api_key (str): The API key for the response generation service.
+    tts_model (str): The model to use for text-to-speech.
+    tts_api_key (str): The API key for the TTS service.
+    local_model_path (str): The path to the local model (if applicable).
+    barge_in (callable): Called with a threading.Event that is set when the turn ends; should
+        block and return True as soon as the user starts speaking (see audio.wait_for_barge_in).
+    responses (iterable): Response text chunks to use instead of calling the LLM, e.g. a speculative
+        response (Speculation.stream()). Generators are closed when the turn ends.
+    prefetched_audio (dict): Segment text to an audio file already synthesized for it, or to a
+        Future of the file (None if synthesis failed). Entries may be added while the turn runs.
+        Files that are not used are deleted.
+
+    Returns:
+    tuple: The reply text the user heard (the full reply unless interrupted) and the LatencyReport for the turn.
+    """
+    from voice_assistant.playback import get_playback_engine
+
+    report = LatencyReport()
+    engine = get_playback_engine()
+    capabilities = get_capabilities('tts', tts_model)
+    stream_audio = speaks_while_streaming(tts_model)
+    tts_queue = queue.Queue()
+    cancel = threading.Event()
+    turn_done = threading.Event()
+    segments = []
+    heard = set()
+    state = {'playing': None, 'fraction': None}
+
+    def on_segment_start(index):
+        def marker(completed):
+            if completed:
+                report.mark('first_audio')
+                state['playing'] = index
+        return marker
+
+    def on_segment_end(index):
+        def marker(completed):
+            if completed:
+                heard.add(index)
+                state['playing'] = None
+        return marker
+
+    def play_stream(index, segment):
+        record_path = get_output_file(tts_model, index, streamed=True) if Config.TTS_RECORD_AUDIO else None
+        if play_speech(tts_model, tts_api_key, segment, local_model_path, cancel,
+                       on_start=lambda: engine.add_marker(on_segment_start(index)), record_path=record_path):
+            engine.add_marker(on_segment_end(index))
+
+    def tts_worker():
+        while True:
+            item = tts_queue.get()
+            if item is None or cancel.is_set():
+                return
+            index, segment = item
+            if index > 0:
+                # The turn latency budget only covers the reply until its first segment is out
+                end_turn_budget()
+            output_file = prefetched_audio.pop(segment, None) if prefetched_audio else None
+            if isinstance(output_file, Future):
+                # Waiting for synthesis already in flight is faster than starting it again
+                output_file = output_file.result()
+            if output_file is not None:
+                engine.add_marker(on_segment_start(index))
+                engine.play_file(output_file)
+                engine.add_marker(on_segment_end(index))
+                delete_file(output_file)
+                continue
+            if stream_audio:
+                play_stream(index, segment)
+                continue
+            output_file = get_output_file(tts_model, index)
+            if capabilities.plays_audio:
+                # The provider (Cartesia) queues its audio on the engine itself while it streams
+                engine.add_marker(on_segment_start(index))
+                text_to_speech(tts_model, tts_api_key, segment, output_file, local_model_path, cancel)
+                engine.add_marker(on_segment_end(index))
+                continue
+            text_to_speech(tts_model, tts_api_key, segment, output_file, local_model_path, cancel)
+            try:
+                if not cancel.is_set():
+                    engine.add_marker(on_segment_start(index))
+                    engine.play_file(output_file)
+                    engine.add_marker(on_segment_end(index))
+            except Exception as e:
+                logging.error(f"Failed to play segment {index}: {e}")
+            finally:
+                delete_file(output_file)
+
+    def barge_in_monitor():
+        if barge_in(turn_done) and not turn_done.is_set():
+            report.mark('barge_in')
+            cancel.set()
+            state['fraction'] = engine.stop()
+            logging.info(Fore.YELLOW + "Barge-in detected, stopping the reply" + Fore.RESET)
+
+    # The worker runs in a copy of the current context so its TTS spans belong to this turn
+    worker = threading.Thread(target=contextvars.copy_context().run, args=(tts_worker,), daemon=True)
+    worker.start()
+    monitor = None
+    if barge_in is not None:
+        monitor = threading.Thread(target=barge_in_monitor, daemon=True)
+        monitor.start()
+
+    segmenter = SentenceSegmenter()
+    response_parts = []
+    if responses is None:
+        responses = stream_response(response_model, response_api_key, chat_history, local_model_path)
+    elif not hasattr(responses, 'close'):
+        responses = (chunk for chunk in responses)
+    try:
+        for chunk in responses:
+            report.mark('first_token')
+            response_parts.append(chunk)
+            for segment in segmenter.feed(chunk):
+                tts_queue.put((len(segments), segment))
+                segments.append(segment)
+            if cancel.is_set():
+                break
+        else:
+            for segment in segmenter.flush():
+                tts_queue.put((len(segments), segment))
+                segments.append(segment)
+    finally:
+        # Closing the generator aborts the streaming LLM request if it is still running
+        responses.close()
+        tts_queue.put(None)
+        if not cancel.is_set():
+            worker.join()
+            engine.wait()
+        turn_done.set()
+        if monitor is not None:
+            monitor.join()
+        # popitem is atomic, so a file is never both played by the worker and deleted here
+        while prefetched_audio:
+            delete_prefetched_audio(prefetched_audio.popitem()[1])
+        report.mark('end_of_turn')
+
+    response_text = "".join(response_parts)
+    if not cancel.is_set():
+        return response_text, report
+
+    heard_text = _heard_text(segments, heard, state['playing'], state['fraction'])
+    logging.info(Fore.YELLOW + f"Interrupted after: {heard_text!r} (generated: {response_text!r})" + Fore.RESET)
+    return heard_text, report
@@ -1,133 +1,710 @@
 # voice_assistant/text_to_speech.py
+import asyncio
+import contextvars
 import logging
 import json
-import pyaudio
-import elevenlabs
-import soundfile as sf
-import requests
-
-from openai import OpenAI
-from deepgram import DeepgramClient, SpeakOptions
-from elevenlabs.client import ElevenLabs
-from cartesia import Cartesia
+import os
+import struct
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
+from voice_assistant import failover
+from voice_assistant.clients import get_client, get_async_client, get_http_session
 from voice_assistant.config import Config
-from voice_assistant.local_tts_generation import generate_audio_file_melotts
+from voice_assistant.local_tts_generation import generate_audio_file_melotts, pcm_to_wav, stream_audio_melotts
+from voice_assistant.providers import AudioChunk, Capabilities, TTSProvider, get_capabilities, get_provider, register_provider
+from voice_assistant.tts_cache import get_tts_cache, join_audio, split_sentences
+from voice_assistant.tts_text import chunk_for_speech, normalize_for_speech
+from voice_assistant.tracing import audio_duration, traced
+
+@lru_cache(maxsize=None)
+def _get_cartesia_voice(api_key, voice_id):
+    """
+    Return the cached Cartesia voice so its embedding is only fetched once per process.
+    """
+    return get_client('cartesia', api_key).voices.get(id=voice_id)
+
+def _trace_speech(span, arguments, result):
+    output_file_path = arguments['output_file_path']
+    span.set(bytes_sent=len(arguments['text'].encode()))
+    if os.path.exists(output_file_path):
+        span.set(bytes_received=os.path.getsize(output_file_path), audio_seconds=audio_duration(output_file_path))
 
-def text_to_speech(model: str, api_key:str, text:str, output_file_path:str, local_model_path:str=None):
+@traced('tts', annotate=_trace_speech)
+def text_to_speech(model: str, api_key:str, text:str, output_file_path:str, local_model_path:str=None, cancel_event=None):
     """
     Convert text to speech using the specified model.
+
+    The text is normalized for speech first (TTS_NORMALIZE_TEXT). Replies longer than
+    TTS_CHUNK_MAX_CHARS are split into chunks that are synthesized in parallel and joined in
+    order. With TTS_CACHE enabled, cached sentences are reused and only the missing ones are synthesized.
     
     Args:
-    model (str): The model to use for TTS ('openai', 'deepgram', 'elevenlabs', 'local').
+    model (str): The TTS provider ('openai', 'deepgram', 'elevenlabs', 'cartesia', 'melotts', 'piper', 'local' or a plugin).
     api_key (str): The API key for the TTS service.
     text (str): The text to convert to speech.
     output_file_path (str): The path to save the generated speech audio file.
     local_model_path (str): The path to the local model (if applicable).
+    cancel_event (threading.Event): Stops streaming synthesis early when set (e.g. on barge-in).
     """
-    
+    text = _speech_text(text)
+    if not text:
+        logging.info("Nothing to say after normalizing the text")
+        return
+    cache = get_tts_cache()
+    if cache is not None and cache.supports(model):
+        audio = render_speech(model, api_key, text, local_model_path)
+        if audio:
+            _write_file(output_file_path, audio)
+        return
+    chunks = _speech_chunks(model, text)
+    if len(chunks) > 1:
+        clips = _synthesize_clips(model, api_key, chunks, local_model_path, cancel_event)
+        if all(clip for clip, _ in clips):
+            _write_file(output_file_path, join_audio([clip for clip, _ in clips], get_capabilities('tts', model).output_format))
+        return
+    _synthesize(model, api_key, text, output_file_path, local_model_path, cancel_event)
+
+def _speech_text(text):
+    return normalize_for_speech(text) if Config.TTS_NORMALIZE_TEXT else text
+
+def _speech_chunks(model, text):
+    # Providers that play the audio themselves take the whole reply
+    if Config.TTS_SYNTHESIS_WORKERS <= 1 or get_capabilities('tts', model).plays_audio:
+        return [text]
+    return chunk_for_speech(text, Config.TTS_CHUNK_MAX_CHARS, Config.TTS_CHUNK_MIN_CHARS)
+
+def render_speech(model: str, api_key:str, text:str, local_model_path:str=None):
+    """
+    Return the speech for the text, reusing the TTS cache where possible.
+
+    The text is split into sentences (with TTS_CACHE_SENTENCES) so repeated sentences in longer
+    replies hit the cache. Missing sentences are synthesized in parallel and added to the cache.
+
+    Args:
+    model (str): A TTS model supported by the cache.
+    api_key (str): The API key for the TTS service.
+    text (str): The text to convert to speech.
+    local_model_path (str): The path to the local model (if applicable).
+
+    Returns:
+    bytes: The encoded audio, or None if synthesis failed.
+    """
+    cache = get_tts_cache()
+    segments = _cache_segments(model, _speech_text(text))
+    clips = [cache.get(model, segment) for segment in segments]
+    missing = [index for index, clip in enumerate(clips) if clip is None]
+    synthesized = _synthesize_clips(model, api_key, [segments[index] for index in missing], local_model_path)
+    for index, (clip, provider) in zip(missing, synthesized):
+        if not clip:
+            return None
+        # Speech from a fallback provider is not cached under the model's voice
+        if provider == model:
+            cache.put(model, segments[index], clip)
+        clips[index] = clip
+    return join_audio(clips, cache.audio_format(model))
+
+def _cache_segments(model, text):
+    if Config.TTS_CACHE_SENTENCES:
+        return split_sentences(text) or [text]
+    return _speech_chunks(model, text)
+
+def _synthesize_clips(model, api_key, texts, local_model_path=None, cancel_event=None):
+    """
+    Synthesize several texts on up to TTS_SYNTHESIS_WORKERS parallel requests.
+
+    Returns:
+    list: (audio, provider) per text, in order; the audio is empty if synthesis failed.
+    """
+    if len(texts) <= 1:
+        return [_synthesize_clip(model, api_key, text, local_model_path, cancel_event) for text in texts]
+    with ThreadPoolExecutor(max_workers=min(Config.TTS_SYNTHESIS_WORKERS, len(texts))) as pool:
+        # Each request runs in a copy of the caller's context, so its spans and deadlines belong to the turn
+        futures = [pool.submit(contextvars.copy_context().run, _synthesize_clip, model, api_key, text,
+                               local_model_path, cancel_event) for text in texts]
+        return [future.result() for future in futures]
+
+def _synthesize_clip(model, api_key, text, local_model_path=None, cancel_event=None):
+    if cancel_event is not None and cancel_event.is_set():
+        return b"", None
+    fd, path = tempfile.mkstemp(suffix=f".{get_capabilities('tts', model).output_format}")
+    os.close(fd)
     try:
-        if model == 'openai':
-            client = OpenAI(api_key=api_key)
-            speech_response = client.audio.speech.create(
-                model="tts-1",
-                voice="nova",
-                input=text
-            )
-
-            speech_response.stream_to_file(output_file_path)
-            # with open(output_file_path, "wb") as audio_file:
-            #     audio_file.write(speech_response['data'])  # Ensure this correctly accesses the binary content
-
-        elif model == 'deepgram':
-            client = DeepgramClient(api_key=api_key)
-            options = SpeakOptions(
-                model="aura-arcas-en", #"aura-luna-en", # https://developers.deepgram.com/docs/tts-models
-                encoding="linear16",
-                container="wav"
-            )
-            SPEAK_OPTIONS = {"text": text}
-            response = client.speak.v("1").save(output_file_path, SPEAK_OPTIONS, options)
-        
-        elif model == 'elevenlabs':
-            client = ElevenLabs(api_key=api_key)
-            audio = client.generate(
-                text=text, 
-                voice="Paul J.", 
-                output_format="mp3_22050_32", 
-                model="eleven_turbo_v2"
-            )
-            elevenlabs.save(audio, output_file_path)
-        
-        elif model == "cartesia":
-            client = Cartesia(api_key=api_key)
-            # voice_name = "Barbershop Man"
-            voice_id = "f114a467-c40a-4db8-964d-aaba89cd08fa"#"a0e99841-438c-4a64-b679-ae501e7d6091"
-            voice = client.voices.get(id=voice_id)
-
-            # You can check out our models at https://docs.cartesia.ai/getting-started/available-models
-            model_id = "sonic-english"
-
-            # You can find the supported `output_format`s at https://docs.cartesia.ai/api-reference/endpoints/stream-speech-server-sent-events
-            output_format = {
-                "container": "raw",
-                "encoding": "pcm_f32le",
-                "sample_rate": 44100,
-            }
-
-            p = pyaudio.PyAudio()
-            rate = 44100
-
-            stream = None
-
-            # Generate and stream audio
-            for output in client.tts.sse(
-                model_id=model_id,
-                transcript=text,
-                voice_embedding=voice["embedding"],
-                stream=True,
-                output_format=output_format,
-            ):
-                buffer = output["audio"]
-
-                if stream is None:
-                    stream = p.open(format=pyaudio.paFloat32, channels=1, rate=rate, output=True)
-
-                # Write the audio data to the stream
-                stream.write(buffer)
-            
-            if stream:
-                stream.stop_stream()
-                stream.close()
-            p.terminate()
-
-        elif model == "melotts": # this is a local model
-            generate_audio_file_melotts(text=text, filename=output_file_path)
-
-        elif model == "piper":  # this is a local model
-            try:
-                response = requests.post(
-                    f"{Config.PIPER_SERVER_URL}/synthesize/",
-                    json={"text": text},
-                    headers={"Content-Type": "application/json"}
-                )
-                
-                if response.status_code == 200:
-                    with open(Config.PIPER_OUTPUT_FILE, "wb") as f:
-                        f.write(response.content)
-                    logging.info(f"Piper TTS output saved to {Config.PIPER_OUTPUT_FILE}")
-                else:
-                    logging.error(f"Piper TTS API error: {response.status_code} - {response.text}")
-
-            except Exception as e:
-                logging.error(f"Piper TTS request failed: {e}")
+        provider = _synthesize(model, api_key, text, path, local_model_path, cancel_event)
+        with open(path, "rb") as f:
+            return f.read(), provider
+    finally:
+        os.remove(path)
+
+def _fallback_filter(provider):
+    # Fallbacks must write the same format as the model, the output file is named after it
+    return lambda fallback: (not fallback.capabilities.plays_audio
+                             and fallback.capabilities.output_format == provider.capabilities.output_format)
+
+def _synthesize(model, api_key, text, output_file_path, local_model_path=None, cancel_event=None):
+    """
+    Write the speech to output_file_path with the model, or one of Config.TTS_FALLBACKS if it fails.
+
+    Returns:
+    str: The provider that synthesized the speech, or None if synthesis failed.
+    """
+    try:
+        provider = get_provider('tts', model)
+        if provider.capabilities.plays_audio:
+            # Audio that is already playing cannot be retried elsewhere
+            provider.synthesize(api_key, text, output_file_path, local_model_path, cancel_event)
+            return model
+        directory = os.path.dirname(os.path.abspath(output_file_path))
+        name, path = failover.call(
+            'tts', model, api_key,
+            lambda fallback, key: _synthesize_new_file(fallback, key, text, directory, local_model_path, cancel_event),
+            discard=lambda result: os.remove(result[1]), supports=_fallback_filter(provider))
+        os.replace(path, output_file_path)
+        return name
+    except Exception as e:
+        logging.error(f"Failed to convert text to speech: {e}")
+        return None
+
+def _synthesize_new_file(provider, api_key, text, directory, local_model_path=None, cancel_event=None):
+    """
+    Synthesize into a new file in directory, so hedged requests never write to the same file.
+
+    Returns:
+    tuple: The provider name and the file path.
+    """
+    fd, path = tempfile.mkstemp(suffix=f".{provider.capabilities.output_format}", dir=directory)
+    os.close(fd)
+    try:
+        provider.synthesize(api_key, text, path, local_model_path, cancel_event)
+        # Some providers log their errors instead of raising
+        if os.path.getsize(path) == 0:
+            raise Exception(f"{provider.name} produced no audio")
+    except BaseException:
+        os.remove(path)
+        raise
+    return provider.name, path
+
+def _synthesize_openai(api_key, text, output_file_path):
+    client = get_client('openai', api_key)
+    speech_response = client.audio.speech.create(
+        model="tts-1",
+        voice="nova",
+        input=text
+    )
+
+    speech_response.stream_to_file(output_file_path)
+    # with open(output_file_path, "wb") as audio_file:
+    #     audio_file.write(speech_response['data'])  # Ensure this correctly accesses the binary content
+
+def _synthesize_deepgram(api_key, text, output_file_path):
+    from deepgram import SpeakOptions
+    client = get_client('deepgram', api_key)
+    options = SpeakOptions(
+        model="aura-arcas-en", #"aura-luna-en", # https://developers.deepgram.com/docs/tts-models
+        encoding="linear16",
+        container="wav"
+    )
+    SPEAK_OPTIONS = {"text": text}
+    client.speak.v("1").save(output_file_path, SPEAK_OPTIONS, options)
+
+def _synthesize_elevenlabs(api_key, text, output_file_path):
+    from elevenlabs import save
+    client = get_client('elevenlabs', api_key)
+    audio = client.generate(
+        text=text, 
+        voice="Paul J.", 
+        output_format="mp3_22050_32", 
+        model="eleven_turbo_v2"
+    )
+    save(audio, output_file_path)
+
+def _synthesize_cartesia(api_key, text, cancel_event=None):
+    client = get_client('cartesia', api_key)
+    # voice_name = "Barbershop Man"
+    voice_id = "f114a467-c40a-4db8-964d-aaba89cd08fa"#"a0e99841-438c-4a64-b679-ae501e7d6091"
+    voice = _get_cartesia_voice(api_key, voice_id)
+
+    # You can check out our models at https://docs.cartesia.ai/getting-started/available-models
+    model_id = "sonic-english"
+
+    # You can find the supported `output_format`s at https://docs.cartesia.ai/api-reference/endpoints/stream-speech-server-sent-events
+    output_format = {
+        "container": "raw",
+        "encoding": "pcm_f32le",
+        "sample_rate": 44100,
+    }
+
+    from voice_assistant.playback import get_playback_engine
+    engine = get_playback_engine()
+
+    # Generate and stream audio, playback starts with the first chunk
+    for output in client.tts.sse(
+        model_id=model_id,
+        transcript=text,
+        voice_embedding=voice["embedding"],
+        stream=True,
+        output_format=output_format,
+    ):
+        if cancel_event is not None and cancel_event.is_set():
+            break
+        engine.play_pcm(output["audio"], output_format["sample_rate"], sample_format='float32')
+
+    engine.wait()
+
+def _synthesize_piper(text, output_file_path):
+    try:
+        response = get_http_session().post(
+            f"{Config.PIPER_SERVER_URL}/synthesize/",
+            json={"text": text},
+            headers={"Content-Type": "application/json"}
+        )
         
-        elif model == 'local':
+        if response.status_code == 200:
             with open(output_file_path, "wb") as f:
-                f.write(b"Local TTS audio data")
-        
+                f.write(response.content)
+            logging.info(f"Piper TTS output saved to {output_file_path}")
         else:
-            raise ValueError("Unsupported TTS model")
-        
+            logging.error(f"Piper TTS API error: {response.status_code} - {response.text}")
+
+    except Exception as e:
+        logging.error(f"Piper TTS request failed: {e}")
+
+def _trace_stream(span, arguments, result):
+    span.set(bytes_sent=len(arguments['text'].encode()))
+
+@traced('tts', annotate=_trace_stream)
+def stream_speech(model: str, api_key:str, text:str, local_model_path:str=None):
+    """
+    Yield the speech for the text as 16-bit mono PCM while it is being synthesized, without a file.
+
+    Only for providers with the streaming capability (see providers.get_capabilities). Closing
+    the generator aborts the request. Streaming providers in Config.TTS_FALLBACKS take over if
+    the model fails before its first chunk.
+
+    Args:
+    model (str): The TTS provider.
+    api_key (str): The API key for the TTS service.
+    text (str): The text to convert to speech.
+    local_model_path (str): The path to the local model (if applicable).
+
+    Yields:
+    AudioChunk: PCM samples and their sample rate.
+    """
+    text = _speech_text(text)
+    if not text:
+        return
+    yield from failover.stream('tts', model, api_key,
+                               lambda provider, key: provider.stream_speech(key, text, local_model_path),
+                               supports=lambda fallback: fallback.capabilities.streaming)
+
+def speaks_while_streaming(model):
+    """
+    Whether the model's speech is played while it streams in (see play_speech).
+
+    True for providers with the streaming capability, unless their speech is served from the
+    TTS cache, which stores files.
+
+    Args:
+    model (str): The TTS provider.
+
+    Returns:
+    bool: True to use play_speech, False to synthesize a file with text_to_speech.
+    """
+    cache = get_tts_cache()
+    return get_capabilities('tts', model).streaming and not (cache is not None and cache.supports(model))
+
+def play_speech(model: str, api_key:str, text:str, local_model_path:str=None, cancel_event=None,
+                on_start=None, record_path:str=None):
+    """
+    Play the speech for the text while it is being synthesized, without writing a file.
+
+    The PCM chunks from stream_speech go through a JitterBuffer that holds back the first
+    TTS_JITTER_BUFFER_MS of audio and then queues every chunk on the playback engine as it
+    arrives. Returns when the last chunk is queued; wait on the playback engine for the end of
+    playback.
+
+    Args:
+    model (str): The TTS provider, with the streaming capability.
+    api_key (str): The API key for the TTS service.
+    text (str): The text to convert to speech.
+    local_model_path (str): The path to the local model (if applicable).
+    cancel_event (threading.Event): Stops the stream and drops the audio not yet queued when set (e.g. on barge-in).
+    on_start (callable): Called just before the first audio is queued.
+    record_path (str): Also save the speech to this WAV file (see Config.TTS_RECORD_AUDIO).
+
+    Returns:
+    bool: True if any audio was queued for playback.
+    """
+    from voice_assistant.playback import JitterBuffer, get_playback_engine
+    buffer = JitterBuffer(get_playback_engine(), Config.TTS_JITTER_BUFFER_MS, on_start, record_path)
+    chunks = stream_speech(model, api_key, text, local_model_path)
+    try:
+        for chunk in chunks:
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            buffer.write(chunk.pcm, chunk.sample_rate)
     except Exception as e:
-        logging.error(f"Failed to convert text to speech: {e}")
\ No newline at end of file
+        logging.error(f"Failed to stream speech: {e}")
+    finally:
+        # Closing the generator aborts the request if the stream was cancelled
+        chunks.close()
+        played = buffer.close(discard=cancel_event is not None and cancel_event.is_set())
+    return played
+
+def _stream_openai(api_key, text):
+    client = get_client('openai', api_key)
+    with client.audio.speech.with_streaming_response.create(
+        model="tts-1",
+        voice="nova",
+        input=text,
+        response_format="pcm"
+    ) as response:
+        # Raw 24 kHz 16-bit mono PCM
+        for chunk in response.iter_bytes():
+            yield AudioChunk(chunk, 24000)
+
+def _stream_deepgram(api_key, text):
+    from deepgram import SpeakOptions
+    client = get_client('deepgram', api_key)
+    options = SpeakOptions(
+        model="aura-arcas-en",
+        encoding="linear16",
+        sample_rate=24000,
+        container="none"
+    )
+    response = client.speak.rest.v("1").stream_raw({"text": text}, options)
+    try:
+        response.raise_for_status()
+        for chunk in response.iter_bytes():
+            yield AudioChunk(chunk, 24000)
+    finally:
+        response.close()
+
+def _stream_elevenlabs(api_key, text):
+    client = get_client('elevenlabs', api_key)
+    audio = client.generate(
+        text=text,
+        voice="Paul J.",
+        output_format="pcm_22050",
+        model="eleven_turbo_v2",
+        stream=True
+    )
+    try:
+        for chunk in audio:
+            yield AudioChunk(chunk, 22050)
+    finally:
+        audio.close()
+
+def _stream_melotts(text):
+    sample_rate, chunks = stream_audio_melotts(text)
+    try:
+        for chunk in chunks:
+            yield AudioChunk(chunk, sample_rate)
+    finally:
+        chunks.close()
+
+def _stream_piper(text):
+    response = get_http_session().post(f"{Config.PIPER_SERVER_URL}/synthesize/", json={"text": text}, stream=True)
+    try:
+        response.raise_for_status()
+        header = b""
+        sample_rate = None
+        for chunk in response.iter_content(chunk_size=None):
+            if sample_rate is None:
+                # The server streams a WAV file: 44-byte header, then 16-bit mono PCM
+                header += chunk
+                if len(header) < 44:
+                    continue
+                sample_rate = struct.unpack_from("<I", header, 24)[0]
+                chunk = header[44:]
+            if chunk:
+                yield AudioChunk(chunk, sample_rate)
+    finally:
+        response.close()
+
+@traced('tts', annotate=_trace_speech)
+async def atext_to_speech(model: str, api_key:str, text:str, output_file_path:str, local_model_path:str=None, timeout:float=None):
+    """
+    Asynchronously convert text to speech using the specified model.
+
+    Cancelling the awaiting task cancels the request. Cartesia, which plays the audio itself
+    while it streams, runs the sync implementation on a worker thread. The text is normalized,
+    chunked and cached like in text_to_speech.
+
+    Args:
+    model (str): The TTS provider ('openai', 'deepgram', 'elevenlabs', 'cartesia', 'melotts', 'piper', 'local' or a plugin).
+    api_key (str): The API key for the TTS service.
+    text (str): The text to convert to speech.
+    output_file_path (str): The path to save the generated speech audio file.
+    local_model_path (str): The path to the local model (if applicable).
+    timeout (float): Seconds to wait before giving up, or None to wait indefinitely.
+    """
+    try:
+        text = _speech_text(text)
+        if not text:
+            logging.info("Nothing to say after normalizing the text")
+            return
+        cache = get_tts_cache()
+        if cache is not None and cache.supports(model):
+            audio = await asyncio.wait_for(arender_speech(model, api_key, text, local_model_path), timeout)
+            if audio:
+                await asyncio.to_thread(_write_file, output_file_path, audio)
+            return
+        chunks = _speech_chunks(model, text)
+        if len(chunks) > 1:
+            clips = await asyncio.wait_for(_asynthesize_clips(model, api_key, chunks, local_model_path), timeout)
+            audio = join_audio([clip for clip, _ in clips], get_capabilities('tts', model).output_format)
+            await asyncio.to_thread(_write_file, output_file_path, audio)
+            return
+        await asyncio.wait_for(_asynthesize(model, api_key, text, output_file_path, local_model_path), timeout)
+    except Exception as e:
+        logging.error(f"Failed to convert text to speech: {e!r}")
+
+async def arender_speech(model: str, api_key:str, text:str, local_model_path:str=None):
+    """
+    Asynchronously return the speech for the text, reusing the TTS cache where possible.
+
+    See render_speech.
+
+    Returns:
+    bytes: The encoded audio, or None if synthesis failed.
+    """
+    cache = get_tts_cache()
+    segments = _cache_segments(model, _speech_text(text))
+    clips = [await asyncio.to_thread(cache.get, model, segment) for segment in segments]
+    missing = [index for index, clip in enumerate(clips) if clip is None]
+    synthesized = await _asynthesize_clips(model, api_key, [segments[index] for index in missing], local_model_path)
+    for index, (clip, provider) in zip(missing, synthesized):
+        if not clip:
+            return None
+        if provider == model:
+            await asyncio.to_thread(cache.put, model, segments[index], clip)
+        clips[index] = clip
+    return join_audio(clips, cache.audio_format(model))
+
+async def _asynthesize_clips(model, api_key, texts, local_model_path=None):
+    """
+    Asynchronously synthesize several texts on up to TTS_SYNTHESIS_WORKERS parallel requests.
+
+    Returns:
+    list: (audio, provider) per text, in order.
+    """
+    slots = asyncio.Semaphore(Config.TTS_SYNTHESIS_WORKERS)
+
+    async def synthesize(text):
+        async with slots:
+            fd, path = tempfile.mkstemp(suffix=f".{get_capabilities('tts', model).output_format}")
+            os.close(fd)
+            try:
+                provider = await _asynthesize(model, api_key, text, path, local_model_path)
+                return await asyncio.to_thread(_read_file, path), provider
+            finally:
+                os.remove(path)
+
+    return await asyncio.gather(*(synthesize(text) for text in texts))
+
+async def _asynthesize(model, api_key, text, output_file_path, local_model_path=None):
+    """
+    Asynchronously write the speech with the model or one of its fallbacks, see _synthesize.
+    Unlike _synthesize, errors are raised.
+    """
+    provider = get_provider('tts', model)
+    if provider.capabilities.plays_audio:
+        await provider.asynthesize(api_key, text, output_file_path, local_model_path)
+        return model
+    directory = os.path.dirname(os.path.abspath(output_file_path))
+
+    async def synthesize(fallback, key):
+        fd, path = tempfile.mkstemp(suffix=f".{fallback.capabilities.output_format}", dir=directory)
+        os.close(fd)
+        try:
+            await fallback.asynthesize(key, text, path, local_model_path)
+            if os.path.getsize(path) == 0:
+                raise Exception(f"{fallback.name} produced no audio")
+        except BaseException:
+            os.remove(path)
+            raise
+        return fallback.name, path
+
+    async def discard(result):
+        os.remove(result[1])
+
+    name, path = await failover.acall('tts', model, api_key, synthesize, discard=discard,
+                                      supports=_fallback_filter(provider))
+    os.replace(path, output_file_path)
+    return name
+
+def _write_file(file_path, data):
+    with open(file_path, "wb") as f:
+        f.write(data)
+
+
+def _read_file(file_path):
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+async def _asynthesize_openai(api_key, text, output_file_path):
+    client = get_async_client('openai', api_key)
+    speech_response = await client.audio.speech.create(
+        model="tts-1",
+        voice="nova",
+        input=text
+    )
+    await speech_response.astream_to_file(output_file_path)
+
+
+async def _asynthesize_deepgram(api_key, text, output_file_path):
+    from deepgram import SpeakOptions
+    client = get_async_client('deepgram', api_key)
+    options = SpeakOptions(
+        model="aura-arcas-en",
+        encoding="linear16",
+        container="wav"
+    )
+    await client.speak.asyncrest.v("1").save(output_file_path, {"text": text}, options)
+
+
+async def _asynthesize_elevenlabs(api_key, text, output_file_path):
+    client = get_async_client('elevenlabs', api_key)
+    audio = await client.generate(
+        text=text,
+        voice="Paul J.",
+        output_format="mp3_22050_32",
+        model="eleven_turbo_v2"
+    )
+    chunks = [chunk async for chunk in audio]
+    await asyncio.to_thread(_write_file, output_file_path, b"".join(chunks))
+
+
+async def _asynthesize_melotts(text, output_file_path):
+    client = get_async_client('http')
+    payload = {"text": text, "language": "EN", "accent": "EN-US", "speed": 1.0}
+    async with client.stream("POST", f"http://localhost:{Config.TTS_PORT_LOCAL}/synthesize/", json=payload) as response:
+        response.raise_for_status()
+        sample_rate = int(response.headers["X-Sample-Rate"])
+        pcm = b"".join([chunk async for chunk in response.aiter_bytes()])
+    await asyncio.to_thread(_write_file, output_file_path, pcm_to_wav(pcm, sample_rate))
+
+
+async def _asynthesize_piper(text, output_file_path):
+    client = get_async_client('http')
+    response = await client.post(f"{Config.PIPER_SERVER_URL}/synthesize/", json={"text": text})
+    if response.status_code != 200:
+        logging.error(f"Piper TTS API error: {response.status_code} - {response.text}")
+        return
+    await asyncio.to_thread(_write_file, output_file_path, response.content)
+    logging.info(f"Piper TTS output saved to {output_file_path}")
+
+
+@register_provider
+class OpenAITTS(TTSProvider):
+    name = 'openai'
+    client = 'openai'
+    api_key_setting = 'OPENAI_API_KEY'
+    voice = 'nova'
+    capabilities = Capabilities(streaming=True, output_format='mp3', sample_rate=24000)
+
+    def synthesize(self, api_key, text, output_file_path, local_model_path=None, cancel_event=None):
+        _synthesize_openai(api_key, text, output_file_path)
+
+    async def asynthesize(self, api_key, text, output_file_path, local_model_path=None):
+        await _asynthesize_openai(api_key, text, output_file_path)
+
+    def stream_speech(self, api_key, text, local_model_path=None):
+        return _stream_openai(api_key, text)
+
+
+@register_provider
+class DeepgramTTS(TTSProvider):
+    name = 'deepgram'
+    client = 'deepgram'
+    api_key_setting = 'DEEPGRAM_API_KEY'
+    voice = 'aura-arcas-en'
+    capabilities = Capabilities(streaming=True, output_format='wav', sample_rate=24000)
+
+    def synthesize(self, api_key, text, output_file_path, local_model_path=None, cancel_event=None):
+        _synthesize_deepgram(api_key, text, output_file_path)
+
+    async def asynthesize(self, api_key, text, output_file_path, local_model_path=None):
+        await _asynthesize_deepgram(api_key, text, output_file_path)
+
+    def stream_speech(self, api_key, text, local_model_path=None):
+        return _stream_deepgram(api_key, text)
+
+
+@register_provider
+class ElevenLabsTTS(TTSProvider):
+    name = 'elevenlabs'
+    client = 'elevenlabs'
+    api_key_setting = 'ELEVENLABS_API_KEY'
+    voice = 'Paul J.'
+    capabilities = Capabilities(streaming=True, output_format='mp3', sample_rate=22050)
+
+    def synthesize(self, api_key, text, output_file_path, local_model_path=None, cancel_event=None):
+        _synthesize_elevenlabs(api_key, text, output_file_path)
+
+    async def asynthesize(self, api_key, text, output_file_path, local_model_path=None):
+        await _asynthesize_elevenlabs(api_key, text, output_file_path)
+
+    def stream_speech(self, api_key, text, local_model_path=None):
+        return _stream_elevenlabs(api_key, text)
+
+
+@register_provider
+class CartesiaTTS(TTSProvider):
+    name = 'cartesia'
+    client = 'cartesia'
+    api_key_setting = 'CARTESIA_API_KEY'
+    # Streams straight to the playback engine, so nothing is written or cached
+    capabilities = Capabilities(output_format='mp3', sample_rate=44100, plays_audio=True)
+
+    def synthesize(self, api_key, text, output_file_path, local_model_path=None, cancel_event=None):
+        _synthesize_cartesia(api_key, text, cancel_event)
+
+
+@register_provider
+class MeloTTS(TTSProvider):
+    name = 'melotts'
+    voice = 'EN-US'
+    capabilities = Capabilities(streaming=True, output_format='wav')
+
+    def synthesize(self, api_key, text, output_file_path, local_model_path=None, cancel_event=None):
+        generate_audio_file_melotts(text=text, filename=output_file_path)
+
+    async def asynthesize(self, api_key, text, output_file_path, local_model_path=None):
+        await _asynthesize_melotts(text, output_file_path)
+
+    def stream_speech(self, api_key, text, local_model_path=None):
+        return _stream_melotts(text)
+
+    def prewarm_targets(self, api_key):
+        return [('http', None, f"http://localhost:{Config.TTS_PORT_LOCAL}/metrics")]
+
+
+@register_provider
+class PiperTTS(TTSProvider):
+    name = 'piper'
+    voice = 'en_US-lessac-medium'
+    capabilities = Capabilities(streaming=True, output_format='wav', sample_rate=22050)
+
+    def synthesize(self, api_key, text, output_file_path, local_model_path=None, cancel_event=None):
+        _synthesize_piper(text, output_file_path)
+
+    async def asynthesize(self, api_key, text, output_file_path, local_model_path=None):
+        await _asynthesize_piper(text, output_file_path)
+
+    def stream_speech(self, api_key, text, local_model_path=None):
+        return _stream_piper(text)
+
+    def prewarm_targets(self, api_key):
+        return [('http', None, f"{Config.PIPER_SERVER_URL}/docs")] if Config.PIPER_SERVER_URL else []
+
+
+@register_provider
+class LocalTTS(TTSProvider):
+    name = 'local'
+
+    def synthesize(self, api_key, text, output_file_path, local_model_path=None, cancel_event=None):
+        _write_file(output_file_path, b"Local TTS audio data")
@@ -0,0 +1,416 @@
+# voice_assistant/tracing.py
+
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+
+from colorama import Fore
+
+from voice_assistant.config import Config
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+_current_span = contextvars.ContextVar("verbi_current_span", default=None)
+
+
+def percentile(values, q):
+    """
+    Return the q-th percentile (nearest rank) of the values, or None if there are none.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def audio_duration(path):
+    """
+    Return the duration of an audio file in seconds, or None if it cannot be read.
+    """
+    try:
+        import soundfile as sf
+        return sf.info(path).duration
+    except Exception:
+        return None
+
+
+class Span:
+    """
+    A timed stage of a turn. Spans started while another span is current become its children
+    and share its trace_id, so all the stages of a turn can be grouped.
+
+    Args:
+    tracer (Tracer): The tracer that records the span.
+    name (str): The stage, e.g. 'transcription' or 'tts'.
+    parent (Span): The enclosing span, if any.
+    attributes (dict): Initial attributes, e.g. provider.
+    """
+
+    def __init__(self, tracer, name, parent=None, **attributes):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = {key: value for key, value in attributes.items() if value is not None}
+        self.start_time = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self._otel_span = None
+        if tracer.otel is not None:
+            context = None
+            if parent is not None and parent._otel_span is not None:
+                context = otel_trace.set_span_in_context(parent._otel_span)
+            self._otel_span = tracer.otel.start_span(name, context=context, start_time=time.time_ns())
+
+    def set(self, **attributes):
+        """
+        Add attributes to the span, e.g. bytes_sent, bytes_received or audio_seconds.
+        """
+        self.attributes.update((key, value) for key, value in attributes.items() if value is not None)
+
+    def mark(self, event):
+        """
+        Record the time since the start of the span as '<event>_ms', e.g. mark('first_chunk').
+        """
+        key = f"{event}_ms"
+        if key not in self.attributes:
+            self.attributes[key] = round((time.perf_counter() - self.start) * 1000, 1)
+
+    def end(self, error=None):
+        """
+        Finish the span and record it. Only the first call has an effect.
+        """
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.start
+        if error is not None:
+            self.attributes["error"] = repr(error)
+        audio_seconds = self.attributes.get("audio_seconds")
+        if audio_seconds:
+            # Real-time factor: processing time per second of audio
+            self.attributes["rtf"] = round(self.duration / audio_seconds, 3)
+        if self._otel_span is not None:
+            self._otel_span.set_attributes({key: value for key, value in self.attributes.items()
+                                            if isinstance(value, (str, bool, int, float))})
+            self._otel_span.end()
+        self.tracer.record(self)
+
+    def as_dict(self):
+        """
+        Return the span as a JSON-serializable record.
+        """
+        return {"trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+                "name": self.name, "start": self.start_time, "duration_ms": round(self.duration * 1000, 1),
+                **self.attributes}
+
+
+class _NoopSpan:
+    """
+    Stand-in returned when tracing is disabled.
+    """
+
+    def set(self, **attributes):
+        pass
+
+    def mark(self, event):
+        pass
+
+    def end(self, error=None):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    Record spans to a JSONL file and/or OpenTelemetry, and keep per-stage durations for a summary.
+
+    Args:
+    path (str): JSONL file the spans are appended to, or None.
+    opentelemetry (bool): Also export spans through the OpenTelemetry API (requires opentelemetry-api;
+        the exporter is configured as usual, e.g. with opentelemetry-instrument).
+    """
+
+    def __init__(self, path=None, opentelemetry=False):
+        self.path = path
+        self.otel = None
+        if opentelemetry:
+            if otel_trace is None:
+                logging.warning("opentelemetry-api is not installed, spans are only written to the trace file")
+            else:
+                self.otel = otel_trace.get_tracer("verbi")
+        self._file = open(path, "a", buffering=1) if path else None
+        self._lock = threading.Lock()
+        self._records = defaultdict(list)
+
+    def start_span(self, name, **attributes):
+        """
+        Start a span without making it current, e.g. for generators that outlive the caller's frame.
+        End it with span.end().
+        """
+        return Span(self, name, _current_span.get(), **attributes)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Time a block as a span that is current inside it, so nested spans become its children.
+
+        Yields:
+        Span: The span, to add attributes to.
+        """
+        span = self.start_span(name, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.end(error=e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def record(self, span):
+        """
+        Write a finished span and add it to the summary.
+        """
+        with self._lock:
+            self._records[(span.name, span.attributes.get("provider"))].append(
+                (span.duration * 1000, span.attributes.get("rtf")))
+            if self._file is not None:
+                self._file.write(json.dumps(span.as_dict(), default=str) + "\n")
+
+    def summary(self):
+        """
+        Return p50/p95 durations per stage and provider.
+
+        Returns:
+        list: One dict per (stage, provider) with count, p50_ms, p95_ms and the mean rtf where known.
+        """
+        with self._lock:
+            records = {key: list(values) for key, values in self._records.items()}
+        return summarize(records)
+
+    def log_summary(self):
+        """
+        Log the summary table.
+        """
+        rows = self.summary()
+        if rows:
+            logging.info(Fore.CYAN + "Latency by stage:\n" + format_summary(rows) + Fore.RESET)
+
+    def close(self):
+        """
+        Log the summary and close the trace file.
+        """
+        self.log_summary()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def summarize(records):
+    """
+    Compute the summary rows from (duration ms, rtf) records grouped by (stage, provider).
+    """
+    rows = []
+    for (name, provider), values in sorted(records.items(), key=lambda item: (item[0][0], item[0][1] or "")):
+        durations = [duration for duration, _ in values]
+        rtfs = [rtf for _, rtf in values if rtf is not None]
+        rows.append({"stage": name, "provider": provider, "count": len(values),
+                     "p50_ms": percentile(durations, 50), "p95_ms": percentile(durations, 95),
+                     "rtf": sum(rtfs) / len(rtfs) if rtfs else None})
+    return rows
+
+
+def format_summary(rows):
+    """
+    Format summary rows as a text table.
+    """
+    lines = [f"{'stage':<20}{'provider':<16}{'count':>6}{'p50 ms':>10}{'p95 ms':>10}{'rtf':>8}"]
+    for row in rows:
+        rtf = f"{row['rtf']:.2f}" if row['rtf'] is not None else "-"
+        lines.append(f"{row['stage']:<20}{row['provider'] or '-':<16}{row['count']:>6}"
+                     f"{row['p50_ms']:>10.0f}{row['p95_ms']:>10.0f}{rtf:>8}")
+    return "\n".join(lines)
+
+
+@lru_cache(maxsize=None)
+def get_tracer():
+    """
+    Return the shared tracer, or None if TRACING is disabled. The summary is logged at exit.
+
+    Returns:
+    Tracer: The tracer configured in Config.
+    """
+    if not Config.TRACING:
+        return None
+    tracer = Tracer(Config.TRACE_FILE, Config.TRACE_OPENTELEMETRY)
+    atexit.register(tracer.close)
+    return tracer
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Time a block as a span on the shared tracer (a no-op when tracing is disabled).
+
+    Args:
+    name (str): The stage.
+    attributes: Initial attributes, e.g. provider.
+
+    Yields:
+    Span: The span, to add attributes to.
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        yield _NOOP_SPAN
+        return
+    with tracer.span(name, **attributes) as current:
+        yield current
+
+
+def current_span():
+    """
+    Return the current span, or a no-op span if there is none.
+    """
+    return _current_span.get() or _NOOP_SPAN
+
+
+def traced(name, annotate=None):
+    """
+    Decorate a backend call so every call is recorded as a span.
+
+    The model argument, if the function has one, is recorded as the provider. Works on functions, coroutines, generators and async generators; for generators the span
+    covers the whole iteration and records the time to the first chunk.
+
+    Args:
+    name (str): The stage.
+    annotate (callable): Called with the span, the bound arguments and the result (the joined
+        chunks for generators) to add attributes such as bytes_sent.
+    """
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        def start(args, kwargs):
+            tracer = get_tracer()
+            if tracer is None:
+                return None, None
+            arguments = signature.bind(*args, **kwargs).arguments
+            return tracer.start_span(name, provider=arguments.get("model")), arguments
+
+        def finish(span, arguments, result, error=None):
+            try:
+                if isinstance(result, (str, bytes)):
+                    span.set(bytes_received=len(result.encode() if isinstance(result, str) else result))
+                if annotate is not None:
+                    annotate(span, arguments, result)
+            except Exception as e:
+                logging.debug(f"Failed to annotate span {name}: {e}")
+            span.end(error)
+
+        if inspect.isasyncgenfunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                span, arguments = start(args, kwargs)
+                chunks = function(*args, **kwargs)
+                parts = []
+                try:
+                    async for chunk in chunks:
+                        if span is not None:
+                            span.mark("first_chunk")
+                            if isinstance(chunk, str):
+                                parts.append(chunk)
+                        yield chunk
+                finally:
+                    # Close the wrapped generator right away so it can abort its request
+                    await chunks.aclose()
+                    if span is not None:
+                        finish(span, arguments, "".join(parts))
+        elif inspect.isgeneratorfunction(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                span, arguments = start(args, kwargs)
+                if span is None:
+                    return (yield from function(*args, **kwargs))
+                chunks = function(*args, **kwargs)
+                parts = []
+                try:
+                    for chunk in chunks:
+                        span.mark("first_chunk")
+                        if isinstance(chunk, str):
+                            parts.append(chunk)
+                        yield chunk
+                finally:
+                    # Close the wrapped generator right away so it can abort its request
+                    chunks.close()
+                    finish(span, arguments, "".join(parts))
+        elif inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                span, arguments = start(args, kwargs)
+                if span is None:
+                    return await function(*args, **kwargs)
+                token = _current_span.set(span)
+                result, error = None, None
+                try:
+                    result = await function(*args, **kwargs)
+                    return result
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    _current_span.reset(token)
+                    finish(span, arguments, result, error)
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                span, arguments = start(args, kwargs)
+                if span is None:
+                    return function(*args, **kwargs)
+                token = _current_span.set(span)
+                result, error = None, None
+                try:
+                    result = function(*args, **kwargs)
+                    return result
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    _current_span.reset(token)
+                    finish(span, arguments, result, error)
+        return wrapper
+    return decorator
+
+
+def summarize_file(path):
+    """
+    Compute the summary of a JSONL trace file.
+    """
+    records = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                records[(record["name"], record.get("provider"))].append((record["duration_ms"], record.get("rtf")))
+    return summarize(records)
+
+
+if __name__ == "__main__":
+    # Summarize a trace file: python -m voice_assistant.tracing traces.jsonl
+    print(format_summary(summarize_file(sys.argv[1] if len(sys.argv) > 1 else Config.TRACE_FILE)))
@@ -1,17 +1,31 @@
 # voice_assistant/transcription.py
 
+import asyncio
 import json
+import os
 import logging
-import requests
+import queue
+import threading
 import time
+from collections import namedtuple
+from io import BytesIO
 
 from colorama import Fore, init
-from openai import OpenAI
-from groq import Groq
-from deepgram import DeepgramClient,PrerecordedOptions,FileSource
 
-fast_url = "http://localhost:8000"
+from voice_assistant import failover
+from voice_assistant.audio import RecordedAudio
+from voice_assistant.clients import get_client, get_async_client, get_http_session
+from voice_assistant.config import Config
+from voice_assistant.providers import Capabilities, TranscriptionProvider, get_provider, register_provider
+from voice_assistant.tracing import audio_duration, traced
+
+fast_url = Config.FASTWHISPERAPI_URL
 checked_fastwhisperapi = False
+# faster-whisper takes samples at this rate
+_WHISPER_SAMPLE_RATE = 16000
+
+# A partial (is_final=False) or final (is_final=True) transcript from transcribe_stream
+TranscriptEvent = namedtuple('TranscriptEvent', ['text', 'is_final'])
 
 def check_fastwhisperapi():
     """Check if the FastWhisper API is running."""
@@ -19,71 +33,153 @@ def check_fastwhisperapi():
     if not checked_fastwhisperapi:
         infopoint = f"{fast_url}/info"
         try:
-            response = requests.get(infopoint)
+            response = get_http_session().get(infopoint)
             if response.status_code != 200:
                 raise Exception("FastWhisperAPI is not running")
         except Exception:
             raise Exception("FastWhisperAPI is not running")
         checked_fastwhisperapi = True
 
+def get_input_audio_format(model):
+    """
+    Return the in-memory audio format the transcription model takes without conversion.
+
+    Args:
+        model (str): The transcription model.
+
+    Returns:
+        str: Config.INPUT_AUDIO_FORMAT if the model takes it, otherwise the model's preferred input format.
+    """
+    input_formats = get_provider('transcription', model).capabilities.input_formats
+    if Config.INPUT_AUDIO_FORMAT in input_formats:
+        return Config.INPUT_AUDIO_FORMAT
+    return input_formats[0]
+
+
+def _read_audio(audio):
+    """
+    Return (file name, bytes) for an audio file path or an in-memory recording.
+    """
+    if isinstance(audio, RecordedAudio):
+        # HTTP backends need a container, so raw PCM is wrapped in a WAV header
+        audio = audio.to_wav()
+        return audio.name, audio.data
+    with open(audio, "rb") as audio_file:
+        return audio, audio_file.read()
+
+
+def _trace_audio(span, arguments, result):
+    audio = arguments['audio_file_path']
+    if isinstance(audio, RecordedAudio):
+        span.set(bytes_sent=len(audio.data), audio_seconds=audio_duration(BytesIO(audio.to_wav().data)))
+    else:
+        span.set(bytes_sent=os.path.getsize(audio), audio_seconds=audio_duration(audio))
+
+
+@traced('transcription', annotate=_trace_audio)
 def transcribe_audio(model, api_key, audio_file_path, local_model_path=None):
     """
-    Transcribe an audio file using the specified model.
+    Transcribe an audio file or in-memory recording using the specified model.
     
     Args:
-        model (str): The model to use for transcription ('openai', 'groq', 'deepgram', 'fastwhisper', 'local').
+        model (str): The transcription provider ('openai', 'groq', 'deepgram', 'fastwhisperapi', 'local' or a plugin).
         api_key (str): The API key for the transcription service.
-        audio_file_path (str): The path to the audio file to transcribe.
+        audio_file_path (str or RecordedAudio): The path to the audio file, or the in-memory recording, to transcribe.
         local_model_path (str): The path to the local model (if applicable).
 
     Returns:
         str: The transcribed text.
     """
     try:
-        if model == 'openai':
-            return _transcribe_with_openai(api_key, audio_file_path)
-        elif model == 'groq':
-            return _transcribe_with_groq(api_key, audio_file_path)
-        elif model == 'deepgram':
-            return _transcribe_with_deepgram(api_key, audio_file_path)
-        elif model == 'fastwhisperapi':
-            return _transcribe_with_fastwhisperapi(audio_file_path)
-        elif model == 'local':
-            # Placeholder for local STT model transcription
-            return "Transcribed text from local model"
-        else:
-            raise ValueError("Unsupported transcription model")
+        return failover.call('transcription', model, api_key,
+                             lambda provider, key: provider.transcribe(key, audio_file_path, local_model_path))
     except Exception as e:
         logging.error(f"{Fore.RED}Failed to transcribe audio: {e}{Fore.RESET}")
         raise Exception("Error in transcribing audio")
 
-def _transcribe_with_openai(api_key, audio_file_path):
-    client = OpenAI(api_key=api_key)
-    with open(audio_file_path, "rb") as audio_file:
-        transcription = client.audio.transcriptions.create(
-            model="whisper-1",
-            file=audio_file,
-            language='en'
-        )
+@traced('transcription', annotate=_trace_audio)
+async def atranscribe_audio(model, api_key, audio_file_path, local_model_path=None, timeout=None):
+    """
+    Asynchronously transcribe an audio file or in-memory recording using the specified model.
+
+    Uses the SDKs' async clients, so several transcriptions (or other backend calls) can be in
+    flight at once. Cancelling the awaiting task cancels the request.
+
+    Args:
+        model (str): The transcription provider ('openai', 'groq', 'deepgram', 'fastwhisperapi', 'local' or a plugin).
+        api_key (str): The API key for the transcription service.
+        audio_file_path (str or RecordedAudio): The path to the audio file, or the in-memory recording, to transcribe.
+        local_model_path (str): The path to the local model (if applicable).
+        timeout (float): Seconds to wait before giving up, or None to wait indefinitely.
+
+    Returns:
+        str: The transcribed text.
+    """
+    try:
+        return await failover.acall('transcription', model, api_key,
+                                    lambda provider, key: provider.atranscribe(key, audio_file_path, local_model_path),
+                                    timeout)
+    except Exception as e:
+        logging.error(f"{Fore.RED}Failed to transcribe audio: {e!r}{Fore.RESET}")
+        raise Exception("Error in transcribing audio")
+
+async def _aread_audio(audio):
+    if isinstance(audio, RecordedAudio):
+        return _read_audio(audio)
+    return await asyncio.to_thread(_read_audio, audio)
+
+
+async def _atranscribe_with_whisper_api(provider, api_key, whisper_model, audio_file_path):
+    client = get_async_client(provider, api_key)
+    transcription = await client.audio.transcriptions.create(
+        model=whisper_model,
+        file=await _aread_audio(audio_file_path),
+        language='en'
+    )
     return transcription.text
 
 
-def _transcribe_with_groq(api_key, audio_file_path):
-    client = Groq(api_key=api_key)
-    with open(audio_file_path, "rb") as audio_file:
-        transcription = client.audio.transcriptions.create(
-            model="whisper-large-v3",
-            file=audio_file,
-            language='en'
-        )
+async def _atranscribe_with_deepgram(api_key, audio_file_path):
+    from deepgram import PrerecordedOptions
+    deepgram = get_async_client('deepgram', api_key)
+    _, buffer_data = await _aread_audio(audio_file_path)
+    payload = {"buffer": buffer_data}
+    options = PrerecordedOptions(model="nova-2", smart_format=True)
+    response = await deepgram.listen.asyncrest.v("1").transcribe_file(payload, options)
+    data = json.loads(response.to_json())
+    return data['results']['channels'][0]['alternatives'][0]['transcript']
+
+
+async def _atranscribe_with_fastwhisperapi(audio_file_path):
+    client = get_async_client('http')
+    if not checked_fastwhisperapi:
+        await asyncio.to_thread(check_fastwhisperapi)
+    data = {
+        'model': "base",
+        'language': "en",
+        'vad_filter': "true",
+    }
+    headers = {'Authorization': 'Bearer dummy_api_key'}
+    files = {'file': await _aread_audio(audio_file_path)}
+    response = await client.post(f"{fast_url}/v1/transcriptions", files=files, data=data, headers=headers)
+    return response.json().get('text', 'No text found in the response.')
+
+
+def _transcribe_with_whisper_api(provider, api_key, whisper_model, audio_file_path):
+    client = get_client(provider, api_key)
+    transcription = client.audio.transcriptions.create(
+        model=whisper_model,
+        file=_read_audio(audio_file_path),
+        language='en'
+    )
     return transcription.text
 
 
 def _transcribe_with_deepgram(api_key, audio_file_path):
-    deepgram = DeepgramClient(api_key)
+    from deepgram import PrerecordedOptions
+    deepgram = get_client('deepgram', api_key)
     try:
-        with open(audio_file_path, "rb") as file:
-            buffer_data = file.read()
+        _, buffer_data = _read_audio(audio_file_path)
 
         payload = {"buffer": buffer_data}
         options = PrerecordedOptions(model="nova-2", smart_format=True)
@@ -101,7 +197,6 @@ def _transcribe_with_fastwhisperapi(audio_file_path):
     check_fastwhisperapi()
     endpoint = f"{fast_url}/v1/transcriptions"
 
-    files = {'file': (audio_file_path, open(audio_file_path, 'rb'))}
     data = {
         'model': "base",
         'language': "en",
@@ -110,6 +205,292 @@ def _transcribe_with_fastwhisperapi(audio_file_path):
     }
     headers = {'Authorization': 'Bearer dummy_api_key'}
 
-    response = requests.post(endpoint, files=files, data=data, headers=headers)
+    files = {'file': _read_audio(audio_file_path)}
+    response = get_http_session().post(endpoint, files=files, data=data, headers=headers)
     response_json = response.json()
-    return response_json.get('text', 'No text found in the response.')
\ No newline at end of file
+    return response_json.get('text', 'No text found in the response.')
+
+def _local_whisper_samples(audio):
+    """
+    Return a recording as 16 kHz mono float32 samples for faster-whisper. File paths are
+    returned as they are and decoded by faster-whisper.
+    """
+    if not isinstance(audio, RecordedAudio):
+        return audio
+    import numpy as np
+    if audio.audio_format == 'pcm':
+        samples = np.frombuffer(audio.data, dtype=np.int16).astype(np.float32) / 32768.0
+        if audio.channels > 1:
+            samples = samples.reshape(-1, audio.channels).mean(axis=1)
+        sample_rate = audio.sample_rate
+    else:
+        import soundfile as sf
+        samples, sample_rate = sf.read(BytesIO(audio.data), dtype='float32')
+        if samples.ndim > 1:
+            samples = samples.mean(axis=1)
+    if sample_rate != _WHISPER_SAMPLE_RATE:
+        duration = len(samples) / sample_rate
+        positions = np.arange(int(duration * _WHISPER_SAMPLE_RATE)) / _WHISPER_SAMPLE_RATE
+        samples = np.interp(positions, np.arange(len(samples)) / sample_rate, samples).astype(np.float32)
+    return samples
+
+def _transcribe_with_local_whisper(audio, local_model_path=None):
+    model = get_client('faster_whisper', None, local_model_path or Config.LOCAL_WHISPER_MODEL)
+    segments, _ = model.transcribe(
+        _local_whisper_samples(audio),
+        beam_size=Config.LOCAL_WHISPER_BEAM_SIZE,
+        language=Config.LOCAL_WHISPER_LANGUAGE,
+        vad_filter=Config.LOCAL_WHISPER_VAD_FILTER,
+        # Single utterances need neither timestamps nor the previous window as a prompt
+        without_timestamps=True,
+        condition_on_previous_text=False,
+    )
+    # Segments are decoded lazily while they are iterated
+    return "".join(segment.text for segment in segments).strip()
+
+def _transcribe_batch_with_local_whisper(audios, local_model_path=None):
+    """
+    Transcribe several recordings with one faster-whisper inference call.
+
+    Recordings that fit in one 30 s window are decoded together by the CTranslate2 model;
+    longer ones are transcribed one by one with the sliding window.
+    """
+    import ctranslate2
+    import numpy as np
+    from faster_whisper.audio import decode_audio
+    from faster_whisper.tokenizer import Tokenizer
+
+    model = get_client('faster_whisper', None, local_model_path or Config.LOCAL_WHISPER_MODEL)
+    extractor = model.feature_extractor
+    samples = [_local_whisper_samples(audio) if isinstance(audio, RecordedAudio)
+               else decode_audio(audio, sampling_rate=_WHISPER_SAMPLE_RATE) for audio in audios]
+    transcripts = [None] * len(samples)
+    batch = []
+    for index, audio in enumerate(samples):
+        if len(audio) <= extractor.n_samples:
+            batch.append(index)
+        else:
+            transcripts[index] = _transcribe_with_local_whisper(audio, local_model_path)
+    if not batch:
+        return transcripts
+
+    features = []
+    for index in batch:
+        # Pad every recording to one full window, like faster-whisper does for its last window
+        mel = extractor(samples[index])[:, :extractor.nb_max_frames]
+        features.append(np.pad(mel, ((0, 0), (0, extractor.nb_max_frames - mel.shape[1]))))
+    features = ctranslate2.StorageView.from_array(np.ascontiguousarray(np.stack(features), dtype=np.float32))
+    languages = [Config.LOCAL_WHISPER_LANGUAGE] * len(batch)
+    if Config.LOCAL_WHISPER_LANGUAGE is None and model.model.is_multilingual:
+        # The most likely language token of each recording, e.g. '<|en|>'
+        languages = [scores[0][0][2:-2] for scores in model.model.detect_language(features)]
+    tokenizers = [Tokenizer(model.hf_tokenizer, model.model.is_multilingual, task="transcribe", language=language)
+                  for language in languages]
+    results = model.model.generate(
+        features,
+        [list(tokenizer.sot_sequence) + [tokenizer.no_timestamps] for tokenizer in tokenizers],
+        beam_size=Config.LOCAL_WHISPER_BEAM_SIZE,
+        max_length=448,
+    )
+    for index, tokenizer, result in zip(batch, tokenizers, results):
+        transcripts[index] = tokenizer.decode(result.sequences_ids[0]).strip()
+    return transcripts
+
+@traced('transcription.stream')
+def transcribe_stream(model, api_key, frames, sample_rate=16000, local_model_path=None, partial_interval=1.0):
+    """
+    Transcribe audio while it is being captured, yielding partial and final transcripts.
+
+    Providers with the streaming capability (Deepgram, over its live API) transcribe the frames
+    as they arrive and their endpointing ends the utterance. Other models fall back to
+    re-transcribing the audio captured so far with the batch API. Only the batch fallback can
+    fail over to Config.TRANSCRIPTION_FALLBACKS, as a live stream consumes the frames.
+
+    Args:
+        model (str): The transcription provider ('openai', 'groq', 'deepgram', 'fastwhisperapi', 'local' or a plugin).
+        api_key (str): The API key for the transcription service.
+        frames (iterable): 16-bit mono PCM frames, e.g. from MicrophoneStream.utterance_frames.
+        sample_rate (int): Sample rate of the frames in Hz.
+        local_model_path (str): The path to the local model (if applicable).
+        partial_interval (float): Seconds of new audio between batch partial transcripts (None to disable).
+
+    Yields:
+        TranscriptEvent: Partial transcripts, followed by exactly one final transcript.
+    """
+    try:
+        provider = get_provider('transcription', model)
+        if provider.capabilities.streaming:
+            yield from provider.stream(api_key, frames, sample_rate, local_model_path)
+        else:
+            yield from _stream_with_batch(model, api_key, frames, sample_rate, local_model_path, partial_interval)
+    except Exception as e:
+        logging.error(f"{Fore.RED}Failed to transcribe audio stream: {e}{Fore.RESET}")
+        raise Exception("Error in transcribing audio")
+
+
+def _stream_with_batch(model, api_key, frames, sample_rate, local_model_path, partial_interval):
+    bytes_per_second = sample_rate * 2
+    pcm = bytearray()
+    transcribed = 0
+    for frame in frames:
+        pcm.extend(frame)
+        if partial_interval and len(pcm) - transcribed >= partial_interval * bytes_per_second:
+            transcribed = len(pcm)
+            audio = RecordedAudio(bytes(pcm), 'pcm', sample_rate)
+            yield TranscriptEvent(transcribe_audio(model, api_key, audio, local_model_path), False)
+
+    text = ""
+    if pcm:
+        audio = RecordedAudio(bytes(pcm), 'pcm', sample_rate)
+        text = transcribe_audio(model, api_key, audio, local_model_path)
+    yield TranscriptEvent(text, True)
+
+
+def _stream_with_deepgram(api_key, frames, sample_rate):
+    from deepgram import LiveOptions, LiveTranscriptionEvents
+    deepgram = get_client('deepgram', api_key)
+    connection = deepgram.listen.live.v("1")
+    events = queue.Queue()
+    stop = threading.Event()
+
+    def on_transcript(_, result, **kwargs):
+        events.put(('transcript', result.channel.alternatives[0].transcript, result.is_final, result.speech_final))
+
+    def on_error(_, error, **kwargs):
+        events.put(('error', error, False, False))
+
+    connection.on(LiveTranscriptionEvents.Transcript, on_transcript)
+    connection.on(LiveTranscriptionEvents.Error, on_error)
+
+    options = LiveOptions(
+        model="nova-2",
+        language="en-US",
+        encoding="linear16",
+        sample_rate=sample_rate,
+        channels=1,
+        interim_results=True,
+        endpointing=Config.STREAMING_ENDPOINTING_MS,
+        smart_format=True,
+    )
+    if connection.start(options) is False:
+        raise Exception("Failed to connect to Deepgram live transcription")
+
+    def send_frames():
+        try:
+            for frame in frames:
+                if stop.is_set():
+                    break
+                connection.send(frame)
+        except Exception as e:
+            events.put(('error', e, False, False))
+        finally:
+            if hasattr(frames, 'close'):
+                frames.close()
+            events.put(('sent', None, False, False))
+
+    sender = threading.Thread(target=send_frames, daemon=True)
+    sender.start()
+
+    final_parts = []
+    finished = False
+    try:
+        while True:
+            kind, value, is_final, speech_final = events.get()
+            if kind == 'error':
+                raise Exception(f"Deepgram live transcription error: {value}")
+            if kind == 'sent':
+                # All audio was sent: flush the remaining results and close the connection
+                connection.finish()
+                finished = True
+                while not events.empty():
+                    kind, value, is_final, _ = events.get_nowait()
+                    if kind == 'transcript' and is_final and value:
+                        final_parts.append(value)
+                yield TranscriptEvent(" ".join(final_parts), True)
+                return
+
+            if is_final and value:
+                final_parts.append(value)
+            if speech_final:
+                # Deepgram's endpointing detected the end of the utterance
+                yield TranscriptEvent(" ".join(final_parts), True)
+                return
+            partial = final_parts if is_final else final_parts + [value]
+            yield TranscriptEvent(" ".join(part for part in partial if part), False)
+    finally:
+        stop.set()
+        sender.join(timeout=1)
+        if not finished:
+            connection.finish()
+
+
+class WhisperAPITranscription(TranscriptionProvider):
+    """
+    Transcription with an OpenAI-compatible audio transcriptions API.
+    """
+
+    def __init__(self, name, api_key_setting, whisper_model):
+        self.name = name
+        self.client = name
+        self.api_key_setting = api_key_setting
+        self.whisper_model = whisper_model
+
+    def transcribe(self, api_key, audio, local_model_path=None):
+        return _transcribe_with_whisper_api(self.client, api_key, self.whisper_model, audio)
+
+    async def atranscribe(self, api_key, audio, local_model_path=None):
+        return await _atranscribe_with_whisper_api(self.client, api_key, self.whisper_model, audio)
+
+
+register_provider(WhisperAPITranscription('openai', 'OPENAI_API_KEY', 'whisper-1'))
+register_provider(WhisperAPITranscription('groq', 'GROQ_API_KEY', 'whisper-large-v3'))
+
+
+@register_provider
+class DeepgramTranscription(TranscriptionProvider):
+    name = 'deepgram'
+    client = 'deepgram'
+    api_key_setting = 'DEEPGRAM_API_KEY'
+    capabilities = Capabilities(streaming=True)
+
+    def transcribe(self, api_key, audio, local_model_path=None):
+        return _transcribe_with_deepgram(api_key, audio)
+
+    async def atranscribe(self, api_key, audio, local_model_path=None):
+        return await _atranscribe_with_deepgram(api_key, audio)
+
+    def stream(self, api_key, frames, sample_rate, local_model_path=None):
+        return _stream_with_deepgram(api_key, frames, sample_rate)
+
+
+@register_provider
+class FastWhisperAPITranscription(TranscriptionProvider):
+    name = 'fastwhisperapi'
+
+    def transcribe(self, api_key, audio, local_model_path=None):
+        return _transcribe_with_fastwhisperapi(audio)
+
+    async def atranscribe(self, api_key, audio, local_model_path=None):
+        return await _atranscribe_with_fastwhisperapi(audio)
+
+    def prewarm_targets(self, api_key):
+        return [('http', None, f"{fast_url}/info")]
+
+
+@register_provider
+class LocalTranscription(TranscriptionProvider):
+    """
+    In-process transcription with faster-whisper (CTranslate2). The model is loaded once and
+    kept resident; async calls run on a worker thread. transcribe_batch decodes recordings of
+    up to 30 s in one batched inference call.
+    """
+    name = 'local'
+    client = 'faster_whisper'
+    # In-process models take the raw samples
+    capabilities = Capabilities(input_formats=('pcm',), batch=True)
+
+    def transcribe(self, api_key, audio, local_model_path=None):
+        return _transcribe_with_local_whisper(audio, local_model_path)
+
+    def transcribe_batch(self, api_key, audios, local_model_path=None):
+        return _transcribe_batch_with_local_whisper(audios, local_model_path)
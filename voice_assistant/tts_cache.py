@@ -0,0 +1,264 @@
+# voice_assistant/tts_cache.py
+"""
+Content-addressed cache of synthesized speech.
+
+Usage:
+    python -m voice_assistant.tts_cache [phrase ...]
+
+Pre-renders the given phrases (default: Config.TTS_CACHE_WARMUP_PHRASES) with the configured TTS model.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import re
+import sys
+import threading
+import wave
+from collections import OrderedDict
+from functools import lru_cache
+
+from colorama import Fore
+
+from voice_assistant.config import Config
+from voice_assistant.providers import find_provider
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])["\')\]]*\s+')
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """
+    Normalize text for cache lookups without changing how it is spoken: collapse whitespace.
+
+    Args:
+    text (str): The text to synthesize.
+
+    Returns:
+    str: The normalized text.
+    """
+    return _WHITESPACE.sub(" ", text or "").strip()
+
+
+def split_sentences(text):
+    """
+    Split text into sentences so repeated sentences in longer replies can be cached on their own.
+
+    Args:
+    text (str): The text to synthesize.
+
+    Returns:
+    list: The sentences, in order.
+    """
+    return [sentence for sentence in (part.strip() for part in _SENTENCE_END.split(text or "")) if sentence]
+
+
+def join_audio(chunks, audio_format):
+    """
+    Concatenate audio clips of the same format.
+
+    MP3 frames are self-contained, so MP3 clips are joined as bytes. WAV clips are merged into
+    a single file with one header.
+
+    Args:
+    chunks (list): The encoded clips, in order.
+    audio_format (str): 'mp3' or 'wav'.
+
+    Returns:
+    bytes: The joined audio.
+    """
+    if len(chunks) == 1 or audio_format != 'wav':
+        return b"".join(chunks)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as output:
+        for index, chunk in enumerate(chunks):
+            with wave.open(io.BytesIO(chunk)) as clip:
+                if index == 0:
+                    output.setparams(clip.getparams())
+                output.writeframes(clip.readframes(clip.getnframes()))
+    return buffer.getvalue()
+
+
+class TTSCache:
+    """
+    Cache synthesized audio on disk, keyed by a hash of (model, voice, format, speed, normalized text).
+
+    Files are evicted least recently used first once the directory exceeds max_bytes. The most
+    recently used clips are also kept in memory, up to memory_bytes, so hits do not touch disk.
+
+    Args:
+    directory (str): Directory for the cached audio files.
+    max_bytes (int): Size limit of the directory.
+    memory_bytes (int): Size limit of the in-memory hot tier.
+    """
+
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024, memory_bytes=16 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def supports(model):
+        """
+        Return whether audio from this TTS model can be cached: its provider declares a voice
+        and writes the audio to a file (Cartesia plays it directly and is not cached).
+        """
+        provider = find_provider('tts', model)
+        return provider is not None and provider.voice is not None and not provider.capabilities.plays_audio
+
+    @staticmethod
+    def audio_format(model):
+        """
+        Return the audio format the model produces.
+        """
+        return find_provider('tts', model).capabilities.output_format
+
+    def key(self, model, text):
+        """
+        Return the content address of the audio for this text.
+        """
+        provider = find_provider('tts', model)
+        voice, audio_format, speed = provider.voice, provider.capabilities.output_format, provider.speed
+        payload = "\0".join((model, voice, audio_format, str(speed), normalize_text(text)))
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, model, text):
+        """
+        Return the cached audio for this text, or None.
+        """
+        key = self.key(model, text)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return data
+        path = self._path(key, model)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self._remember(key, data)
+            self.hits += 1
+        return data
+
+    def put(self, model, text, data):
+        """
+        Store the audio for this text.
+        """
+        if not data:
+            return
+        key = self.key(model, text)
+        path = self._path(key, model)
+        # Write to a temporary name first so concurrent readers never see a partial file
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(data)
+        os.replace(temporary_path, path)
+        with self._lock:
+            self._remember(key, data)
+        self._evict()
+
+    def stats(self):
+        """
+        Return the hit/miss counters.
+
+        Returns:
+        dict: hits, misses, hit_rate and the number of clips in memory.
+        """
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0, "memory_entries": len(self._memory)}
+
+    def _path(self, key, model):
+        return os.path.join(self.directory, f"{key}.{self.audio_format(model)}")
+
+    def _remember(self, key, data):
+        if len(data) > self.memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_size -= len(previous)
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+@lru_cache(maxsize=None)
+def get_tts_cache():
+    """
+    Return the shared TTS cache, or None if TTS_CACHE is disabled.
+
+    Returns:
+    TTSCache: The cache configured in Config.
+    """
+    if not Config.TTS_CACHE:
+        return None
+    return TTSCache(Config.TTS_CACHE_DIR, Config.TTS_CACHE_MAX_BYTES, Config.TTS_CACHE_MEMORY_BYTES)
+
+
+def warm_up_tts_cache(model, api_key, phrases, local_model_path=None):
+    """
+    Pre-render phrases into the TTS cache so they play without a network call.
+
+    Args:
+    model (str): The TTS model.
+    api_key (str): The API key for the TTS service.
+    phrases (list): The phrases to render.
+    local_model_path (str): The path to the local model (if applicable).
+
+    Returns:
+    int: The number of clips that had to be synthesized (the others were already cached).
+    """
+    from voice_assistant.text_to_speech import render_speech
+
+    cache = get_tts_cache()
+    if cache is None or not cache.supports(model):
+        logging.warning(f"TTS cache is disabled or does not support {model}, skipping warmup")
+        return 0
+    misses = cache.misses
+    for phrase in phrases:
+        render_speech(model, api_key, phrase, local_model_path)
+    rendered = cache.misses - misses
+    logging.info(Fore.CYAN + f"TTS cache warmup: {len(phrases)} phrases, {rendered} clips synthesized" + Fore.RESET)
+    return rendered
+
+if __name__ == "__main__":
+    from voice_assistant.api_key_manager import get_tts_api_key
+
+    Config.TTS_CACHE = True
+    warm_up_tts_cache(Config.TTS_MODEL, get_tts_api_key(), sys.argv[1:] or Config.TTS_CACHE_WARMUP_PHRASES,
+                      Config.LOCAL_MODEL_PATH)
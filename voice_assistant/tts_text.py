@@ -0,0 +1,273 @@
+# voice_assistant/tts_text.py
+"""
+Text front-end of the TTS stage: rewrite LLM replies for speech and split them into chunks.
+
+normalize_for_speech drops what should not be read aloud (markdown syntax, code blocks, URLs,
+emoji) and spells out numbers, currency, percentages, ordinals, clock times, version numbers and
+common abbreviations, so the TTS engine neither reads symbols nor spends characters on them.
+chunk_for_speech splits the result at sentence and clause boundaries into chunks that can be
+synthesized in parallel.
+"""
+
+import re
+
+from voice_assistant.tts_cache import split_sentences
+
+_CODE_BLOCK = re.compile(r"```.*?(?:```|$)", re.S)
+_INLINE_CODE = re.compile(r"`([^`]*)`")
+_IMAGE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_URL = re.compile(r"https?://\S+|www\.\S+")
+_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+", re.M)
+_BLOCKQUOTE = re.compile(r"^\s*>\s?", re.M)
+_LIST_MARKER = re.compile(r"^\s*(?:[-*+•]|\d+[.)])\s+", re.M)
+_TABLE_RULE = re.compile(r"^\s*\|?(?:\s*:?-+:?\s*\|)+\s*:?-*:?\s*$", re.M)
+_EMPHASIS = re.compile(r"(?<!\w)(\*\*|__|\*|_|~~)(?=\S)(.+?)(?<=\S)\1(?!\w)")
+_EMOJI = re.compile("[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\uFE0F\u200D]")
+
+_ABBREVIATIONS = {
+    "Dr.": "Doctor",
+    "Mr.": "Mister",
+    "Mrs.": "Missus",
+    "Ms.": "Miz",
+    "Prof.": "Professor",
+    "vs.": "versus",
+    "e.g.": "for example",
+    "i.e.": "that is",
+    "approx.": "approximately",
+    "&": "and",
+}
+_ABBREVIATION = re.compile("|".join(r"(?<!\w)" + re.escape(abbreviation) for abbreviation in _ABBREVIATIONS))
+_ETC = re.compile(r"(?<!\w)etc\.(\s+(?=[A-Z])|\s*$)?")
+# "St." is Saint before a name (St. Louis) and Street after one (Main St.)
+_ST = re.compile(r"(?<!\w)St\.")
+_SENTENCE_START = re.compile(r"(?:^|[.!?:])\s*$")
+
+_CURRENCY = re.compile(r"\$(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d{2}))?\b")
+_NEGATIVE = re.compile(r"(?<![\w.,])[-−](?=\d)")
+_PERCENT = re.compile(r"(\d+(?:\.\d+)?)\s?%")
+_ORDINAL = re.compile(r"\b(\d+)(?:st|nd|rd|th)\b")
+_THOUSANDS = re.compile(r"\b(\d{1,3}(?:,\d{3})+)(?:\.(\d+))?\b")
+_CLOCK_TIME = re.compile(r"(?<![\d:])([01]?\d|2[0-3]):([0-5]\d)(?![\d:])")
+# Dotted numbers with more than one dot are versions (3.11.7) or addresses, read part by part
+_DOTTED = re.compile(r"\b\d+(?:\.\d+){2,}\b")
+_NUMBER = re.compile(r"\b(\d+)(?:\.(\d+))?\b")
+
+# Clause punctuation long sentences are split at
+_CLAUSE_END = re.compile(r"[,;:—]\s+")
+
+_ONES = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten", "eleven",
+         "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen"]
+_TENS = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+_SCALES = [(10 ** 12, "trillion"), (10 ** 9, "billion"), (10 ** 6, "million"), (1000, "thousand")]
+_ORDINAL_WORDS = {"one": "first", "two": "second", "three": "third", "five": "fifth", "eight": "eighth",
+                  "nine": "ninth", "twelve": "twelfth"}
+
+
+def number_to_words(number):
+    """
+    Spell out a non-negative integer, e.g. 1024 -> 'one thousand twenty-four'.
+    """
+    if number < 20:
+        return _ONES[number]
+    if number < 100:
+        tens, ones = divmod(number, 10)
+        return _TENS[tens] + (f"-{_ONES[ones]}" if ones else "")
+    if number < 1000:
+        hundreds, rest = divmod(number, 100)
+        return f"{_ONES[hundreds]} hundred" + (f" {number_to_words(rest)}" if rest else "")
+    for scale, name in _SCALES:
+        if number >= scale:
+            count, rest = divmod(number, scale)
+            return f"{number_to_words(count)} {name}" + (f" {number_to_words(rest)}" if rest else "")
+    return str(number)
+
+
+def _year_to_words(number):
+    # 1999 -> nineteen ninety-nine, 2024 -> twenty twenty-four, 1905 -> nineteen oh five
+    century, rest = divmod(number, 100)
+    if rest == 0:
+        return f"{number_to_words(century)} hundred"
+    if rest < 10:
+        return f"{number_to_words(century)} oh {_ONES[rest]}"
+    return f"{number_to_words(century)} {number_to_words(rest)}"
+
+
+def _ordinal_to_words(number):
+    words = number_to_words(number)
+    head, _, last = words.rpartition(" ")
+    if "-" in last:
+        head, _, last = words.rpartition("-")
+        separator = "-"
+    else:
+        separator = " "
+    if last in _ORDINAL_WORDS:
+        last = _ORDINAL_WORDS[last]
+    elif last.endswith("y"):
+        last = last[:-1] + "ieth"
+    else:
+        last += "th"
+    return f"{head}{separator}{last}" if head else last
+
+
+def _number_match_to_words(match):
+    whole, fraction = match.group(1), match.group(2)
+    number = int(whole)
+    if fraction is not None:
+        return _decimal_to_words(number, fraction)
+    if len(whole) > 1 and whole.startswith("0"):
+        # Codes and phone numbers are read digit by digit
+        return " ".join(_ONES[int(digit)] for digit in whole)
+    if len(whole) == 4 and 1100 <= number <= 2099 and not 2000 <= number <= 2009:
+        return _year_to_words(number)
+    return number_to_words(number)
+
+
+def _decimal_to_words(number, fraction=None):
+    words = number_to_words(number)
+    if fraction is not None:
+        words += f" point {' '.join(_ONES[int(digit)] for digit in fraction)}"
+    return words
+
+
+def _currency_to_words(match):
+    dollars, cents = int(match.group(1).replace(",", "")), int(match.group(2) or 0)
+    words = f"{number_to_words(dollars)} dollar{'' if dollars == 1 else 's'}"
+    if cents:
+        words += f" and {number_to_words(cents)} cent{'' if cents == 1 else 's'}"
+    return words
+
+
+def _clock_time_to_words(match):
+    hours, minutes = int(match.group(1)), int(match.group(2))
+    if minutes == 0:
+        # 10:00 -> ten o'clock, 18:00 -> eighteen hundred
+        return number_to_words(hours) + (" o'clock" if hours <= 12 else " hundred")
+    if minutes < 10:
+        return f"{number_to_words(hours)} oh {_ONES[minutes]}"
+    return f"{number_to_words(hours)} {number_to_words(minutes)}"
+
+
+def _st_to_words(match):
+    text, start, end = match.string, match.start(), match.end()
+    before = text[:start].rstrip()
+    previous = before.rsplit(None, 1)[-1] if before else ""
+    name_follows = re.match(r"\s+[A-Z]", text[end:]) is not None
+    # After a capitalized word it is a street, unless that word starts a sentence and a name follows ("Visit St. Louis")
+    if previous[:1].isupper() and not (name_follows and _SENTENCE_START.search(before[:-len(previous)])):
+        # The period may also end the sentence
+        return "Street." if name_follows or not text[end:].strip() else "Street"
+    return "Saint"
+
+
+def _end_lines(text):
+    """
+    Join the lines into one paragraph, ending every line (heading, list item) as a sentence.
+    """
+    lines = []
+    for line in text.splitlines():
+        # Table rows are read as comma-separated cells
+        line = line.strip().strip("|").strip().replace("|", ",")
+        if not line:
+            continue
+        if line[-1] not in ".!?:;,":
+            line += "."
+        lines.append(line)
+    return " ".join(lines)
+
+
+def normalize_for_speech(text):
+    """
+    Rewrite text for speech: drop markdown, code, URLs and emoji, and spell out numbers and abbreviations.
+
+    Args:
+    text (str): The text, e.g. an LLM reply.
+
+    Returns:
+    str: The text to synthesize, empty if nothing is left to say.
+    """
+    if not text:
+        return ""
+    text = _CODE_BLOCK.sub(" ", text)
+    text = _INLINE_CODE.sub(r"\1", text)
+    text = _IMAGE.sub("", text)
+    text = _LINK.sub(r"\1", text)
+    text = _URL.sub("", text)
+    text = _TABLE_RULE.sub("", text)
+    text = _HEADING.sub("", text)
+    text = _BLOCKQUOTE.sub("", text)
+    text = _LIST_MARKER.sub("", text)
+    text = _EMPHASIS.sub(r"\2", text)
+    text = _EMPHASIS.sub(r"\2", text)  # nested emphasis, e.g. ***bold italic***
+    text = _EMOJI.sub("", text)
+    text = _end_lines(text)
+
+    text = _ETC.sub(lambda match: "et cetera." + match.group(1) if match.group(1) is not None else "et cetera", text)
+    text = _ST.sub(_st_to_words, text)
+    text = _ABBREVIATION.sub(lambda match: _ABBREVIATIONS[match.group(0)], text)
+    # Currency runs first, as its amounts may have thousands separators
+    text = _CURRENCY.sub(_currency_to_words, text)
+    text = _NEGATIVE.sub("minus ", text)
+    text = _THOUSANDS.sub(lambda match: _decimal_to_words(int(match.group(1).replace(",", "")), match.group(2)), text)
+    text = _CLOCK_TIME.sub(_clock_time_to_words, text)
+    text = _DOTTED.sub(lambda match: " point ".join(number_to_words(int(part)) for part in match.group(0).split(".")), text)
+    text = _PERCENT.sub(lambda match: f"{match.group(1)} percent", text)
+    text = _ORDINAL.sub(lambda match: _ordinal_to_words(int(match.group(1))), text)
+    text = _NUMBER.sub(_number_match_to_words, text)
+    text = re.sub(r"\s+([,.!?;:])", r"\1", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _split_long(sentence, max_chars):
+    """
+    Split a sentence longer than max_chars at clause punctuation, or else between words.
+    """
+    pieces = []
+    while len(sentence) > max_chars:
+        boundary = None
+        for match in _CLAUSE_END.finditer(sentence, 0, max_chars + 1):
+            boundary = match.end()
+        if boundary is None:
+            boundary = sentence.rfind(" ", 0, max_chars + 1)
+            if boundary <= 0:
+                boundary = max_chars
+        pieces.append(sentence[:boundary].strip())
+        sentence = sentence[boundary:].strip()
+    if sentence:
+        pieces.append(sentence)
+    return pieces
+
+
+def chunk_for_speech(text, max_chars=250, min_chars=40):
+    """
+    Split text into chunks of whole sentences for synthesis.
+
+    Sentences are packed into chunks of up to max_chars; longer sentences are split at clause
+    punctuation, so every chunk starts and ends at a natural pause. A final chunk shorter than
+    min_chars is merged into the previous one.
+
+    Args:
+    text (str): The normalized text.
+    max_chars (int): Maximum length of a chunk.
+    min_chars (int): Minimum length of the last chunk.
+
+    Returns:
+    list: The chunks, in order.
+    """
+    if len(text) <= max_chars:
+        return [text] if text else []
+    chunks = []
+    current = ""
+    for sentence in split_sentences(text):
+        for piece in _split_long(sentence, max_chars):
+            if current and len(current) + 1 + len(piece) > max_chars:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current} {piece}" if current else piece
+    if current:
+        if chunks and len(current) < min_chars:
+            chunks[-1] = f"{chunks[-1]} {current}"
+        else:
+            chunks.append(current)
+    return chunks
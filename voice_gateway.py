@@ -0,0 +1,143 @@
+# voice_gateway.py
+"""
+Serve many concurrent Verbi conversations from one process.
+
+Each session has its own chat history, audio files and backend selection. All sessions share
+the backend clients (and their connection pools) of the server's event loop.
+
+Endpoints:
+    POST   /sessions                     Create a session. Optional JSON body:
+                                         {"transcription_model", "response_model", "tts_model", "system_prompt"}
+    POST   /sessions/{session_id}/turns  Run a turn. The body is the user's utterance (wav, flac or mp3,
+                                         or raw 16-bit PCM with Content-Type audio/l16; rate=16000).
+                                         Streams newline-delimited JSON events: transcript, response
+                                         (per sentence), audio (base64, per sentence) and done.
+    DELETE /sessions/{session_id}        End a session.
+    GET    /metrics                      Sessions, active/queued/rejected turns.
+
+A turn is rejected with 429 if its session already has a turn in progress, and with 503 when
+GATEWAY_MAX_CONCURRENT_TURNS turns are running and GATEWAY_MAX_QUEUED_TURNS are waiting.
+
+Usage:
+    python voice_gateway.py [--host 0.0.0.0] [--port 8080]
+"""
+
+import argparse
+import base64
+import json
+import logging
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from voice_assistant.audio import RecordedAudio
+from voice_assistant.config import Config
+from voice_assistant.session import SessionManager, SessionBusyError, ServerBusyError
+
+app = FastAPI()
+manager = SessionManager()
+
+_FORMATS = {
+    'audio/wav': 'wav', 'audio/x-wav': 'wav', 'audio/wave': 'wav',
+    'audio/flac': 'flac', 'audio/x-flac': 'flac',
+    'audio/mpeg': 'mp3', 'audio/mp3': 'mp3',
+    'audio/l16': 'pcm',
+}
+
+
+class SessionRequest(BaseModel):
+    transcription_model: Optional[str] = None
+    response_model: Optional[str] = None
+    tts_model: Optional[str] = None
+    system_prompt: Optional[str] = None
+
+
+def _parse_audio(request, data):
+    """
+    Wrap the request body in a RecordedAudio based on its Content-Type.
+    """
+    content_type = request.headers.get('content-type', 'audio/wav')
+    mime_type, _, params = content_type.partition(';')
+    audio_format = _FORMATS.get(mime_type.strip().lower())
+    if audio_format is None:
+        raise HTTPException(status_code=415, detail=f"Unsupported audio type: {mime_type}")
+    sample_rate = Config.INPUT_SAMPLE_RATE
+    for param in params.split(';'):
+        name, _, value = param.partition('=')
+        if name.strip() == 'rate' and value.strip().isdigit():
+            sample_rate = int(value)
+    return RecordedAudio(data, audio_format, sample_rate)
+
+
+def _encode_event(event):
+    if event['type'] == 'audio':
+        event = dict(event, data=base64.b64encode(event['data']).decode('ascii'))
+    return json.dumps(event) + "\n"
+
+
+@app.post("/sessions")
+async def create_session(request: Optional[SessionRequest] = None):
+    request = request or SessionRequest()
+    try:
+        session = manager.create(**request.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logging.info(f"Created session {session.id}")
+    return {"session_id": session.id, "transcription_model": session.transcription_model,
+            "response_model": session.response_model, "tts_model": session.tts_model}
+
+
+@app.post("/sessions/{session_id}/turns")
+async def run_turn(session_id: str, request: Request):
+    session = manager.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    data = await request.body()
+    if not data:
+        raise HTTPException(status_code=400, detail="No audio in the request body")
+    audio = _parse_audio(request, data)
+    # The turn is only reserved once its events are streamed, see SessionManager.run_turn
+    try:
+        manager.check_admission(session)
+    except SessionBusyError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ServerBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+    async def events():
+        try:
+            async for event in manager.run_turn(session, audio):
+                yield _encode_event(event)
+        except Exception as e:
+            logging.error(f"Session {session_id}: turn failed: {e!r}")
+            yield _encode_event({"type": "error", "detail": str(e)})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    if manager.get(session_id) is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    manager.remove(session_id)
+    return {"session_id": session_id, "deleted": True}
+
+
+@app.get("/metrics")
+async def metrics():
+    return manager.metrics()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()